@@ -20,8 +20,41 @@
     :license: BSD, see LICENSE for more details.
 """
 
-from .base import INODriver
-
-from .feat import (BoolFeat, BoolDictFeat,
-                   QuantityFeat, QuantityDictFeat,
-                   IntFeat, IntDictFeat)
+import importlib
+
+# Public names are imported on first access, so that the command line
+# helpers (e.g. lantz-ino info) do not pay for lantz.core.
+_LAZY = {
+    'INODriver': 'base',
+    'BoolFeat': 'feat',
+    'BoolDictFeat': 'feat',
+    'QuantityFeat': 'feat',
+    'QuantityDictFeat': 'feat',
+    'AggregateFeat': 'feat',
+    'IntFeat': 'feat',
+    'IntDictFeat': 'feat',
+    'INOClient': 'server',
+    'Scheduler': 'scheduler',
+    'RingBuffer': 'scheduler',
+    'SharedRing': 'sharedring',
+    'SharedRingReader': 'sharedring',
+    'RecordingSink': 'sink',
+    'ShadowArray': 'shadow',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    try:
+        module = _LAZY[name]
+    except KeyError:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -1,15 +1,17 @@
 
 import argparse
-from datetime import datetime
+from contextlib import contextmanager, ExitStack
 import importlib
-import inspect
+import importlib.util
 import os
-import subprocess
 import sys
+import time
 
 from lantz import ArgumentParserSC
-from . import arduinocli, common
-from .base import hasher
+from . import common
+
+# Subcommands import what they need (arduino-cli helpers, lantz.core, Qt)
+# inside their body to keep the startup of the command line program short.
 
 def main(args=None):
     """Run simulators.
@@ -21,6 +23,33 @@ def main(args=None):
     parser.dispatch(args)
 
 
+def _add_trace_arguments(parser):
+    parser.add_argument('--trace', metavar='PATH',
+                        help='Write the timing of each phase (generate, compile, upload, connect) to a file.')
+    parser.add_argument('--trace-format', choices=('chrome', 'json'), default='chrome',
+                        help='Format of the trace file (default: chrome, see chrome://tracing).')
+
+
+@contextmanager
+def _tracing(args):
+    """Collect spans while running the block if --trace was given.
+    """
+    if not args.trace:
+        yield
+        return
+
+    from . import trace
+
+    trace.start()
+    try:
+        yield
+    finally:
+        spans = trace.stop()
+        trace.write(args.trace, spans, args.trace_format)
+        print(trace.summary(spans))
+        print('Trace written to: %s' % args.trace)
+
+
 def info(args=None):
 
     parser = argparse.ArgumentParser(description='Print information of a project')
@@ -39,6 +68,8 @@ def refresh(args=None):
     parser = argparse.ArgumentParser(description='Refresh installation and dependenceis')
     args = parser.parse_args(args)
 
+    import subprocess
+
     out = subprocess.run(['arduino-cli', 'core', 'update-index'])
 
     out = subprocess.run(['arduino-cli', 'core', 'search', 'list'])
@@ -56,6 +87,11 @@ def new(args=None):
     parser.add_argument('-f', '--force', help='Force overwriting user file.', action='store_true')
     args = parser.parse_args(args)
 
+    from datetime import datetime
+    import inspect
+
+    from .base import hasher
+
     cls = _load_class(args.class_spec)
 
     base = args.class_spec.split(':')[1]
@@ -99,10 +135,12 @@ def generate(args=None):
     parser = argparse.ArgumentParser(description='Regenerate code for project.')
     parser.add_argument('packfile', help='Path of the pack file.', type=common.Packfile.from_file)
     parser.add_argument('-f', '--force', help='Force overwriting user file.', action='store_true')
+    _add_trace_arguments(parser)
     args = parser.parse_args(args)
 
     try:
-        _generate(args.packfile, args.force)
+        with _tracing(args):
+            _generate(args.packfile, args.force)
     except FileExistsError:
         print('inodriver_user.h and inodriver_user.cpp are present in the destination folder. '
               'Use -f (--force) ')
@@ -114,21 +152,154 @@ def update(args=None):
     parser.add_argument('packfile', help='Path of the pack file.', type=common.Packfile.from_file)
     parser.add_argument('-n', '--do-not-upload', help='Compile and upload project.', action='store_true')
     parser.add_argument('-f', '--force', help='Force compilation and upload even if the USER project has not changed.', action='store_true')
+    _add_trace_arguments(parser)
     args = parser.parse_args(args)
 
+    from . import arduinocli
+
     try:
         arduinocli.check_cli()
     except arduinocli.ArduinoCliNotFound as e:
         sys.exit(str(e))
 
     try:
-        arduinocli.compile_and_upload(args.packfile, not args.do_not_upload, args.force)
+        with _tracing(args):
+            arduinocli.compile_and_upload(args.packfile, not args.do_not_upload, args.force)
     except arduinocli.NoUpdateNeeded:
         print('No update needed. Use -f (--force) to do it anyway.')
     except ValueError as e:
         sys.exit(str(e))
 
 
+def watch(args=None):
+
+    parser = argparse.ArgumentParser(description='Regenerate, compile and (optionally) upload '
+                                                 'when the driver class or the user files change.')
+    parser.add_argument('packfile', help='Path of the pack file.', type=common.Packfile.from_file)
+    parser.add_argument('-u', '--upload', help='Upload after each build.', action='store_true')
+    parser.add_argument('-c', '--connect', help='Keep a connection to the board, reconnecting after '
+                                                'each upload or change of the class.', action='store_true')
+    parser.add_argument('--poll', help='Poll the files instead of using inotify.', action='store_true')
+    args = parser.parse_args(args)
+
+    from . import arduinocli
+    from .watch import Session
+
+    try:
+        arduinocli.check_cli()
+    except arduinocli.ArduinoCliNotFound as e:
+        sys.exit(str(e))
+
+    try:
+        Session(args.packfile, args.upload, args.connect).run(args.poll)
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(args=None):
+
+    parser = argparse.ArgumentParser(description='Share a board among processes through a Unix socket.')
+    parser.add_argument('packfile', help='Path of the pack file.')
+    parser.add_argument('-s', '--socket', help='Path of the socket (default: <packfile>.sock).')
+    parser.add_argument('-u', '--check-update', help='Compile and upload if needed before serving.',
+                        action='store_true')
+    _add_trace_arguments(parser)
+    args = parser.parse_args(args)
+
+    from .server import INOServer, default_socket_path
+
+    pf = common.Packfile.from_file(args.packfile)
+    path = args.socket or default_socket_path(args.packfile)
+
+    klass = _load_class(pf.class_spec)
+
+    with ExitStack() as stack:
+        with _tracing(args):
+            inst = stack.enter_context(klass.via_packfile(pf, check_update=args.check_update))
+
+        server = INOServer(inst, path)
+        print('Serving %s in: %s' % (klass.__qualname__, path))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+def replay(args=None):
+
+    parser = argparse.ArgumentParser(description='Serve a recorded serial traffic log through a pseudo terminal.')
+    parser.add_argument('logfile', help='Path of the log file.')
+    parser.add_argument('-s', '--speed', type=float, default=1.0,
+                        help='Replay speed factor (0 for as fast as possible).')
+    parser.add_argument('--strict', help='Fail if the host writes differ from the recording.',
+                        action='store_true')
+    args = parser.parse_args(args)
+
+    from .record import LogReader, Replay
+
+    with LogReader(args.logfile) as reader:
+        count, written, read, duration = reader.summary()
+
+    print('%d records, %d bytes written, %d bytes read in %.3f s' % (count, written, read, duration))
+
+    with Replay(args.logfile, args.speed or None, args.strict) as rep:
+        print('Replaying in: %s' % rep.port)
+        try:
+            rep.wait()
+        except KeyboardInterrupt:
+            pass
+
+    if rep.error:
+        sys.exit(str(rep.error))
+
+
+def emulate(args=None):
+
+    parser = argparse.ArgumentParser(description='Build the sketch for this computer (with g++) and run it '
+                                                 'behind a pseudo terminal.')
+    parser.add_argument('packfile', help='Path of the pack file.', type=common.Packfile.from_file)
+    parser.add_argument('-g', '--generate', help='Regenerate the bridge before building.', action='store_true')
+    parser.add_argument('-f', '--force', help='Build even if the sketch has not changed.', action='store_true')
+    parser.add_argument('--uart', help='Transfer bytes at the baud rate of the sketch and drop them '
+                                       'when the receive buffer is full.', action='store_true')
+    parser.add_argument('--build-only', help='Build and exit.', action='store_true')
+    args = parser.parse_args(args)
+
+    from . import emulate as emu
+
+    try:
+        emu.check_compiler()
+    except FileNotFoundError as e:
+        sys.exit(str(e))
+
+    if args.generate:
+        cls = _load_class(args.packfile.class_spec)
+        for filename in cls.ino_bridge_write(args.packfile.sketch_folder):
+            print('Regenerated %s' % filename)
+
+    try:
+        executable = emu.build(args.packfile, force=args.force)
+    except (emu.BuildError, FileNotFoundError) as e:
+        sys.exit(str(e))
+
+    print('Built: %s' % executable)
+    if args.build_only:
+        return
+
+    with emu.Emulator(executable, args.uart) as emulator:
+        print('Emulating in: %s' % emulator.port)
+        try:
+            while emulator.running:
+                time.sleep(0.2)
+        except KeyboardInterrupt:
+            pass
+
+    if args.uart:
+        print('%d bytes dropped by the board' % emulator.dropped)
+
+
 def _generate(packfile, overwrite_user=False):
 
     _subgenerate(_load_class(packfile.class_spec), packfile.sketch_folder, overwrite_user)
@@ -151,43 +322,56 @@ def _load_class(class_spec):
 
 def _subgenerate(cls, skfolder, overwrite_user=False):
 
-    cls.ino_bridge_write(skfolder)
-    cls.ino_user_write(skfolder, overwrite_user)
+    from .trace import span
 
+    with span('generate', klass=cls.__qualname__):
+        cls.ino_bridge_write(skfolder)
+        cls.ino_user_write(skfolder, overwrite_user)
 
-CHOICES = {'refresh': refresh,
-           'new': new,
-           'info': info,
-           'generate': generate,
-           'update': update,
-           }
 
-try:
-    def testpanel(args=None):
-        """Run simulators.
-        """
+def testpanel(args=None):
+    """Run simulators.
+    """
+
+    parser = argparse.ArgumentParser(description='Open a testpanel. Requires lantz.qt')
+    parser.add_argument('packfile', help='Path of the pack file.', type=common.Packfile.from_file)
+    _add_trace_arguments(parser)
+
+    args = parser.parse_args(args)
 
-        parser = argparse.ArgumentParser(description='Open a testpanel. Requires lantz.qt')
-        parser.add_argument('packfile', help='Path of the pack file.', type=common.Packfile.from_file)
+    from lantz.qt.utils.qt import QtGui
 
-        args = parser.parse_args(args)
+    klass = _load_class(args.packfile.class_spec)
 
-        from lantz.qt.utils.qt import QtGui
+    from lantz.qt import start_test_app, wrap_driver_cls
 
-        klass = _load_class(args.packfile.class_spec)
+    from lantz.core.log import log_to_screen, DEBUG
 
-        from lantz.qt import start_test_app, wrap_driver_cls
+    log_to_screen(DEBUG)
 
-        from lantz.core.log import log_to_screen, DEBUG
+    Qklass = wrap_driver_cls(klass)
+    with ExitStack() as stack:
+        with _tracing(args):
+            inst = stack.enter_context(Qklass.via_packfile(args.packfile, check_update=True))
 
-        log_to_screen(DEBUG)
+        start_test_app(inst)
 
-        Qklass = wrap_driver_cls(klass)
-        with Qklass.via_packfile(args.packfile, check_update=True) as inst:
-            start_test_app(inst)
 
-    CHOICES['testpanel'] = testpanel
+CHOICES = {'refresh': refresh,
+           'new': new,
+           'info': info,
+           'generate': generate,
+           'update': update,
+           'watch': watch,
+           'serve': serve,
+           'replay': replay,
+           'emulate': emulate,
+           }
 
+# Look for lantz.qt without importing it (and therefore Qt).
+try:
+    if importlib.util.find_spec('lantz.qt') is not None:
+        CHOICES['testpanel'] = testpanel
 except ImportError:
     pass
 
@@ -14,9 +14,11 @@
 """
 
 import json
+import re
 import subprocess
 
 from . import common
+from .trace import span
 
 
 class NoUpdateNeeded(Exception):
@@ -91,27 +93,87 @@ def just_one(pf, boards):
     return boards[0]
 
 
-def compile_and_upload(packfile, upload=False, force=False):
+def compile_stats(result):
+    """Extract the size of the compiled sketch from the JSON output of arduino-cli compile.
+
+    :param result: parsed output (a dict) or the plain text output of older versions.
+    :return: dict mapping section name (text, data) to size in bytes,
+             and section name + '_max' to the available space.
+    """
+
+    stats = {}
+
+    if isinstance(result, dict):
+        sections = result.get('builder_result', result).get('executable_sections_size') or ()
+        for section in sections:
+            stats[section['name']] = section.get('size')
+            stats[section['name'] + '_max'] = section.get('max_size')
+
+        if stats:
+            return stats
+
+        result = result.get('compiler_out', '')
+
+    # Sketch uses 5124 bytes (15%) of program storage space. Maximum is 32256 bytes.
+    # Global variables use 414 bytes (20%) of dynamic memory, leaving 1634 bytes ...Maximum is 2048 bytes.
+    for name, pattern in (('text', r'Sketch uses (\d+) bytes.*?Maximum is (\d+)'),
+                          ('data', r'Global variables use (\d+) bytes.*?Maximum is (\d+)')):
+        match = re.search(pattern, result or '')
+        if match:
+            stats[name], stats[name + '_max'] = int(match.group(1)), int(match.group(2))
+
+    return stats
+
 
-    if not force:
-        if common.user_local_matches_remote(packfile.sketch_folder):
-            raise NoUpdateNeeded
+def compile_sketch(packfile):
+    """Compile the sketch, print the compiler output and return the size statistics.
+    """
 
-    if not packfile.port or not packfile.fqbn:
-        boards = find_boards_pack(packfile)
+    out = subprocess.run(['arduino-cli', '--format', 'json', 'compile', '-b', packfile.fqbn, packfile.sketch_folder],
+                         stdout=subprocess.PIPE, universal_newlines=True)
 
-    if not packfile.fqbn:
-        packfile = just_one(packfile, boards)
-        print('Found board=%s, port=%s, board_id=%s' % (packfile.fqbn, packfile.port, packfile.usbID))
+    try:
+        result = json.loads(out.stdout)
+    except ValueError:
+        result = out.stdout
+        print(result, end='')
+    else:
+        for key in ('compiler_out', 'compiler_err'):
+            if result.get(key):
+                print(result[key], end='')
+
+    return compile_stats(result)
+
+
+def compile_and_upload(packfile, upload=False, force=False):
 
-    out = subprocess.run(['arduino-cli', 'compile', '-b', packfile.fqbn, packfile.sketch_folder])
+    with span('compile_and_upload', upload=upload, force=force):
 
-    if upload:
+        if not force:
+            with span('check_timestamp'):
+                if common.user_local_matches_remote(packfile.sketch_folder):
+                    raise NoUpdateNeeded
 
-        if not packfile.port:
+        if not packfile.port or not packfile.fqbn:
+            with span('find_boards') as args:
+                boards = find_boards_pack(packfile)
+                args['found'] = len(boards)
+
+        if not packfile.fqbn:
             packfile = just_one(packfile, boards)
             print('Found board=%s, port=%s, board_id=%s' % (packfile.fqbn, packfile.port, packfile.usbID))
 
-        out = subprocess.run(['arduino-cli', 'upload', '-b', packfile.fqbn, '-p', packfile.port, packfile.sketch_folder])
+        with span('compile', fqbn=packfile.fqbn) as args:
+            args.update(compile_sketch(packfile))
+
+        if upload:
+
+            if not packfile.port:
+                packfile = just_one(packfile, boards)
+                print('Found board=%s, port=%s, board_id=%s' % (packfile.fqbn, packfile.port, packfile.usbID))
+
+            with span('upload', port=packfile.port):
+                out = subprocess.run(['arduino-cli', 'upload', '-b', packfile.fqbn, '-p', packfile.port,
+                                      packfile.sketch_folder])
 
-        common.write_user_timestamp(packfile.sketch_folder)
+            common.write_user_timestamp(packfile.sketch_folder)
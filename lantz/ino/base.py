@@ -11,31 +11,74 @@
     :license: BSD, see LICENSE for more details.
 """
 
-from collections import ChainMap
+from collections import ChainMap, deque, namedtuple
+from concurrent.futures import Future, TimeoutError
+from contextlib import contextmanager
 from datetime import datetime
 import hashlib
 import inspect
+import io
+import json
 import os
 import pickle
+import re
+import threading
 import time
 
 from lantz.core import MessageBasedDriver, Feat, log
+from lantz.core.errors import InstrumentError
+from pyvisa import VisaIOError, constants
 
-from . import common, arduinocli
+from . import codec, common, arduinocli
+from .trace import span
 from .templates import bridge, ino, user, HEADER_DO, HEADER_DONOT
 
 DESCRIPTION = {
     'B': 'bool as string: True as "1", False as "0"',
     'I': 'int as string',
+    'L': 'long as string',
     'F': 'float as string',
+    'A': 'mean,min,max,rms,count of float samples as string',
 }
 
 CONVERSION = {
     'B': ('int', 'atoi', '0'),
     'I': ('int', 'atoi', '0'),
+    'L': ('long', 'atol', '0'),
     'F': ('float', 'atof', '0.0'),
 }
 
+#: Valid replies to a getter, used to detect a desynchronized stream.
+REPLY_PATTERN = {
+    'B': re.compile(r'[01]$'),
+    'I': re.compile(r'-?\d+$'),
+    'L': re.compile(r'-?\d+$'),
+    'F': re.compile(r'-?\d+(\.\d*)?$|-?inf$|nan$|ovf$'),
+    'A': re.compile(r'((-?\d+(\.\d*)?|-?inf|nan|ovf),){4}\d+$'),
+}
+
+
+def _parse_float(raw):
+    try:
+        return float(raw)
+    except ValueError:
+        # Serial.print writes ovf for values beyond the range of an unsigned long.
+        if raw == b'ovf':
+            return float('inf')
+        raise
+
+
+#: Parse a reply straight from the received bytes.
+PARSE = {
+    'B': lambda raw: raw == b'1',
+    'I': int,
+    'L': int,
+    'F': _parse_float,
+}
+
+#: Received bytes are compacted once this many have been consumed.
+RX_COMPACT = 4096
+
 ARG = """
   arg = sCmd.next();
   if (arg == NULL) {
@@ -45,6 +88,19 @@ ARG = """
   %s %s = %s(arg);
 """
 
+KEY_CHECK = """
+  if (key < 0 || key >= %s_KEY_COUNT) {
+    error("Invalid key");
+    return;
+  }
+"""
+
+KEYS_TABLE = """
+// Keys of %s%s
+#define %s_KEY_COUNT %d
+const %s %s_KEYS[] = {%s};
+"""
+
 FEAT_HEADER = """
   // %s
   // <%s> %s 
@@ -54,19 +110,58 @@ FEAT_GETTER = """
   // Getter:
   //   %s? 
   // Returns: <%s> 
-  %s("%s?", wrapperGet_%s); 
-"""
+%s"""
 
 FEAT_SETTER = """
   // Setter:
   //   %s <%s> 
   // Returns: OK or ERROR    
-  %s("%s", wrapperSet_%s); 
+%s"""
+
+REGISTER = """  %s("%s", %s); 
+"""
+
+REGISTER_TABLE = """  // (in COMMAND_TABLE)
 """
 
+COMMAND_TABLE = """
+// Commands sorted by name, searched by SerialCommand with a binary search.
+const SerialCommandEntry COMMAND_TABLE[] PROGMEM = {
+%s
+};
+
+"""
+
+COMMAND_TABLE_SETUP = """
+  // Feats and actions
+  sCmd.setCommandTable(COMMAND_TABLE, %d);
+"""
+
+#: Number of characters of a command compared by SerialCommand (SERIALCOMMAND_MAXCOMMANDLENGTH).
+MAX_COMMAND_LENGTH = 8
+
+#: Size of the serial transmit buffer of the board (SERIAL_TX_BUFFER_SIZE in AVR).
+TX_BUFFER = 64
+
+#: Room (in bytes) required in the reply queue (or the transmit buffer) to process a command
+#: when the bridge loop is bounded.
+REPLY_RESERVE = 32
+
+#: Size of the line buffer of SerialCommand (SERIALCOMMAND_BUFFER). Longer commands are truncated.
+LINE_BUFFER = 32
+
+#: Characters of the line buffer taken by the sequence tag and the unacknowledged mark.
+LINE_PREFIX = 5
+
+#: Number of commands above which a static command table is generated
+#: (if INODriver.INO_COMMAND_TABLE is None).
+COMMAND_TABLE_THRESHOLD = 32
+
 FEAT_WRAPPER_GETTER = """
 void wrapperGet_%s() { 
-  Serial.println(get_%s()); 
+  %s value = get_%s();
+  begin_reply();
+  Reply.println(value); 
 }; 
 
 """
@@ -95,22 +190,27 @@ DICTFEAT_GETTER = """
   // Getter:
   //   %s? <%s>
   // Returns: <%s> 
-  %s("%s?", wrapperGet_%s); 
-"""
+%s"""
 
 DICTFEAT_SETTER = """
   // Setter:
   //   %s <%s> <%s>
   // Returns: OK or ERROR    
-  %s("%s", wrapperSet_%s); 
-"""
+%s"""
+
+RANGE_SETTER = """
+  // Range setter (consecutive keys in the order of %s_KEYS):
+  //   %s* <I> first index <%s> value [<%s> value ...]
+  // Returns: OK or ERROR (the keys before the failing one are set)
+%s"""
 
 DICTFEAT_WRAPPER_GETTER = """
 void wrapperGet_%s() { 
   char *arg;
   %s
-
-  Serial.println(get_%s(key)); 
+  %s value = get_%s(key);
+  begin_reply();
+  Reply.println(value); 
 }; 
 
 """
@@ -131,6 +231,46 @@ void wrapperSet_%s() {
 
 """
 
+RANGE_WRAPPER = """
+void wrapperRange_%s() {
+  char *arg;
+  %s
+  for (int key = start; (arg = sCmd.next()) != NULL; key++) {
+    if (key < 0 || key >= %s_KEY_COUNT) {
+      error("Invalid key");
+      return;
+    }
+    int err = set_%s(%s, %s(arg));
+    if (err != 0) {
+      error_i(err);
+      return;
+    }
+  }
+  ok();
+};
+
+"""
+
+AGGREGATE_SETTER = """
+  // Periodic push:
+  //   %s! <L> period in ms (0 to stop)
+  // Returns: OK or ERROR
+  // Then, every period: !%s <%s>
+%s"""
+
+AGGREGATE_WRAPPER = """
+Aggregate aggregate_%s;
+
+void wrapperGet_%s() {
+  aggregate_reply(aggregate_%s, %d);
+};
+
+void wrapperPush_%s() {
+  aggregate_set_period(aggregate_%s);
+};
+
+"""
+
 ACTION_HEADER = """
   // %s
 """
@@ -139,8 +279,7 @@ ACTION_CALL = """
   // Call:
   //   %s
   // Returns: OK or ERROR  
-  %s("%s", wrapperCall_%s); 
-"""
+%s"""
 
 ACTION_WRAPPER = """
 void wrapperCall_%s() {
@@ -154,14 +293,20 @@ void wrapperCall_%s() {
 
 """
 
-def _write_feat_setup(fcpp, name, cmd, datatype, fget, fset, register='sCmd.addCommand'):
-    fcpp.write(FEAT_HEADER % (name, datatype, DESCRIPTION[datatype]))
+def _register(register, command, handler):
+    if register is None:
+        return REGISTER_TABLE
+    return REGISTER % (register, command, handler)
+
+
+def _write_feat_setup(fcpp, name, cmd, datatype, fget, fset, register='sCmd.addCommand', description=None):
+    fcpp.write(FEAT_HEADER % (name, datatype, description or DESCRIPTION[datatype]))
 
     if fget:
-        fcpp.write(FEAT_GETTER % (cmd, datatype, register, cmd, cmd))
+        fcpp.write(FEAT_GETTER % (cmd, datatype, _register(register, cmd + '?', 'wrapperGet_' + cmd)))
 
     if fset:
-        fcpp.write(FEAT_SETTER % (cmd, datatype, register, cmd, cmd))
+        fcpp.write(FEAT_SETTER % (cmd, datatype, _register(register, cmd, 'wrapperSet_' + cmd)))
 
 
 def _write_feat_wrapper(fh, fcpp, cmd, datatype, fget, fset):
@@ -169,7 +314,7 @@ def _write_feat_wrapper(fh, fcpp, cmd, datatype, fget, fset):
     t, fun, default = CONVERSION[datatype]
 
     if fget:
-        fcpp.write(FEAT_WRAPPER_GETTER % (cmd, cmd))
+        fcpp.write(FEAT_WRAPPER_GETTER % (cmd, t, cmd))
         fh.write('void wrapperGet_%s(); \n' % cmd)
 
     if fset:
@@ -190,31 +335,71 @@ def _write_feat_wrapped(fh, fcpp, cmd, datatype, fget, fset):
         fh.write('int set_%s(%s); \n' % (cmd, t))
 
 
-def _write_dictfeat_setup(fcpp, name, cmd, datatype, key_datatype, fget, fset, register='sCmd.addCommand'):
+def _write_dictfeat_setup(fcpp, name, cmd, datatype, key_datatype, fget, fset, register='sCmd.addCommand',
+                          description=None, key_description=None):
 
-    fcpp.write(DICTFEAT_HEADER % (name, datatype, DESCRIPTION[datatype], key_datatype, DESCRIPTION[key_datatype]))
+    fcpp.write(DICTFEAT_HEADER % (name, datatype, description or DESCRIPTION[datatype],
+                                  key_datatype, key_description or DESCRIPTION[key_datatype]))
 
     if fget:
-        fcpp.write(DICTFEAT_GETTER % (cmd, key_datatype, datatype, register, cmd, cmd))
+        fcpp.write(DICTFEAT_GETTER % (cmd, key_datatype, datatype,
+                                      _register(register, cmd + '?', 'wrapperGet_' + cmd)))
 
     if fset:
-        fcpp.write(DICTFEAT_SETTER % (cmd, key_datatype, datatype, register, cmd, cmd))
+        fcpp.write(DICTFEAT_SETTER % (cmd, key_datatype, datatype,
+                                      _register(register, cmd, 'wrapperSet_' + cmd)))
 
 
-def _write_dictfeat_wrapper(fh, fcpp, cmd, datatype, key_datatype, fget, fset):
+def _write_dictfeat_wrapper(fh, fcpp, cmd, datatype, key_datatype, fget, fset, indexed=False):
 
     t, fun, default = CONVERSION[datatype]
     kt, kfun, kdefault = CONVERSION[key_datatype]
 
+    key_arg = ARG % (kt, 'key', kfun)
+    if indexed:
+        key_arg += KEY_CHECK % cmd
+
     if fget:
-        fcpp.write(DICTFEAT_WRAPPER_GETTER % (cmd, ARG % (kt, 'key', kfun), cmd))
+        fcpp.write(DICTFEAT_WRAPPER_GETTER % (cmd, key_arg, t, cmd))
         fh.write('void wrapperGet_%s(); \n' % cmd)
 
     if fset:
-        fcpp.write(DICTFEAT_WRAPPER_SETTER % (cmd, ARG % (kt, 'key', kfun), ARG % (t, 'value', fun), cmd))
+        fcpp.write(DICTFEAT_WRAPPER_SETTER % (cmd, key_arg, ARG % (t, 'value', fun), cmd))
         fh.write('void wrapperSet_%s(); \n' % cmd)
 
 
+def _write_range_setup(fcpp, cmd, datatype, register='sCmd.addCommand'):
+    fcpp.write(RANGE_SETTER % (cmd, cmd, datatype, datatype, _register(register, cmd + '*', 'wrapperRange_' + cmd)))
+
+
+def _write_range_wrapper(fh, fcpp, cmd, datatype, indexed=False):
+
+    t, fun, default = CONVERSION[datatype]
+
+    key = 'key' if indexed else '%s_KEYS[key]' % cmd
+    fcpp.write(RANGE_WRAPPER % (cmd, ARG % ('int', 'start', 'atoi'), cmd, cmd, key, fun))
+    fh.write('void wrapperRange_%s(); \n' % cmd)
+
+
+def _write_keys_table(fh, cmd, key_datatype, keys, indexed=True):
+
+    if key_datatype == 'S':
+        kt = 'char* const'
+        literals = [json.dumps(key) for key in keys]
+    else:
+        kt = CONVERSION[key_datatype][0]
+        literals = [repr(int(key) if key_datatype == 'B' else key) for key in keys]
+
+    note = ' (the wire value and the user functions use the index)' if indexed else ' (see the range setter)'
+    fh.write(KEYS_TABLE % (cmd, note, cmd, len(keys), kt, cmd, ', '.join(literals)))
+
+    if key_datatype == 'S':
+        names = ['%s_%s = %d' % (cmd, key, ndx) for ndx, key in enumerate(keys)
+                 if ('%s_%s' % (cmd, key)).isidentifier()]
+        if names:
+            fh.write('enum {%s};\n' % ', '.join(names))
+
+
 def _write_dictfeat_wrapped(fh, fcpp, cmd, datatype, key_datatype, fget, fset):
 
     t, fun, default = CONVERSION[datatype]
@@ -229,11 +414,29 @@ def _write_dictfeat_wrapped(fh, fcpp, cmd, datatype, key_datatype, fget, fset):
         fh.write('int set_%s(%s, %s); \n' % (cmd, kt, t))
 
 
+def _write_aggregate_setup(fcpp, name, cmd, register='sCmd.addCommand'):
+    fcpp.write(FEAT_HEADER % (name, 'A', DESCRIPTION['A']))
+    fcpp.write(FEAT_GETTER % (cmd, 'A', _register(register, cmd + '?', 'wrapperGet_' + cmd)))
+    fcpp.write(AGGREGATE_SETTER % (cmd, cmd, 'A', _register(register, cmd + '!', 'wrapperPush_' + cmd)))
+
+
+def _write_aggregate_wrapper(fh, fcpp, cmd, digits):
+
+    fcpp.write(AGGREGATE_WRAPPER % (cmd, cmd, cmd, digits, cmd, cmd))
+    fh.write('void wrapperGet_%s(); \n' % cmd)
+    fh.write('void wrapperPush_%s(); \n' % cmd)
+
+
+def _write_aggregate_loop(fcpp, cmd, interval, digits):
+
+    fcpp.write(bridge.AGGREGATE_LOOP_FEAT % (cmd, cmd, interval, cmd, cmd, digits))
+
+
 def _write_action_setup(fcpp, name, cmd, register='sCmd.addCommand'):
 
     fcpp.write(ACTION_HEADER % name)
 
-    fcpp.write(ACTION_CALL % (cmd, register, cmd, cmd))
+    fcpp.write(ACTION_CALL % (cmd, _register(register, cmd, 'wrapperCall_' + cmd)))
 
 
 def _write_action_wrapper(fh, fcpp, cmd):
@@ -252,6 +455,29 @@ def hasher(obj):
     return hashlib.sha1(pickle.dumps(obj)).hexdigest()
 
 
+class AsyncCommandError(InstrumentError):
+    """Commands sent without waiting for their reply (see INODriver.ino_unacknowledged) failed.
+    """
+
+    def __init__(self, errors):
+        #: List of (command, error) tuples in the order they were reported.
+        self.errors = errors
+        super().__init__('%d unacknowledged command(s) failed: %s'
+                         % (len(errors), '; '.join('%s: %s' % error for error in errors)))
+
+
+class DesyncError(InstrumentError):
+    """The request/reply stream with the board could not be resynchronized.
+    """
+
+
+#: Timing of a single command handler as measured by the board.
+HandlerStats = namedtuple('HandlerStats', 'count total_us max_us')
+
+#: Statistics reported by the STATS? command.
+BridgeStats = namedtuple('BridgeStats', 'loop_max_us bridge_max_us loops handlers')
+
+
 class INODriver(MessageBasedDriver):
 
     DEFAULTS = {'COMMON': {'write_termination': '\n',
@@ -259,6 +485,134 @@ class INODriver(MessageBasedDriver):
                 'ASRL': {'baud_rate': 9600},
                 }
 
+    #: If True, the generated bridge measures the time spent in each handler
+    #: and the loop period, and reports them with the STATS? command.
+    INO_STATS = False
+
+    #: If True, each command is preceded by a sequence tag (@<tag>) which the bridge
+    #: echoes back. Replies are read by a dedicated thread and dispatched to futures,
+    #: allowing many requests in flight from many threads (see `ino_submit`).
+    INO_SEQUENCE_TAGS = False
+
+    #: Maximum number of tagged requests in flight.
+    #: Keep it low enough to fit the commands in the serial buffer of the board.
+    INO_MAX_IN_FLIGHT = 4
+
+    #: Number of times an idempotent getter is retried after a timeout or an
+    #: unexpected reply. Before each retry, the input is drained and the stream
+    #: resynchronized with the SYNC? command (see `ino_resync`).
+    #: Without INO_SEQUENCE_TAGS, a stale reply that looks valid for the
+    #: getter cannot be detected (see `_ino_query_checked`).
+    INO_RESYNC_RETRIES = 2
+
+    #: Maximum time (in seconds) to wait for the SYNC reply.
+    INO_RESYNC_TIMEOUT = 0.5
+
+    #: If True, feats and actions are stored in a static table in program memory,
+    #: sorted by command and searched with a binary search. Otherwise they are
+    #: registered one by one (using RAM) and searched linearly.
+    #: None uses the table above COMMAND_TABLE_THRESHOLD commands.
+    INO_COMMAND_TABLE = None
+
+    #: If True, a thread getting a feat (or a key of a dictfeat) which is already
+    #: being queried by another thread waits for that query and gets its result
+    #: instead of sending its own. Do not enable it if a getter has side
+    #: effects (e.g. pops a FIFO or clears a counter).
+    INO_SINGLE_FLIGHT = False
+
+    #: If True, the generated bridge provides the STATE? command, which returns
+    #: the value of all readable feats and dictfeat keys in a single reply
+    #: (see `snapshot` and `ino_state_layout`).
+    INO_STATE = False
+
+    #: Maximum number of received characters processed by the bridge in each
+    #: loop() iteration. None processes all the available ones.
+    INO_RX_BUDGET = None
+
+    #: Maximum time (in microseconds) spent by the bridge reading commands in each
+    #: loop() iteration. A handler is never interrupted. None for no limit.
+    INO_TIME_BUDGET = None
+
+    #: Size (in bytes) of the queue in which the board stores the replies until
+    #: the serial transmit buffer has room, instead of blocking in Serial.print.
+    #: 0 prints the replies directly.
+    INO_TX_QUEUE = 0
+
+    #: If True, the bridge precedes each reply with the time (micros()) at which
+    #: the board received the command, provides the TIME? command, and the driver
+    #: estimates the offset and drift of the board clock (see `ino_clock` and
+    #: `ino_timestamp`).
+    INO_TIMESTAMPS = False
+
+    #: If True, the bridge provides for each dictfeat with a setter the
+    #: <CMD>* command, which sets consecutive keys (in declared order) in a
+    #: single line (see `ShadowArray`). The <CMD>_KEYS table is generated for all of them.
+    INO_RANGE_SET = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Sequence tag -> Future of the tagged requests in flight.
+        self._ino_pending = {}
+        self._ino_next_tag = 0
+        self._ino_tag_lock = threading.Lock()
+        self._ino_slots = threading.BoundedSemaphore(self.INO_MAX_IN_FLIGHT)
+        self._ino_reader = None
+        self._ino_reader_stop = threading.Event()
+        self._ino_sync_count = 0
+
+        # Feat (or dictfeat key subproperty) -> Future of the get in flight
+        # and -> (monotonic time, value) of the last get (for feats with a freshness window).
+        self._ino_flights = {}
+        self._ino_fresh = {}
+        self._ino_flight_lock = threading.Lock()
+
+        # Pushed command -> (feat, callback, buffer) (see ino_push).
+        self._ino_pushes = {}
+
+        # (command, error) reported by the board for unacknowledged commands.
+        self._ino_async_errors = deque()
+
+        # Per thread replies of pipelined commands (see ino_pipeline).
+        self._ino_local = threading.local()
+
+        # (reset, dtr, rts) for serial ports (see via_serial).
+        self._ino_open_mode = (True, None, None)
+
+        # Receive buffer, start of the unread data and cached encoded termination.
+        self._ino_rx = bytearray()
+        self._ino_rx_pos = 0
+        self._ino_rx_term = (None, b'')
+
+        #: Recorder of the serial traffic (see `ino_record`).
+        self.ino_recorder = None
+
+        #: Estimate of the board clock (with INO_TIMESTAMPS).
+        #: :type: lantz.ino.clock.ClockEstimator
+        self.ino_clock = None
+        if self.INO_TIMESTAMPS:
+            from .clock import ClockEstimator
+            self.ino_clock = ClockEstimator()
+
+    @classmethod
+    def via_serial(cls, port, name=None, reset=True, dtr=None, rts=None, **kwargs):
+        """Return a driver for a board connected to a serial port.
+
+        Opening the port of many boards toggles DTR, which resets them, so
+        `initialize` waits for the sketch to start. With reset=False the
+        port is configured to keep DTR asserted when it is closed (HUPCL off,
+        on POSIX systems), so that the next connections do not reset the
+        board, and the wait is skipped if the running sketch already answers
+        INFO? as this class. Only the first connection after the board is
+        plugged in resets it.
+
+        :param reset: False to keep the board (and its state) across connections.
+        :param dtr: state of the DTR line after opening the port (None to leave it).
+        :param rts: state of the RTS line after opening the port (None to leave it).
+        """
+        inst = super().via_serial(port, name=name, **kwargs)
+        inst._ino_open_mode = (reset, dtr, rts)
+        return inst
 
     @classmethod
     def via_packfile(cls, path_or_packfile, check_update=False, name=None, **kwargs):
@@ -271,7 +625,8 @@ class INODriver(MessageBasedDriver):
         msgs = []
 
         if not pf.port:
-            boards = arduinocli.find_boards_pack(pf)
+            with span('find_boards'):
+                boards = arduinocli.find_boards_pack(pf)
             pf = arduinocli.just_one(pf, boards)
             msgs.append((log.DEBUG, 'Port autoselected %s' % pf.port))
 
@@ -282,7 +637,8 @@ class INODriver(MessageBasedDriver):
             except arduinocli.NoUpdateNeeded:
                 msgs.append((log.DEBUG, 'Current sketch in the arduino is up to date.'))
 
-        inst = cls.via_serial(pf.port, name=name, **kwargs)
+        with span('via_serial', port=pf.port):
+            inst = cls.via_serial(pf.port, name=name, **dict(pf.serial_options, **kwargs))
 
         for level, msg in msgs:
             inst.log(level, msg)
@@ -290,42 +646,1029 @@ class INODriver(MessageBasedDriver):
         return inst
 
     def initialize(self):
-        super().initialize()
-        # Some Arduino reset the Serial upon establishing connection (after opening the port)
-        # This sleep is required to avoid sending messages when the board is not ready.
-        time.sleep(3)
-        self.set_query('INITIALIZE')
+        with span('open'):
+            super().initialize()
+
+        reset, dtr, rts = self._ino_open_mode
+        if not reset or dtr is not None or rts is not None:
+            self._ino_configure_lines(reset, dtr, rts)
+
+        running = False
+        if not reset:
+            with span('probe'):
+                running = self._ino_probe()
+
+        if not running:
+            # Some Arduino reset the Serial upon establishing connection (after opening the port)
+            # This sleep is required to avoid sending messages when the board is not ready.
+            with span('settle'):
+                time.sleep(3)
+            if not reset:
+                # Late replies to the probe.
+                self._ino_drain()
+        if self.INO_SEQUENCE_TAGS:
+            self._ino_start_reader()
+        if self.INO_TIMESTAMPS:
+            # The board might have been reset.
+            self.ino_clock.reset()
+        with span('INITIALIZE'):
+            self.set_query('INITIALIZE')
+        if self.INO_TIMESTAMPS:
+            with span('sync_clock'):
+                self.ino_sync_clock()
+
+    def _ino_configure_lines(self, reset, dtr, rts):
+        """Set the modem lines and, if reset is False, keep DTR asserted when the port is closed.
+        """
+        port = self._ino_serial_port()
+        if port is None:
+            self.log_warning('The serial lines cannot be configured with this VISA backend.')
+            return
+
+        try:
+            if dtr is not None:
+                port.dtr = dtr
+            if rts is not None:
+                port.rts = rts
+        except OSError as e:
+            self.log_warning('Could not set the serial lines: {}', e)
+
+        if reset:
+            return
+
+        try:
+            import termios
+        except ImportError:
+            # Not a POSIX system.
+            return
+
+        fd = port.fileno()
+        attributes = termios.tcgetattr(fd)
+        if attributes[2] & termios.HUPCL:
+            attributes[2] &= ~termios.HUPCL
+            termios.tcsetattr(fd, termios.TCSANOW, attributes)
+
+    def _ino_probe(self):
+        """True if the sketch running in the board answers INFO? as this class.
+        """
+        try:
+            self.ino_resync()
+            klass = self.query('INFO?').partition(',')[0]
+        except Exception as e:
+            # Whatever is running (if anything) is not this sketch.
+            self.log_debug('The board did not answer: {}', e)
+            return False
+
+        if klass != self.__class__.__qualname__:
+            self.log_info('The board is running {} instead of {}', klass, self.__class__.__qualname__)
+            return False
+
+        self.log_debug('The board is running, skipping the settle time.')
+        return True
 
     def finalize(self):
         self.set_query('FINALIZE')
+        if self._ino_reader is not None:
+            self._ino_stop_reader()
         super().finalize()
+        self.ino_record(None)
+
+    def query(self, command, *, send_args=(None, None), recv_args=(None, None)):
+        if getattr(self._ino_local, 'unacknowledged', False) and not command.split(' ', 1)[0].endswith('?'):
+            with self._ino_tag_lock:
+                self.write('~' + command)
+            return None
+
+        reply = self._ino_query(command, send_args, recv_args)
+
+        # The errors of earlier unacknowledged commands were read before this reply.
+        if self._ino_async_errors:
+            self._ino_raise_async_errors()
+
+        return reply
+
+    get_query = query
+    set_query = query
+
+    def _ino_query(self, command, send_args, recv_args):
+        if self.INO_TIMESTAMPS:
+            self._ino_local.board_time = None
+
+        prefetched = getattr(self._ino_local, 'prefetched', None)
+        if prefetched:
+            future = prefetched.pop(command, None)
+            if future is not None:
+                if self._ino_reader is None:
+                    # Already resolved (e.g. by the STATE? reply of snapshot).
+                    return self._ino_result(future)
+                return self._ino_query_tagged(command, future)
+
+        if self._ino_reader is None:
+            if not self.INO_TIMESTAMPS:
+                return self._ino_query_checked(command, send_args, recv_args)
+
+            sent = time.monotonic()
+            reply = self._ino_query_checked(command, send_args, recv_args)
+            self._ino_clock_sample(sent, self._ino_local.stamp)
+            return reply
+
+        return self._ino_query_tagged(command)
+
+    def _ino_query_tagged(self, command, future=None):
+        """Send a tagged command (unless its future is given) and wait for the reply,
+        resynchronizing and retrying idempotent getters if it does not arrive.
+
+        Stale replies are discarded by tag, so only a lost reply (or command)
+        needs to be recovered. As without tags, a setter whose reply is lost
+        raises DesyncError although the board may have applied it.
+        """
+        idempotent = command.split(' ', 1)[0].endswith('?')
+
+        for attempt in range(self.INO_RESYNC_RETRIES + 1):
+            if future is None:
+                future = self.ino_submit(command)
+            try:
+                return self._ino_result(future)
+            except TimeoutError:
+                future = None
+
+            self.log_warning('Out of sync after {!r} (timeout).', command)
+            self.ino_resync()
+
+            if not idempotent:
+                raise DesyncError('Out of sync after %r (timeout). '
+                                  'The stream was resynchronized but the command was not retried.'
+                                  % command)
+
+        raise DesyncError('No valid reply to %r after %d retries.' % (command, self.INO_RESYNC_RETRIES))
+
+    def _ino_query_checked(self, command, send_args, recv_args):
+        """Query and validate the reply, resynchronizing and retrying idempotent
+        getters if the stream is out of sync.
+
+        Without sequence tags a reply can only be checked by its shape (the
+        REPLY_PATTERN of the getter, or OK for a setter). A stale reply of the
+        same shape (e.g. a leftover 0 answering another numeric getter) is
+        returned as the value, and the desync is only detected by a later
+        command: if it is a setter, DesyncError is raised although the board
+        may have applied it. With INO_SEQUENCE_TAGS (see `_ino_query_tagged`)
+        replies are matched by tag and stale ones are discarded.
+        """
+        idempotent = command.split(' ', 1)[0].endswith('?')
+
+        for attempt in range(self.INO_RESYNC_RETRIES + 1):
+            try:
+                reply = super().query(command, send_args=send_args, recv_args=recv_args)
+            except VisaIOError as e:
+                if e.error_code != constants.StatusCode.error_timeout:
+                    raise
+                reason = 'timeout'
+            else:
+                if self._ino_valid_reply(command, reply):
+                    return reply
+                reason = 'unexpected reply %r' % reply
+
+            self.log_warning('Out of sync after {!r} ({}).', command, reason)
+            self.ino_resync()
+
+            if not idempotent:
+                raise DesyncError('Out of sync after %r (%s). '
+                                  'The stream was resynchronized but the command was not retried.'
+                                  % (command, reason))
+
+        raise DesyncError('No valid reply to %r after %d retries.' % (command, self.INO_RESYNC_RETRIES))
+
+    @classmethod
+    def _ino_reply_patterns(cls):
+        # Getter command -> REPLY_PATTERN, built once per class.
+        if '_ino_patterns' not in cls.__dict__:
+            cm = ChainMap(cls._lantz_feats, cls._lantz_dictfeats)
+            cls._ino_patterns = {feat.ino_cmd + '?': REPLY_PATTERN[feat.INO_DATATYPE]
+                                 for feat in cm.values()
+                                 if isinstance(feat, INOFeat) and feat.fget
+                                 and feat.INO_DATATYPE in REPLY_PATTERN}
+        return cls._ino_patterns
+
+    def _ino_valid_reply(self, command, reply):
+        if reply.startswith('ERROR'):
+            return True
+
+        name = command.split(' ', 1)[0]
+
+        if not name.endswith('?'):
+            return reply == 'OK'
+
+        if reply == 'OK':
+            return False
+
+        pattern = self._ino_reply_patterns().get(name)
+        return pattern is None or pattern.match(reply) is not None
+
+    def ino_resync(self):
+        """Drain the input and exchange a SYNC token with the board.
+
+        Recovers the request/reply stream without reopening the port.
+        With sequence tags, the reader thread discards the stale replies
+        and only the tagged SYNC? exchange is needed.
+
+        :raises DesyncError: if the board does not answer in INO_RESYNC_TIMEOUT seconds.
+        """
+        self._ino_sync_count += 1
+        expected = 'SYNC %04x' % (self._ino_sync_count % 0x10000)
+
+        if self._ino_reader is not None:
+            future = self.ino_submit('SYNC? ' + expected[5:])
+            try:
+                reply = future.result(self.INO_RESYNC_TIMEOUT)
+            except TimeoutError:
+                self._ino_discard(future)
+                raise DesyncError('The board did not answer to SYNC? in %.3f s' % self.INO_RESYNC_TIMEOUT)
+            if reply != expected:
+                raise DesyncError('Unexpected reply to SYNC?: %r' % reply)
+            self.log_debug('Resynchronized')
+            return
+
+        self._ino_drain()
+
+        # An empty line terminates any partial command in the board buffer.
+        self.write('')
+        self.write('SYNC? ' + expected[5:])
+
+        timeout = self.resource.timeout
+        deadline = time.monotonic() + self.INO_RESYNC_TIMEOUT
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.resource.timeout = remaining * 1000
+                try:
+                    line = self.read()
+                except VisaIOError as e:
+                    if e.error_code != constants.StatusCode.error_timeout:
+                        raise
+                    break
+
+                if line == expected:
+                    self.log_debug('Resynchronized')
+                    return
+
+                self.log_debug('Discarding {!r}', line)
+        finally:
+            self.resource.timeout = timeout
+
+        raise DesyncError('The board did not answer to SYNC? in %.3f s' % self.INO_RESYNC_TIMEOUT)
+
+    def _ino_drain(self):
+        """Discard the received data.
+        """
+        self.resource.flush(constants.VI_READ_BUF_DISCARD)
+        self._ino_rx.clear()
+        self._ino_rx_pos = 0
+
+    def ino_submit(self, command):
+        """Send a tagged command and return immediately.
+
+        Requires INO_SEQUENCE_TAGS = True. Can be called from multiple threads.
+
+        :param command: command to be sent to the instrument.
+        :return: a future whose result is the reply string.
+        :rtype: concurrent.futures.Future
+        """
+        if self._ino_reader is None:
+            raise ValueError('Sequence tags are not enabled (INO_SEQUENCE_TAGS) '
+                             'or the driver is not initialized.')
+
+        self._ino_slots.acquire()
+
+        future = Future()
+        future.add_done_callback(lambda _: self._ino_slots.release())
+        future.ino_sent = time.monotonic()
+
+        with self._ino_tag_lock:
+            while True:
+                tag = '@%02x' % self._ino_next_tag
+                self._ino_next_tag = (self._ino_next_tag + 1) % 256
+                if tag not in self._ino_pending:
+                    break
+
+            self._ino_pending[tag] = future
+            future.ino_tag = tag
+
+            try:
+                self.write('%s %s' % (tag, command))
+            except Exception as e:
+                del self._ino_pending[tag]
+                future.set_exception(e)
+
+        return future
+
+    def _ino_result(self, future):
+        try:
+            reply = future.result(self.resource.timeout / 1000)
+        except TimeoutError:
+            self._ino_discard(future)
+            raise
+
+        stamp = getattr(future, 'ino_stamp', None)
+        if stamp is not None:
+            self._ino_clock_sample(future.ino_sent, stamp)
+        elif hasattr(future, 'ino_board_time'):
+            self._ino_local.board_time = future.ino_board_time
+
+        return reply
+
+    @contextmanager
+    def ino_pipeline(self, commands):
+        """Send many getter commands at once and use their replies in the block.
+
+        Queries of these commands made by this thread inside the block
+        (e.g. getting the corresponding feats) return the pipelined replies
+        instead of doing a round trip each. Without sequence tags
+        (INO_SEQUENCE_TAGS) nothing is pipelined.
+
+        :param commands: iterable of commands (e.g. 'TEMP?').
+        """
+        if self._ino_reader is None:
+            yield
+            return
+
+        prefetched = {}
+        for command in commands:
+            if command not in prefetched:
+                prefetched[command] = self.ino_submit(command)
+
+        try:
+            with self._ino_replies(prefetched):
+                yield
+        finally:
+            # Release the slots of the replies that were not used.
+            for future in prefetched.values():
+                if not future.done():
+                    self._ino_discard(future)
+
+    @contextmanager
+    def _ino_replies(self, prefetched):
+        """Answer the queries of this thread from a dict of command -> Future.
+        """
+        self._ino_local.prefetched = prefetched
+        try:
+            yield
+        finally:
+            self._ino_local.prefetched = None
+
+    def _ino_discard(self, future):
+        with self._ino_tag_lock:
+            if self._ino_pending.get(future.ino_tag) is future:
+                del self._ino_pending[future.ino_tag]
+        future.cancel()
+
+    def _ino_start_reader(self):
+        self._ino_reader_stop.clear()
+        self._ino_reader = threading.Thread(target=self._ino_reader_loop,
+                                            name='%s-reader' % self.name, daemon=True)
+        self._ino_reader.start()
+
+    def _ino_stop_reader(self):
+        self._ino_reader_stop.set()
+        self._ino_reader.join(self.resource.timeout / 1000 + 1)
+        self._ino_reader = None
+
+        with self._ino_tag_lock:
+            pending, self._ino_pending = self._ino_pending, {}
+
+        for future in pending.values():
+            future.cancel()
+
+    def _ino_reader_loop(self):
+        while not self._ino_reader_stop.is_set():
+            try:
+                line = self.read()
+            except VisaIOError as e:
+                if e.error_code == constants.StatusCode.error_timeout:
+                    continue
+                if not self._ino_reader_stop.is_set():
+                    self.log_error('Reader stopped: {}', e)
+                break
+
+            tag, _, reply = line.partition(' ')
+
+            with self._ino_tag_lock:
+                future = self._ino_pending.pop(tag, None)
+
+            if future is None:
+                self.log_warning('Discarding unexpected reply {!r}', line)
+            elif future.set_running_or_notify_cancel():
+                if self.INO_TIMESTAMPS:
+                    future.ino_stamp = self._ino_local.stamp
+                future.set_result(reply)
+
+    def _ino_single_flight(self, prop, get, fresh=0):
+        """Get the value of a feat, sharing the query with concurrent callers.
+
+        :param prop: the feat (or dictfeat key subproperty).
+        :param get: callable doing the actual get.
+        :param fresh: seconds during which the last value is returned without querying.
+        """
+        if not self.INO_SINGLE_FLIGHT and not fresh:
+            return get()
+
+        started = time.monotonic()
+
+        with self._ino_flight_lock:
+            if fresh:
+                last = self._ino_fresh.get(prop)
+                if last is not None and started - last[0] <= fresh:
+                    self._ino_local.board_time = last[2]
+                    return last[1]
+
+            # Without INO_SINGLE_FLIGHT, the get is still registered so that
+            # a set in the meantime keeps its value out of the freshness window.
+            future = self._ino_flights.get(prop) if self.INO_SINGLE_FLIGHT else None
+            if future is not None:
+                leader = False
+            else:
+                leader = True
+                future = self._ino_flights[prop] = Future()
+
+        if not leader:
+            value = future.result()
+            self._ino_local.board_time = future.ino_board_time
+            return value
+
+        try:
+            value = get()
+        except BaseException as e:
+            with self._ino_flight_lock:
+                if self._ino_flights.get(prop) is future:
+                    del self._ino_flights[prop]
+            future.set_exception(e)
+            raise
+
+        board_time = future.ino_board_time = getattr(self._ino_local, 'board_time', None)
+        with self._ino_flight_lock:
+            if self._ino_flights.get(prop) is future:
+                del self._ino_flights[prop]
+                if fresh:
+                    self._ino_fresh[prop] = (started, value, board_time)
+        future.set_result(value)
+
+        return value
+
+    def _ino_invalidate(self, prop):
+        """Forget the last value and detach the get in flight (if any) of a feat.
+
+        Called after setting a feat, so that later gets query the new value.
+        """
+        with self._ino_flight_lock:
+            self._ino_flights.pop(prop, None)
+            self._ino_fresh.pop(prop, None)
 
     @Feat(read_once=True)
     def idn(self):
         """Instrument identification.
         """
-        return self.parse_query('INFO?',
-                                format='{klass:s},{compile_datetime:s}')
+        with span('idn'):
+            reply = self.query('INFO?')
+
+        # <klass>,<compile datetime>
+        klass, sep, compile_datetime = reply.partition(',')
+        if not sep:
+            raise ValueError('Unexpected reply to INFO?: %r' % reply)
+        return {'klass': klass, 'compile_datetime': compile_datetime}
+
+    def _ino_clock_sample(self, sent, stamp):
+        """Add a round trip to the clock estimate and keep the board time of the reply for this thread.
+
+        :param stamp: (micros() of the reply, host time at which it was received) or None.
+        """
+        if stamp is None:
+            self._ino_local.board_time = None
+        else:
+            self._ino_local.board_time = self.ino_clock.add(sent, stamp[1], stamp[0])
+
+    def _ino_strip_stamp(self, line):
+        """Remove the t<micros> token of a reply, keeping it (and the reception time) for this thread.
+        """
+        received = time.monotonic()
+
+        tag = b''
+        if line.startswith(b'@'):
+            tag, _, line = line.partition(b' ')
+            tag += b' '
+
+        stamp = None
+        if line.startswith(b't'):
+            token, _, rest = line.partition(b' ')
+            try:
+                stamp = (int(token[1:], 16), received)
+                line = rest
+            except ValueError:
+                pass
+
+        self._ino_local.stamp = stamp
+        return tag + line
+
+    def ino_timestamp(self):
+        """Host time (time.monotonic) at which the board received the command
+        of the last reply read by this thread (e.g. the last feat get).
+
+        Requires INO_TIMESTAMPS = True. The board time is converted with the
+        current estimate of `ino_clock`, so the serial latency and its jitter
+        are not included.
+
+        :return: seconds or None if the reply was not stamped.
+        """
+        board_time = getattr(self._ino_local, 'board_time', None)
+        if board_time is None:
+            return None
+        return self.ino_clock.to_host(board_time)
+
+    def ino_sync_clock(self, count=16):
+        """Measure count round trips with the TIME? command to update the clock estimate.
+
+        Requires INO_TIMESTAMPS = True. Every stamped reply also updates the estimate.
+
+        :rtype: lantz.ino.clock.ClockEstimator
+        """
+        if not self.INO_TIMESTAMPS:
+            raise ValueError('%s was not generated with INO_TIMESTAMPS = True' % self.__class__.__qualname__)
+
+        for _ in range(count):
+            self.query('TIME?')
+
+        return self.ino_clock
+
+    @contextmanager
+    def ino_unacknowledged(self, flush=True):
+        """Send the setters and actions of this thread in the block without
+        waiting for their reply, e.g. to sweep a setpoint at the speed of the link.
+
+        The board does not reply OK to these commands and reports their errors
+        asynchronously. They are raised (as an AsyncCommandError) by the next
+        synchronous query of any thread. Getters are still synchronous.
+
+        Values set in the block are cached by the feats even if the board
+        rejects them later.
+
+        :param flush: wait at the end of the block until the board processed
+                      all the commands (see `ino_flush`).
+        """
+        local = self._ino_local
+        previous = getattr(local, 'unacknowledged', False)
+        local.unacknowledged = True
+        try:
+            yield
+        finally:
+            local.unacknowledged = previous
+
+        if flush:
+            self.ino_flush()
+
+    def ino_flush(self):
+        """Wait until the board processed the commands sent so far.
+
+        :raises AsyncCommandError: if unacknowledged commands failed.
+        """
+        self.query('SYNC? flush')
+
+    def _ino_raise_async_errors(self):
+        errors = []
+        while self._ino_async_errors:
+            errors.append(self._ino_async_errors.popleft())
+        if errors:
+            raise AsyncCommandError(errors)
+
+    def ino_push(self, name, period, callback=None, buffer=None):
+        """Ask the board to push the value of a feat periodically (e.g. an AggregateFeat).
+
+        Each pushed value is delivered as (timestamp, value) to the callback
+        and appended to the buffer (e.g. a RingBuffer or RecordingSink).
+        Pushes are read with the replies: continuously by the reader thread
+        with INO_SEQUENCE_TAGS, otherwise while waiting for a reply or in
+        `ino_listen`. The callback runs in that thread and should be quick.
+
+        Timestamps are the host time (time.monotonic) at which the board sent
+        the value with INO_TIMESTAMPS, or at which it was read otherwise.
+
+        :param name: name of the feat.
+        :param period: seconds between pushes, 0 or None to stop them.
+        :param callback: callable receiving the timestamp and the value.
+        :param buffer: object with an append method.
+        """
+        feat = self._lantz_feats.get(name)
+        if not (isinstance(feat, INOFeat) and feat.ino_push_command):
+            raise ValueError('%s has no pushable feat named %r' % (self.__class__.__qualname__, name))
+
+        milliseconds = round(period * 1000) if period else 0
+        if period and not milliseconds:
+            raise ValueError('The push period must be at least 1 ms (not %r)' % period)
+
+        if milliseconds:
+            self._ino_pushes[feat.ino_cmd] = (feat, callback, buffer)
+            self.set_query('%s %d' % (feat.ino_push_command, milliseconds))
+        else:
+            self.set_query('%s 0' % feat.ino_push_command)
+            self._ino_pushes.pop(feat.ino_cmd, None)
+
+    def _ino_dispatch_push(self, line):
+        """Deliver a pushed line ([t<micros> ]<command> <value>) to the subscribers (see ino_push).
+        """
+        received = time.monotonic()
+
+        raw = None
+        if line.startswith('t'):
+            token, _, rest = line.partition(' ')
+            try:
+                raw = int(token[1:], 16)
+                line = rest
+            except ValueError:
+                pass
+
+        command, _, payload = line.partition(' ')
+
+        if command == 'E':
+            # Error of an unacknowledged command.
+            failed, _, error = payload.partition(' ')
+            self.log_warning('Unacknowledged {} failed: {}', failed, error)
+            self._ino_async_errors.append((failed, error))
+            return
+
+        subscriber = self._ino_pushes.get(command)
+        if subscriber is None:
+            self.log_debug('Discarding push {!r}', line)
+            return
+
+        feat, callback, buffer = subscriber
+        try:
+            value = feat.ino_decode(payload)
+        except ValueError as e:
+            self.log_warning('Could not decode push {!r}: {}', line, e)
+            return
+
+        timestamp = received
+        if raw is not None and self.ino_clock is not None and len(self.ino_clock):
+            timestamp = self.ino_clock.to_host(self.ino_clock.unwrap(raw))
+
+        if callback is not None:
+            callback(timestamp, value)
+        if buffer is not None:
+            buffer.append((timestamp, value))
+
+    def ino_listen(self, duration):
+        """Read and deliver the pushes (see ino_push) received during duration seconds.
+
+        Only needed without INO_SEQUENCE_TAGS (the reader thread delivers them otherwise).
+        """
+        if self._ino_reader is not None:
+            time.sleep(duration)
+            return
+
+        timeout = self.resource.timeout
+        deadline = time.monotonic() + duration
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.resource.timeout = remaining * 1000
+                try:
+                    pushed, line = self._ino_read_message(encoding=self.resource.encoding)
+                except VisaIOError as e:
+                    if e.error_code != constants.StatusCode.error_timeout:
+                        raise
+                    break
+
+                if not pushed:
+                    self.log_warning('Discarding unexpected reply {!r}', line)
+        finally:
+            self.resource.timeout = timeout
+
+    def ino_stats(self, reset=False):
+        """Handler timing and loop statistics measured by the board (in microseconds).
+
+        Requires the sketch to be generated with INO_STATS = True.
+
+        :param reset: clear the statistics in the board after reading them.
+        :rtype: BridgeStats
+        """
+        if not self.INO_STATS:
+            raise ValueError('%s was not generated with INO_STATS = True' % self.__class__.__qualname__)
+
+        head, *handlers = self.query('STATS? 1' if reset else 'STATS?').split(';')
+
+        loop_max, bridge_max, loops = map(int, head.split(','))
+
+        out = {}
+        for handler in handlers:
+            cmd, count, total, max_ = handler.split(',')
+            out[cmd] = HandlerStats(int(count), int(total), int(max_))
+
+        return BridgeStats(loop_max, bridge_max, loops, out)
+
+    @classmethod
+    def ino_state_layout(cls):
+        """Readable feats and dictfeat keys in the order of the STATE? reply.
+
+        :return: list of (feat, key) tuples. key is None for feats.
+        """
+        layout = []
+        for feat in ChainMap(cls._lantz_feats, cls._lantz_dictfeats).values():
+            if not (isinstance(feat, INOFeat) and feat.fget and feat.INO_IN_STATE):
+                continue
+            if isinstance(feat, INODictFeat):
+                layout.extend((feat, key) for key in feat.ino_keys)
+            else:
+                layout.append((feat, None))
+        return layout
+
+    def snapshot(self, structured=False):
+        """Get all readable feats and dictfeat keys.
+
+        With INO_STATE = True a single STATE? command is sent. Otherwise the
+        feats are queried one by one (pipelined if INO_SEQUENCE_TAGS is True).
+        In both cases the values go through the feat (units, limits, observers).
+
+        :param structured: return a NumPy structured array (a single record)
+                           instead of a dict. The fields of dictfeat keys are
+                           named <feat>[<key>] and quantities are stored as
+                           their magnitude.
+        :return: dict of feat name to value (or to a dict of key to value for dictfeats).
+        """
+        layout = self.ino_state_layout()
+        commands = [feat.ino_get_command(key) for feat, key in layout]
+
+        if self.INO_STATE:
+            values = self.query('STATE?').split(',') if layout else []
+            if len(values) != len(layout):
+                raise ValueError('STATE? returned %d values but %s has %d '
+                                 '(is the sketch up to date?)'
+                                 % (len(values), self.__class__.__qualname__, len(layout)))
+
+            # All values share the time stamped in the STATE? reply.
+            board_time = getattr(self._ino_local, 'board_time', None)
+
+            prefetched = {}
+            for command, value in zip(commands, values):
+                future = prefetched[command] = Future()
+                future.ino_board_time = board_time
+                future.set_result(value)
+            context = self._ino_replies(prefetched)
+
+            # Values within a freshness window must be replaced by the new ones.
+            with self._ino_flight_lock:
+                self._ino_fresh.clear()
+        else:
+            context = self.ino_pipeline(commands)
+
+        out = {}
+        with context:
+            for feat, key in layout:
+                if key is None:
+                    out[feat.name] = getattr(self, feat.name)
+                else:
+                    out.setdefault(feat.name, {})[key] = getattr(self, feat.name)[key]
+
+        if not structured:
+            return out
+
+        import numpy as np
+
+        names, formats, record = [], [], []
+        for feat, key in layout:
+            if key is None:
+                name, value = feat.name, out[feat.name]
+            else:
+                name, value = '%s[%s]' % (feat.name, key), out[feat.name][key]
+            value = getattr(value, 'magnitude', value)
+            names.append(name)
+            formats.append(np.asarray(value).dtype)
+            record.append(value)
+
+        return np.array(tuple(record), dtype={'names': names, 'formats': formats})
+
+    def ino_record(self, path):
+        """Record every write and read (with monotonic timestamps) to a binary log.
+
+        The log can be inspected with lantz.ino.record.LogReader or
+        served back with lantz.ino.record.Replay.
+
+        :param path: path of the log file or None to stop recording.
+        :rtype: lantz.ino.record.Recorder
+        """
+        if self.ino_recorder is not None:
+            self.ino_recorder.close()
+            self.ino_recorder = None
+
+        if path is not None:
+            from .record import Recorder
+            self.ino_recorder = Recorder(path)
+
+        return self.ino_recorder
+
+    def write(self, command, termination=None, encoding=None):
+        out = super().write(command, termination, encoding)
+
+        if self.ino_recorder is not None:
+            termination = self.resource.write_termination if termination is None else termination
+            encoding = self.resource.encoding if encoding is None else encoding
+            self.ino_recorder.write((command + termination).encode(encoding))
+
+        return out
+
+    def _ino_serial_port(self):
+        """Return the pyserial port of a pyvisa-py session (None for other backends).
+        """
+        resource = self.resource
+        session = getattr(resource.visalib, 'sessions', {}).get(resource.session)
+        port = getattr(session, 'interface', None)
+        return port if hasattr(port, 'in_waiting') else None
+
+    def _ino_read_chunk(self):
+        """Read the bytes available in the port, blocking (up to the timeout) for at least one.
+        """
+        # pyvisa-py reads a serial port one byte at a time.
+        # Read everything available directly from the port instead.
+        port = self._ino_serial_port()
+        if port is not None:
+            chunk = port.read(max(port.in_waiting, 1))
+            if not chunk:
+                raise VisaIOError(constants.StatusCode.error_timeout)
+            return chunk
+
+        resource = self.resource
+        return resource.read_bytes(max(resource.bytes_in_buffer, 1))
+
+    def _ino_read_line(self, termination=None):
+        """Read a line (without the termination) as bytes.
+
+        Chunks are appended to a reusable receive buffer which is scanned for
+        the termination in place, so a line is copied only once.
+        """
+        if termination is None:
+            termination = self.resource.read_termination
+
+        cached, term = self._ino_rx_term
+        if cached != termination:
+            term = termination.encode('ascii')
+            self._ino_rx_term = (termination, term)
+
+        buf = self._ino_rx
+        start = search = self._ino_rx_pos
+
+        while True:
+            end = buf.find(term, search)
+            if end >= 0:
+                break
+            # The termination might be split between chunks.
+            search = max(start, len(buf) - len(term) + 1)
+            buf += self._ino_read_chunk()
+
+        with memoryview(buf) as view:
+            line = bytes(view[start:end])
+
+        pos = end + len(term)
+        if pos == len(buf):
+            buf.clear()
+            pos = 0
+        elif pos > RX_COMPACT:
+            del buf[:pos]
+            pos = 0
+        self._ino_rx_pos = pos
+
+        if self.ino_recorder is not None:
+            self.ino_recorder.read(line + term)
+
+        return line
+
+    def _ino_read_message(self, termination=None, encoding=None):
+        """Read a line, logging the debug messages that precede it.
+
+        :return: (pushed, line). pushed is True for a push (see ino_push),
+                 which is dispatched and returned without the leading !.
+        """
+        line = self._ino_read_line(termination)
+
+        # Debug messages from the board precede the reply separated by #
+        if b'#' in line:
+            *debug, line = line.split(b'#')
+            for part in debug:
+                self.log_debug(part.decode(encoding, 'replace'))
+
+        if line.startswith(b'!'):
+            line = line[1:]
+            self._ino_dispatch_push(line.decode(encoding))
+            return True, line
+
+        return False, line
+
+    def _ino_read_reply(self, termination=None, encoding=None):
+        """Read the next reply as bytes (dispatching the pushes received before it).
+        """
+        if encoding is None:
+            encoding = self.resource.encoding
+
+        pushed = True
+        while pushed:
+            pushed, line = self._ino_read_message(termination, encoding)
+
+        if self.INO_TIMESTAMPS:
+            line = self._ino_strip_stamp(line)
+
+        return line
 
     def read(self, termination=None, encoding=None):
-        line = super().read()
-        parts = line.split('#')
+        if encoding is None:
+            encoding = self.resource.encoding
+
+        reply = self._ino_read_reply(termination, encoding).decode(encoding)
+        self.log_debug('Read {!r}', reply)
+        return reply
+
+    def ino_read_value(self, datatype):
+        """Read a reply and parse it straight from the received bytes.
 
-        for part in parts[:-1]:
-            self.log_debug(part.decode('utf-8'))
+        :param datatype: B, I, L or F (see DESCRIPTION).
+        """
+        return PARSE[datatype](self._ino_read_reply())
+
+    @classmethod
+    def ino_commands(cls):
+        """Commands handled by the bridge.
+
+        :return: list of (command, handler) tuples. The handler of the commands
+                 built in the bridge (INFO?, SYNC?, STATS?) is None.
+        """
+        commands = [('INFO?', None), ('SYNC?', None)]
+        if cls.INO_TIMESTAMPS:
+            commands.append(('TIME?', None))
+        if cls.INO_STATS:
+            commands.append(('STATS?', None))
+        if cls.INO_STATE:
+            commands.append(('STATE?', None))
+        commands.append(('INITIALIZE', 'wrapperCall_INITIALIZE'))
+        commands.append(('FINALIZE', 'wrapperCall_FINALIZE'))
 
-        return parts[-1]
+        for feat in ChainMap(cls._lantz_feats, cls._lantz_dictfeats).values():
+            if isinstance(feat, INOFeat):
+                commands.extend(feat.ino_commands())
+
+        for feat in cls.ino_range_feats():
+            commands.append((feat.ino_cmd + '*', 'wrapperRange_' + feat.ino_cmd))
+
+        return commands
+
+    @classmethod
+    def ino_range_feats(cls):
+        """Dictfeats with a range setter (see INO_RANGE_SET).
+        """
+        if not cls.INO_RANGE_SET:
+            return []
+        return [feat for feat in cls._lantz_dictfeats.values() if isinstance(feat, INODictFeat) and feat.fset]
+
+    @classmethod
+    def ino_validate(cls):
+        """Check that the board can tell apart all the commands.
+
+        SerialCommand only compares the first MAX_COMMAND_LENGTH characters
+        of a command, so longer commands sharing that prefix would collide.
+
+        :raises ValueError: if two commands collide.
+        """
+        seen = {}
+        for command, handler in cls.ino_commands():
+            truncated = command[:MAX_COMMAND_LENGTH]
+            if truncated in seen:
+                if seen[truncated] == command:
+                    raise ValueError('%s: command %s is defined twice.' % (cls.__qualname__, command))
+                raise ValueError('%s: commands %s and %s are indistinguishable for the board, '
+                                 'which only compares the first %d characters.'
+                                 % (cls.__qualname__, seen[truncated], command, MAX_COMMAND_LENGTH))
+            seen[truncated] = command
 
     @classmethod
     def ino_bridge_write(cls, folder):
+        """Generate the bridge files, writing only those that changed.
+
+        :return: list of written files.
+        """
+
+        cls.ino_validate()
+
+        commands = cls.ino_commands()
+
+        use_table = cls.INO_COMMAND_TABLE
+        if use_table is None:
+            use_table = len(commands) > COMMAND_TABLE_THRESHOLD
+
+        register = None if use_table else 'sCmd.addCommand'
 
         os.makedirs(folder, exist_ok=True)
 
         hfile = os.path.join(folder, 'inodriver_bridge.h')
         cppfile = os.path.join(folder, 'inodriver_bridge.cpp')
 
-        with open(cppfile, 'w', encoding='UTF-8') as fcpp, \
-            open(hfile, 'w', encoding='UTF-8') as fh:
+        with io.StringIO() as fcpp, io.StringIO() as fh:
 
             header = HEADER_DONOT.format(filename=inspect.getfile(cls),
                                          klass=cls.__qualname__,
@@ -338,22 +1681,80 @@ class INODriver(MessageBasedDriver):
 
             fcpp.write(header)
 
+            cm = ChainMap(cls._lantz_feats, cls._lantz_dictfeats)
+
             fh.write(bridge.IN_H_HEADER)
             fcpp.write(bridge.IN_CPP_HEADER)
 
+            if cls.INO_RX_BUDGET or cls.INO_TIME_BUDGET or cls.INO_TX_QUEUE:
+                # Commands are only processed with room for a (typical) reply.
+                reserve = min(cls.INO_TX_QUEUE or TX_BUFFER, REPLY_RESERVE)
+                fh.write(bridge.BUDGET_H % (cls.INO_RX_BUDGET or 0xFFFF, cls.INO_TIME_BUDGET or 0xFFFFFFFF,
+                                            cls.INO_TX_QUEUE, reserve))
+                if cls.INO_TX_QUEUE:
+                    fcpp.write(bridge.REPLY_QUEUE)
+                else:
+                    fcpp.write(bridge.REPLY_SERIAL)
+                    fcpp.write(bridge.REPLY_DIRECT)
+                fcpp.write(bridge.POLL_BUDGET)
+            else:
+                fcpp.write(bridge.REPLY_SERIAL)
+                fcpp.write(bridge.POLL)
+
+            ranged = cls.ino_range_feats()
+
+            for feat_name, feat in cm.items():
+                if isinstance(feat, INODictFeat) and (feat.ino_indexed or feat in ranged):
+                    feat.ino_write_keys(fh)
+
+            if cls.INO_STATS:
+                fh.write(bridge.STATS_H % len(commands))
+                fcpp.write(bridge.STATS_CPP)
+            else:
+                fcpp.write(bridge.LOOP)
+
+            if cls.INO_STATE:
+                fh.write(bridge.STATE_H)
+
+            if cls.INO_TIMESTAMPS:
+                fh.write(bridge.TIME_H)
+                fcpp.write(bridge.TIME_CPP)
+
+            aggregates = [feat for feat in cm.values() if isinstance(feat, INOFeat) and feat.ino_push_command]
+            if aggregates:
+                fh.write(bridge.AGGREGATE_H)
+                fcpp.write(bridge.AGGREGATE_CPP)
+
+            if use_table:
+                entries = sorted((command[:MAX_COMMAND_LENGTH], handler)
+                                 for command, handler in commands if handler is not None)
+                fcpp.write(COMMAND_TABLE % ',\n'.join('  {"%s", %s}' % entry for entry in entries))
+
             fh.write('void bridge_setup();')
             fcpp.write('void bridge_setup() {')
 
             fcpp.write(bridge.IN_SETUP)
 
-            _write_action_setup(fcpp, 'initialize', 'INITIALIZE')
-            _write_action_setup(fcpp, 'finalize', 'FINALIZE')
+            if cls.INO_STATS:
+                fcpp.write(bridge.STATS_SETUP)
 
-            cm = ChainMap(cls._lantz_feats, cls._lantz_dictfeats)
+            if cls.INO_STATE:
+                fcpp.write(bridge.STATE_SETUP)
+
+            if cls.INO_TIMESTAMPS:
+                fcpp.write(bridge.TIME_SETUP)
+
+            if use_table:
+                fcpp.write(COMMAND_TABLE_SETUP % len(entries))
+
+            _write_action_setup(fcpp, 'initialize', 'INITIALIZE', register)
+            _write_action_setup(fcpp, 'finalize', 'FINALIZE', register)
 
             for feat_name, feat in cm.items():
                 if isinstance(feat, INOFeat):
-                    feat.ino_write_setup(fcpp)
+                    feat.ino_write_setup(fcpp, register)
+                    if feat in ranged:
+                        feat.ino_write_range_setup(fcpp, register)
 
             fcpp.write('}')
 
@@ -369,10 +1770,29 @@ class INODriver(MessageBasedDriver):
                 if isinstance(feat, INOFeat):
                     fcpp.write('// COMMAND: %s, FEAT: %s\n' % (feat.ino_cmd, feat.name))
                     feat.ino_write_wrapper(fh, fcpp)
+                    if feat in ranged:
+                        feat.ino_write_range_wrapper(fh, fcpp)
                     fcpp.write('\n\n')
 
+            if cls.INO_STATE:
+                calls = [feat.ino_state_call(key) for feat, key in cls.ino_state_layout()]
+                fcpp.write('// COMMAND: STATE?\n')
+                fcpp.write(bridge.STATE_BEGIN)
+                fcpp.write(bridge.STATE_SEPARATOR.join(bridge.STATE_VALUE % call for call in calls))
+                fcpp.write(bridge.STATE_END)
+
+            if aggregates:
+                fcpp.write('// Aggregate feats\n')
+                fcpp.write(bridge.AGGREGATE_LOOP_BEGIN)
+                for feat in aggregates:
+                    feat.ino_write_loop(fcpp)
+                fcpp.write(bridge.AGGREGATE_LOOP_END)
+
             fh.write('\n\n#endif // inodriver_bridge_h')
 
+            return [filename for filename, content in ((hfile, fh.getvalue()), (cppfile, fcpp.getvalue()))
+                    if common.write_if_changed(filename, content)]
+
     @classmethod
     def ino_user_write(cls, folder, overwrite=False):
 
@@ -416,19 +1836,112 @@ class INODriver(MessageBasedDriver):
             fh.write('\n\n#endif // inodriver_user_h')
 
 
-class INOFeat:
+class _SingleFlightMixin:
+    """Share concurrent gets of the same feat (see INODriver.INO_SINGLE_FLIGHT).
+    """
+
+    #: Seconds during which the last value is returned without querying the board.
+    ino_fresh = 0
+
+    def get(self, instance, objtype=None):
+        return instance._ino_single_flight(self, lambda: super(_SingleFlightMixin, self).get(instance, objtype),
+                                           self.ino_fresh)
+
+    def set(self, instance, value):
+        try:
+            return super().set(instance, value)
+        finally:
+            instance._ino_invalidate(self)
+
+
+class _CodecMixin:
+    """Replace the generic lantz processors by functions compiled for the
+    configuration of the feat (see lantz.ino.codec).
+    """
+
+    def rebuild(self, instance=None):
+        super().rebuild(instance)
+
+        try:
+            decode = codec.compile_decoder(self.get_funcs_iget(instance), self.values_iget(instance),
+                                           self.units_iget(instance))
+            encode = codec.compile_encoder(self.values_iget(instance), self.units_iget(instance),
+                                           self.limits_iget(instance), self.set_funcs_iget(instance))
+        except TypeError:
+            # Keep the lantz processors.
+            return
+
+        self.post_get_iset(instance, decode)
+        self.pre_set_iset(instance, encode)
+
+
+class _INOKeyFeat(_SingleFlightMixin, _CodecMixin, Feat):
+    """Subproperty for each key of an INODictFeat.
+    """
+
+
+class INOFeat(_SingleFlightMixin, _CodecMixin):
 
     INO_DATATYPE = None
 
-    def __init__(self, ino_cmd):
+    #: If False, the feat is not part of the STATE? reply (e.g. reading it has side effects).
+    INO_IN_STATE = True
+
+    #: Command setting the push period (see INODriver.ino_push), None if the feat cannot be pushed.
+    ino_push_command = None
+
+    def __init__(self, ino_cmd, fresh=0):
+        """
+        :param fresh: seconds during which the last value read is returned
+                      without querying the board.
+        """
         if not ino_cmd.isidentifier():
             raise ValueError("'%s' is not a valid command.\n(Just letters and underscores. "
                              "Numbers are allowed but not at the beginning)")
 
         self.ino_cmd = ino_cmd
 
-    def ino_write_setup(self, fo):
-        _write_feat_setup(fo, self.name, self.ino_cmd, self.INO_DATATYPE, self.fget, self.fset)
+        self.ino_fresh = fresh
+
+        #: Description of the wire value in the generated code (None for the default one).
+        self.ino_description = None
+
+        # Extra keyword arguments for the Feat constructor (e.g. get_funcs).
+        self._ino_feat_kwargs = {}
+
+    def _build_feat_kwargs(self, owner, name):
+        self._ino_compile_formats()
+        kwargs = super()._build_feat_kwargs(owner, name)
+        kwargs.update(self._ino_feat_kwargs)
+        return kwargs
+
+    def _ino_compile_formats(self):
+        self._ino_format_set = codec.compile_format(self.set_cmd, 'value') if self.set_cmd else None
+
+    def local_set(self, instance, value):
+        return instance.set_query(self._ino_format_set(value))
+
+    def ino_commands(self):
+        """Commands of this feat as (command, handler) tuples.
+        """
+        commands = []
+        if self.fget:
+            commands.append((self.ino_cmd + '?', 'wrapperGet_' + self.ino_cmd))
+        if self.fset:
+            commands.append((self.ino_cmd, 'wrapperSet_' + self.ino_cmd))
+        return commands
+
+    def ino_get_command(self, key=None):
+        """Command sent to get the value."""
+        return self.get_cmd
+
+    def ino_state_call(self, key=None):
+        """Expression that gets the value in the generated STATE? handler."""
+        return 'get_%s()' % self.ino_cmd
+
+    def ino_write_setup(self, fo, register='sCmd.addCommand'):
+        _write_feat_setup(fo, self.name, self.ino_cmd, self.INO_DATATYPE, self.fget, self.fset, register,
+                          description=self.ino_description)
 
     def ino_write_wrapper(self, fh, fo):
         _write_feat_wrapper(fh, fo, self.ino_cmd, self.INO_DATATYPE, self.fget, self.fset)
@@ -443,8 +1956,18 @@ class INODictFeat(INOFeat):
 
     INO_KEY_DATATYPE = None
 
-    def __init__(self, ino_cmd, keys):
-        INOFeat.__init__(self, ino_cmd)
+    def __init__(self, ino_cmd, keys, indexed=None, fresh=0):
+        """
+        :param keys: valid keys. The order of a list or tuple is kept, other
+                     iterables are sorted.
+        :param indexed: exchange the index of the key instead of the key itself.
+                        The generated code provides a <CMD>_KEYS table
+                        (and an enum for string keys). Defaults to True for
+                        string keys (which cannot be False) and False otherwise.
+        :param fresh: seconds during which the last value read (for each key)
+                      is returned without querying the board.
+        """
+        INOFeat.__init__(self, ino_cmd, fresh)
 
         types = set(map(type, keys))
 
@@ -464,11 +1987,110 @@ class INODictFeat(INOFeat):
         else:
             raise ValueError('Cannot handle keys of type %s' % ty)
 
-    def ino_write_setup(self, fo):
-        _write_dictfeat_setup(fo, self.name, self.ino_cmd, self.INO_DATATYPE, self.INO_KEY_DATATYPE, self.fget, self.fset)
+        if indexed is None:
+            indexed = self.INO_KEY_DATATYPE == 'S'
+        elif not indexed and self.INO_KEY_DATATYPE == 'S':
+            raise ValueError('String keys can only be exchanged as indices (indexed=True), '
+                             'the board cannot receive them')
+
+        #: Declared keys in index order.
+        self.ino_keys = list(keys) if isinstance(keys, (list, tuple)) else sorted(keys)
+
+        #: True if the index of the key is exchanged.
+        self.ino_indexed = indexed
+
+        #: Keys to be given to the DictFeat (mapping to the index if indexed).
+        self.ino_wire_keys = keys
+
+        #: Type of the declared keys.
+        self.ino_key_type = self.INO_KEY_DATATYPE
+
+        if indexed:
+            self.INO_KEY_DATATYPE = 'I'
+            self.ino_wire_keys = {key: ndx for ndx, key in enumerate(self.ino_keys)}
+
+    def build_subproperty(self, key, fget, fset, instance=None):
+        # Gets are coalesced for each key.
+        p = _INOKeyFeat(fget=fget, fset=fset, **dict(self.config_iter(instance)))
+        p.ino_fresh = self.ino_fresh
+        if self._simulator is not None:
+            p._simulator = self._simulator(key)
+        return p
+
+    def _ino_compile_formats(self):
+        self._ino_format_get = codec.compile_format(self.get_cmd, 'key') if self.get_cmd else None
+        self._ino_format_set = codec.compile_format(self.set_cmd, 'key', 'value') if self.set_cmd else None
+        self._ino_format_value = codec.compile_field(self.set_cmd, 'value') if self.set_cmd else None
+
+    def local_get(self, instance, key):
+        return instance.get_query(self._ino_format_get(key))
+
+    def local_set(self, instance, key, value):
+        return instance.set_query(self._ino_format_set(key, value))
+
+    def ino_wire_key(self, key):
+        if isinstance(self.ino_wire_keys, dict):
+            return self.ino_wire_keys[key]
+        return key
+
+    def ino_get_command(self, key=None):
+        if not self.get_cmd:
+            return None
+        return self.get_cmd.format(key=self.ino_wire_key(key))
+
+    def ino_state_call(self, key=None):
+        wire_key = self.ino_wire_key(key)
+        if self.INO_KEY_DATATYPE == 'B':
+            literal = str(int(wire_key))
+        elif self.INO_KEY_DATATYPE == 'S':
+            literal = json.dumps(wire_key)
+        else:
+            literal = repr(wire_key)
+        return 'get_%s(%s)' % (self.ino_cmd, literal)
+
+    def ino_range_commands(self, start, values, length=LINE_BUFFER - LINE_PREFIX):
+        """Range set commands (see INODriver.INO_RANGE_SET) for consecutive keys.
+
+        The values are split in as many commands as needed to fit the line buffer of the board.
+
+        :param start: index (in ino_keys) of the first key.
+        :param values: values as sent to the board (i.e. after the setter processors).
+        :param length: maximum length of a command.
+        :return: list of (start index, number of keys, command) tuples.
+        """
+        commands = []
+        fmt = self._ino_format_value
+        words = [fmt(value) for value in values]
+        first = 0
+        while first < len(words):
+            line = '%s* %d %s' % (self.ino_cmd, start + first, words[first])
+            end = first + 1
+            while end < len(words) and len(line) + 1 + len(words[end]) <= length:
+                line += ' ' + words[end]
+                end += 1
+            if len(line) > length:
+                raise ValueError('%s does not fit the line buffer of the board' % line)
+            commands.append((start + first, end - first, line))
+            first = end
+        return commands
+
+    def ino_write_keys(self, fh):
+        _write_keys_table(fh, self.ino_cmd, self.ino_key_type, self.ino_keys, self.ino_indexed)
+
+    def ino_write_setup(self, fo, register='sCmd.addCommand'):
+        key_description = 'index in %s_KEYS' % self.ino_cmd if self.ino_indexed else None
+        _write_dictfeat_setup(fo, self.name, self.ino_cmd, self.INO_DATATYPE, self.INO_KEY_DATATYPE, self.fget, self.fset,
+                              register, description=self.ino_description, key_description=key_description)
 
     def ino_write_wrapper(self, fh, fo):
-        _write_dictfeat_wrapper(fh, fo, self.ino_cmd, self.INO_DATATYPE, self.INO_KEY_DATATYPE, self.fget, self.fset)
+        _write_dictfeat_wrapper(fh, fo, self.ino_cmd, self.INO_DATATYPE, self.INO_KEY_DATATYPE, self.fget, self.fset,
+                                self.ino_indexed)
+
+    def ino_write_range_setup(self, fo, register='sCmd.addCommand'):
+        _write_range_setup(fo, self.ino_cmd, self.INO_DATATYPE, register)
+
+    def ino_write_range_wrapper(self, fh, fo):
+        _write_range_wrapper(fh, fo, self.ino_cmd, self.INO_DATATYPE, self.ino_indexed)
 
     def ino_write_wrapped(self, fh, fo):
         _write_dictfeat_wrapped(fh, fo, self.ino_cmd, self.INO_DATATYPE, self.INO_KEY_DATATYPE, self.fget, self.fset)
@@ -0,0 +1,778 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.ino.bench
+    ~~~~~~~~~~~~~~~
+
+    Benchmarks and performance budgets.
+
+    Run them with::
+
+        python -m lantz.ino.bench <benchmark> [options]
+
+    Each benchmark prints its measurements and exits with a non zero
+    status if a budget is exceeded, so they can be used in CI.
+
+    The lantz.ino package provides helper classes and methods to work with Arduino.
+
+    :copyright: 2018 by The Lantz Authors
+    :license: BSD, see LICENSE for more details.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+
+#: Maximum import time (in microseconds) of each module on top of the parent
+#: `lantz` package, which is imported before measuring.
+IMPORT_BUDGET = {
+    'lantz.ino': 2000,
+    'lantz.ino.__main__': 10000,
+}
+
+#: Modules that must not be imported just by importing the given module.
+IMPORT_FORBIDDEN = ('yaml', 'lantz.qt', 'lantz.ino.base', 'lantz.ino.feat')
+
+
+def parse_importtime(stderr):
+    """Parse the output of `python -X importtime`.
+
+    :return: list of (self_us, cumulative_us, depth, module name)
+    """
+    out = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            # Header line
+            continue
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped) - 1) // 2
+        out.append((self_us, cumulative_us, depth, stripped.rstrip()))
+
+    return out
+
+
+def measure_import(module, baseline='lantz'):
+    """Measure the import of a module in a fresh interpreter.
+
+    The baseline module is imported first and excluded from the measurement.
+
+    :return: (cumulative time in microseconds, set of imported modules)
+    """
+    code = 'import %s; import %s' % (baseline, module)
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                         universal_newlines=True)
+
+    if out.returncode:
+        raise RuntimeError('Could not import %s:\n%s' % (module, out.stderr))
+
+    entries = parse_importtime(out.stderr)
+
+    # Skip everything up to (and including) the baseline top level entry.
+    for ndx, (_, _, depth, name) in enumerate(entries):
+        if depth == 0 and name == baseline:
+            entries = entries[ndx + 1:]
+            break
+
+    total = sum(cumulative for _, cumulative, depth, _ in entries if depth == 0)
+    return total, set(name for _, _, _, name in entries)
+
+
+def importtime(args=None):
+
+    parser = argparse.ArgumentParser(description='Check the import time budget.')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='Number of measurements (the best is kept).')
+    args = parser.parse_args(args)
+
+    failed = False
+    for module, budget in IMPORT_BUDGET.items():
+        best, modules = min(measure_import(module) for _ in range(args.repeat))
+
+        forbidden = sorted(name for name in modules
+                           if any(name == f or name.startswith(f + '.') for f in IMPORT_FORBIDDEN))
+
+        status = 'OK' if best <= budget and not forbidden else 'FAIL'
+        print('%-24s %8d us (budget %8d us) %s' % (module, best, budget, status))
+        for name in forbidden:
+            print('    imports %s' % name)
+
+        failed = failed or status == 'FAIL'
+
+    return 1 if failed else 0
+
+
+#: Budget of the generator benchmark for the default number of feats:
+#: seconds to build and generate the class, peak of traced memory in bytes.
+GENERATE_BUDGET = (5.0, 64 * 1024 ** 2)
+
+
+def synthetic_driver(feats, dictfeats=0, name='SyntheticDriver'):
+    """Build an INODriver subclass with many feats.
+
+    The class is published in this module so it can be pickled (by reference)
+    while hashing it.
+    """
+    from lantz.ino import INODriver, IntFeat, QuantityFeat, BoolDictFeat
+
+    body = {'__module__': __name__}
+    for ndx in range(feats):
+        if ndx % 2:
+            body['feat%05d' % ndx] = IntFeat('F%05d' % ndx)
+        else:
+            body['feat%05d' % ndx] = QuantityFeat('F%05d' % ndx, units='V')
+
+    for ndx in range(dictfeats):
+        body['dictfeat%05d' % ndx] = BoolDictFeat('D%05d' % ndx, keys=['a', 'b', 'c'])
+
+    cls = type(name, (INODriver, ), body)
+    globals()[name] = cls
+    return cls
+
+
+def generate(args=None):
+
+    parser = argparse.ArgumentParser(description='Build, validate and generate the bridge of a large driver.')
+    parser.add_argument('-n', '--feats', type=int, default=2000, help='Number of feats.')
+    parser.add_argument('-d', '--dictfeats', type=int, default=500, help='Number of dictfeats.')
+    args = parser.parse_args(args)
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+
+    cls = synthetic_driver(args.feats, args.dictfeats)
+    t1 = time.perf_counter()
+
+    commands = len(cls.ino_commands())
+
+    with tempfile.TemporaryDirectory() as folder:
+        cls.ino_bridge_write(folder)
+        cls.ino_user_write(folder)
+        size = sum(os.path.getsize(os.path.join(folder, filename)) for filename in os.listdir(folder))
+
+    t2 = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    budget_time, budget_memory = GENERATE_BUDGET
+    scale = (args.feats + args.dictfeats) / 2500
+
+    status = 'OK' if t2 - t0 <= budget_time * scale and peak <= budget_memory * scale else 'FAIL'
+
+    print('%d feats, %d dictfeats, %d commands' % (args.feats, args.dictfeats, commands))
+    print('class  %8.3f s' % (t1 - t0))
+    print('write  %8.3f s (%d bytes)' % (t2 - t1, size))
+    print('total  %8.3f s (budget %.3f s), peak memory %.1f MiB (budget %.1f MiB) %s'
+          % (t2 - t0, budget_time * scale, peak / 1024 ** 2, budget_memory * scale / 1024 ** 2, status))
+
+    return 0 if status == 'OK' else 1
+
+
+def _visa_read(inst):
+    """Receive path of lantz-ino 0.5.2: a line from the VISA resource split on #.
+    """
+    from lantz.core import MessageBasedDriver
+
+    parts = MessageBasedDriver.read(inst).split('#')
+    for part in parts[:-1]:
+        inst.log_debug(part)
+    return parts[-1]
+
+
+def _buffered_read(inst):
+    return inst.read()
+
+
+def _buffered_read_value(inst):
+    return inst.ino_read_value('F')
+
+
+def _measure_rx(read, lines, payload):
+    import os
+    import pty
+    import tty
+
+    from lantz.core.messagebased import MessageBasedDriver
+    from lantz.ino import INODriver
+
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+
+    inst = INODriver.via_serial(os.ttyname(slave))
+    # Open the port without the settle time and INITIALIZE of INODriver.
+    MessageBasedDriver.initialize(inst)
+
+    data = payload * lines
+
+    def feed():
+        view = memoryview(data)
+        while view:
+            view = view[os.write(master, view[:4096]):]
+
+    writer = threading.Thread(target=feed, daemon=True)
+
+    try:
+        t0 = time.perf_counter()
+        writer.start()
+        for _ in range(lines):
+            read(inst)
+        return time.perf_counter() - t0
+    finally:
+        writer.join()
+        MessageBasedDriver.finalize(inst)
+        os.close(master)
+        os.close(slave)
+
+
+def rx(args=None):
+
+    parser = argparse.ArgumentParser(description='Compare the receive paths of INODriver through a pseudo terminal.')
+    parser.add_argument('-n', '--lines', type=int, default=20000, help='Number of lines.')
+    parser.add_argument('--debug', action='store_true', help='Prefix each reply with a debug message.')
+    args = parser.parse_args(args)
+
+    payload = b'1234.56\r\n'
+    if args.debug:
+        payload = b'debug message#' + payload
+
+    results = [(name, _measure_rx(read, args.lines, payload))
+               for name, read in (('visa', _visa_read),
+                                  ('buffered', _buffered_read),
+                                  ('buffered value', _buffered_read_value))]
+
+    reference = results[0][1]
+    for name, elapsed in results:
+        print('%-16s %8.3f s %10.0f lines/s  x%.2f' % (name, elapsed, args.lines / elapsed, reference / elapsed))
+
+    return 0 if results[1][1] <= reference else 1
+
+
+def _codec_driver():
+    from lantz.ino import INODriver, BoolFeat, IntFeat, QuantityFeat
+
+    class CodecDriver(INODriver):
+        count = IntFeat('CNT', limits=(0, 1000))
+        voltage = QuantityFeat('VOLT', units='V', limits=(0, 5))
+        fixed = QuantityFeat('FIX', units='V', fixed_point=(0.01, 16))
+        led = BoolFeat('LED')
+
+    return CodecDriver
+
+
+def _time_per_call(func, value, number):
+    t0 = time.perf_counter()
+    for _ in range(number):
+        func(value)
+    return (time.perf_counter() - t0) / number
+
+
+def codec(args=None):
+
+    parser = argparse.ArgumentParser(description='Compare the compiled feat codecs with the generic lantz processors.')
+    parser.add_argument('-n', '--number', type=int, default=20000, help='Calls of each function.')
+    args = parser.parse_args(args)
+
+    from lantz.core import Q_
+    from lantz.core.feat import Feat
+
+    cls = _codec_driver()
+
+    # feat name, reply of the board, value set by the user
+    cases = (('count', '42', 42),
+             ('voltage', '2.50', Q_(2.5, 'V')),
+             ('fixed', '-150', Q_(-1.5, 'V')),
+             ('led', '1', True))
+
+    totals = [0.0, 0.0]
+    print('%-8s %-4s %10s %10s' % ('feat', '', 'generic', 'compiled'))
+    for name, reply, value in cases:
+        feat = cls._lantz_feats[name]
+
+        # The processors built by lantz.
+        Feat.rebuild(feat)
+        generic = (feat.post_get_iget(None),
+                   lambda v, pre_set=feat.pre_set_iget(None): feat.set_cmd.format(pre_set(v)))
+
+        feat.rebuild()
+        compiled = (feat.post_get_iget(None),
+                    lambda v, pre_set=feat.pre_set_iget(None): feat._ino_format_set(pre_set(v)))
+
+        for ndx, (label, argument) in enumerate((('get', reply), ('set', value))):
+            if generic[ndx](argument) != compiled[ndx](argument):
+                raise RuntimeError('%s %s: %r != %r' % (name, label, generic[ndx](argument), compiled[ndx](argument)))
+
+            before = _time_per_call(generic[ndx], argument, args.number)
+            after = _time_per_call(compiled[ndx], argument, args.number)
+            totals[0] += before
+            totals[1] += after
+            print('%-8s %-4s %8.2f us %8.2f us  x%.1f' % (name, label, before * 1e6, after * 1e6, before / after))
+
+    print('%-13s %8.2f us %8.2f us  x%.1f' % ('total', totals[0] * 1e6, totals[1] * 1e6, totals[0] / totals[1]))
+
+    return 0 if totals[1] <= totals[0] else 1
+
+
+#: Baud rate of the generated sketch.
+BAUD_RATE = 9600
+
+
+def _emulated_sketch(cls, folder):
+    from lantz.ino.templates import ino, serialcommand
+
+    cls.ino_bridge_write(folder)
+    cls.ino_user_write(folder)
+
+    for filename, content in (('%s.ino' % cls.__name__, ino.CPP),
+                              ('SerialCommand.cpp', serialcommand.CPP),
+                              ('SerialCommand.h', serialcommand.H)):
+        with open(os.path.join(folder, filename), mode='w', encoding='utf-8') as fo:
+            fo.write(content)
+
+
+def _connect(port, cls=None):
+    from lantz.core.messagebased import MessageBasedDriver
+    from lantz.ino import INODriver
+
+    inst = (cls or INODriver).via_serial(port)
+    # Open the port without the settle time and INITIALIZE of INODriver.
+    MessageBasedDriver.initialize(inst)
+    return inst
+
+
+def emulate(args=None):
+
+    parser = argparse.ArgumentParser(description='Soak, overflow and throughput test of a sketch built for the host.')
+    parser.add_argument('-n', '--feats', type=int, default=20, help='Number of feats.')
+    parser.add_argument('-s', '--seconds', type=float, default=5.0, help='Duration of the soak test.')
+    parser.add_argument('--flood', type=int, default=400, help='Commands sent without reading the replies.')
+    args = parser.parse_args(args)
+
+    from lantz.core.messagebased import MessageBasedDriver
+    from lantz.ino import emulate as emu
+
+    try:
+        emu.check_compiler()
+    except FileNotFoundError as e:
+        print('Skipped: %s' % e)
+        return 0
+
+    cls = synthetic_driver(args.feats, name='EmulatedDriver')
+    commands = [feat.get_cmd for feat in cls._lantz_feats.values() if getattr(feat, 'get_cmd', None)]
+
+    failures = []
+    with tempfile.TemporaryDirectory() as folder:
+        _emulated_sketch(cls, folder)
+
+        t0 = time.perf_counter()
+        executable = emu.build(folder)
+        print('build  %8.3f s' % (time.perf_counter() - t0))
+
+        with emu.Emulator(executable) as emulator:
+            inst = _connect(emulator.port)
+            try:
+                queries = errors = 0
+                t0 = time.perf_counter()
+                while time.perf_counter() - t0 < args.seconds:
+                    for command in commands:
+                        try:
+                            int(float(inst.query(command)))
+                        except Exception:
+                            errors += 1
+                    queries += len(commands)
+                elapsed = time.perf_counter() - t0
+                print('soak   %8d queries %10.0f queries/s  %d errors' % (queries, queries / elapsed, errors))
+                if errors:
+                    failures.append('soak')
+
+                # Lines longer than the buffer of SerialCommand must not break the next command.
+                inst.query('X' * 100)
+                reply = inst.query(commands[0])
+                print('long line: next reply %r' % reply)
+            except Exception as e:
+                print('long line: %s' % e)
+                failures.append('long line')
+            finally:
+                MessageBasedDriver.finalize(inst)
+
+        # Replies longer than the commands: the sketch blocks while sending at the
+        # baud rate and the receive buffer of the board overflows.
+        with emu.Emulator(executable, uart=True) as emulator:
+            inst = _connect(emulator.port)
+            try:
+                data = b'INFO?\n' * args.flood
+                inst.resource.write_raw(data)
+                # Wait until the board received everything (10 bits per byte).
+                time.sleep(len(data) * 10 / BAUD_RATE + 0.5)
+            finally:
+                MessageBasedDriver.finalize(inst)
+
+        print('flood  %8d commands, %d bytes dropped by the board' % (args.flood, emulator.dropped))
+        if not emulator.dropped:
+            failures.append('flood')
+
+    if failures:
+        print('FAIL: %s' % ', '.join(failures))
+
+    return 1 if failures else 0
+
+
+def _pipe_consumer(conn, total):
+    import numpy as np
+    from lantz.ino.sharedring import SAMPLE_DTYPE
+
+    received = 0
+    t0 = time.process_time()
+    while received < total:
+        received += len(np.frombuffer(conn.recv_bytes(), dtype=SAMPLE_DTYPE))
+    conn.send(time.process_time() - t0)
+
+
+def _ring_consumer(name, total, conn):
+    from lantz.ino.sharedring import SharedRingReader
+
+    reader = SharedRingReader(name, start=0)
+    received = 0
+    t0 = time.process_time()
+    while received < total:
+        chunks = reader.read()
+        if not chunks:
+            time.sleep(0.001)
+        received += sum(len(view) for _, view in chunks)
+    conn.send((time.process_time() - t0, reader.lost))
+    reader.close()
+
+
+def sharedring(args=None):
+
+    parser = argparse.ArgumentParser(description='Fan out samples to consumer processes through pipes and a shared ring.')
+    parser.add_argument('-n', '--samples', type=int, default=2000000, help='Number of samples.')
+    parser.add_argument('-c', '--consumers', type=int, default=3, help='Number of consumer processes.')
+    parser.add_argument('--chunk', type=int, default=1000, help='Samples published at once.')
+    args = parser.parse_args(args)
+
+    import multiprocessing
+    import numpy as np
+
+    try:
+        from lantz.ino.sharedring import SharedRing, SAMPLE_DTYPE
+        SharedRing(capacity=1).close()
+    except RuntimeError as e:
+        print('Skipped: %s' % e)
+        return 0
+
+    chunk = np.zeros(args.chunk, dtype=SAMPLE_DTYPE)
+    chunks = args.samples // args.chunk
+    total = chunks * args.chunk
+
+    # Pipes: each chunk is copied to every consumer.
+    pipes = [multiprocessing.Pipe() for _ in range(args.consumers)]
+    procs = [multiprocessing.Process(target=_pipe_consumer, args=(child, total)) for _, child in pipes]
+    for proc in procs:
+        proc.start()
+
+    t0, c0 = time.perf_counter(), time.process_time()
+    for _ in range(chunks):
+        data = chunk.tobytes()
+        for parent, _ in pipes:
+            parent.send_bytes(data)
+    publisher = time.process_time() - c0
+    consumers = sum(parent.recv() for parent, _ in pipes)
+    pipe = (time.perf_counter() - t0, publisher, consumers)
+    for proc in procs:
+        proc.join()
+
+    # Shared ring: large enough to lose nothing.
+    ring = SharedRing(capacity=total)
+    pipes = [multiprocessing.Pipe() for _ in range(args.consumers)]
+    procs = [multiprocessing.Process(target=_ring_consumer, args=(ring.name, total, child)) for _, child in pipes]
+    for proc in procs:
+        proc.start()
+
+    t0, c0 = time.perf_counter(), time.process_time()
+    for _ in range(chunks):
+        ring.extend(chunk)
+    publisher = time.process_time() - c0
+    results = [parent.recv() for parent, _ in pipes]
+    shared = (time.perf_counter() - t0, publisher, sum(cpu for cpu, _ in results))
+    lost = sum(lost for _, lost in results)
+    for proc in procs:
+        proc.join()
+    ring.close()
+
+    print('%d samples, %d consumers' % (total, args.consumers))
+    print('%-8s %10s %14s %14s' % ('', 'elapsed', 'publisher cpu', 'consumers cpu'))
+    for name, (elapsed, publisher, consumers) in (('pipes', pipe), ('ring', shared)):
+        print('%-8s %8.3f s %12.3f s %12.3f s' % (name, elapsed, publisher, consumers))
+    print('lost %d' % lost)
+
+    return 0 if shared[1] + shared[2] <= pipe[1] + pipe[2] and not lost else 1
+
+
+#: Minimum reduction of the bytes exchanged per sample by the aggregate benchmark.
+AGGREGATE_BUDGET = 100
+
+
+def _traffic(path):
+    from lantz.ino.record import LogReader
+
+    with LogReader(path) as log:
+        _, written, read, _ = log.summary()
+    return written + read
+
+
+def aggregate(args=None):
+
+    parser = argparse.ArgumentParser(description='Bytes exchanged per sample polling a signal and pushing its aggregate.')
+    parser.add_argument('-s', '--seconds', type=float, default=3.0, help='Duration of each measurement.')
+    parser.add_argument('-p', '--period', type=float, default=0.1, help='Seconds between pushes.')
+    args = parser.parse_args(args)
+
+    from lantz.core.messagebased import MessageBasedDriver
+    from lantz.ino import emulate as emu
+    from lantz.ino import INODriver, QuantityFeat, AggregateFeat
+
+    try:
+        emu.check_compiler()
+    except FileNotFoundError as e:
+        print('Skipped: %s' % e)
+        return 0
+
+    cls = type('AggregateDriver', (INODriver, ), {'__module__': __name__,
+                                                  'raw': QuantityFeat('RAW', units='V', setter=False),
+                                                  'signal': AggregateFeat('SIG', units='V')})
+    globals()[cls.__name__] = cls
+
+    with tempfile.TemporaryDirectory() as folder:
+        _emulated_sketch(cls, folder)
+        executable = emu.build(folder)
+        log = os.path.join(folder, 'traffic.log')
+
+        with emu.Emulator(executable) as emulator:
+            inst = _connect(emulator.port, cls)
+            try:
+                # Every sample crosses the link.
+                inst.ino_record(log)
+                polled = 0
+                t0 = time.perf_counter()
+                while time.perf_counter() - t0 < args.seconds:
+                    inst.raw
+                    polled += 1
+                inst.ino_record(None)
+                raw = _traffic(log) / polled
+
+                # Only the aggregates cross the link.
+                inst.ino_record(log)
+                pushes = []
+                inst.ino_push('signal', args.period, callback=lambda timestamp, value: pushes.append(value))
+                inst.ino_listen(args.seconds)
+                inst.ino_push('signal', 0)
+                inst.ino_record(None)
+                aggregated = sum(value.count for value in pushes)
+                pushed = _traffic(log) / max(aggregated, 1)
+            finally:
+                MessageBasedDriver.finalize(inst)
+
+    print('%-10s %10s %14s' % ('', 'samples', 'bytes/sample'))
+    print('%-10s %10d %14.3f' % ('poll', polled, raw))
+    print('%-10s %10d %14.5f  (%d pushes)' % ('aggregate', aggregated, pushed, len(pushes)))
+    print('reduction x%.0f' % (raw / pushed))
+
+    return 0 if aggregated and raw / pushed >= AGGREGATE_BUDGET else 1
+
+
+#: Minimum speedup of unacknowledged setters.
+UNACKNOWLEDGED_BUDGET = 1.5
+
+
+def unacknowledged(args=None):
+
+    parser = argparse.ArgumentParser(description='Setter sweep waiting for each OK and unacknowledged.')
+    parser.add_argument('-n', '--sets', type=int, default=2000, help='Number of values set.')
+    args = parser.parse_args(args)
+
+    from lantz.core.messagebased import MessageBasedDriver
+    from lantz.ino import emulate as emu
+
+    try:
+        emu.check_compiler()
+    except FileNotFoundError as e:
+        print('Skipped: %s' % e)
+        return 0
+
+    cls = synthetic_driver(2, name='UnacknowledgedDriver')
+
+    with tempfile.TemporaryDirectory() as folder:
+        _emulated_sketch(cls, folder)
+        executable = emu.build(folder)
+
+        with emu.Emulator(executable) as emulator:
+            inst = _connect(emulator.port, cls)
+            try:
+                t0 = time.perf_counter()
+                for value in range(args.sets):
+                    inst.feat00001 = value
+                acknowledged = time.perf_counter() - t0
+
+                t0 = time.perf_counter()
+                with inst.ino_unacknowledged():
+                    for value in range(args.sets):
+                        inst.feat00001 = value
+                unacknowledged = time.perf_counter() - t0
+            finally:
+                MessageBasedDriver.finalize(inst)
+
+    print('%-15s %10.1f us/set' % ('acknowledged', acknowledged / args.sets * 1e6))
+    print('%-15s %10.1f us/set' % ('unacknowledged', unacknowledged / args.sets * 1e6))
+    print('speedup x%.1f' % (acknowledged / unacknowledged))
+
+    return 0 if acknowledged / unacknowledged >= UNACKNOWLEDGED_BUDGET else 1
+
+
+#: Maximum time (in seconds) to initialize a driver connected to a running board without reset.
+RECONNECT_BUDGET = 0.5
+
+
+def reconnect(args=None):
+
+    parser = argparse.ArgumentParser(description='Time to reconnect to a running sketch without resetting it.')
+    parser.add_argument('-n', '--connections', type=int, default=5, help='Number of connections.')
+    args = parser.parse_args(args)
+
+    from lantz.ino import emulate as emu
+
+    try:
+        emu.check_compiler()
+    except FileNotFoundError as e:
+        print('Skipped: %s' % e)
+        return 0
+
+    cls = synthetic_driver(2, name='ReconnectDriver')
+
+    with tempfile.TemporaryDirectory() as folder:
+        _emulated_sketch(cls, folder)
+        executable = emu.build(folder)
+
+        elapsed = []
+        with emu.Emulator(executable) as emulator:
+            for _ in range(args.connections):
+                inst = cls.via_serial(emulator.port, reset=False)
+                t0 = time.perf_counter()
+                inst.initialize()
+                elapsed.append(time.perf_counter() - t0)
+                inst.finalize()
+
+    print('initialize  min %.3f s  max %.3f s  (budget %.3f s)' % (min(elapsed), max(elapsed), RECONNECT_BUDGET))
+
+    return 0 if max(elapsed) <= RECONNECT_BUDGET else 1
+
+
+#: Minimum speedup of a diff sync of a ShadowArray over setting the changed keys one by one.
+SHADOW_BUDGET = 2
+
+
+def shadow(args=None):
+
+    parser = argparse.ArgumentParser(description='Frames of a 64 key dictfeat set key by key and synced by difference.')
+    parser.add_argument('-n', '--frames', type=int, default=100, help='Number of frames.')
+    parser.add_argument('-b', '--block', type=int, default=16, help='Consecutive keys changed in each frame.')
+    args = parser.parse_args(args)
+
+    import numpy as np
+
+    from lantz.core.messagebased import MessageBasedDriver
+    from lantz.ino import emulate as emu
+    from lantz.ino import INODriver, BoolDictFeat, ShadowArray
+
+    try:
+        emu.check_compiler()
+    except FileNotFoundError as e:
+        print('Skipped: %s' % e)
+        return 0
+
+    keys = 64
+    cls = type('ShadowDriver', (INODriver, ), {'__module__': __name__,
+                                               'INO_RANGE_SET': True,
+                                               'leds': BoolDictFeat('LEDS', keys=list(range(keys)))})
+    globals()[cls.__name__] = cls
+
+    # Each frame moves a block of lit keys and toggles a few random ones.
+    rng = np.random.RandomState(0)
+    frames = np.zeros((args.frames, keys), dtype=bool)
+    for ndx, frame in enumerate(frames):
+        start = (ndx * 3) % (keys - args.block)
+        frame[start:start + args.block] = True
+        frame[rng.randint(0, keys, 4)] ^= True
+
+    with tempfile.TemporaryDirectory() as folder:
+        _emulated_sketch(cls, folder)
+        executable = emu.build(folder)
+        log = os.path.join(folder, 'traffic.log')
+
+        with emu.Emulator(executable) as emulator:
+            inst = _connect(emulator.port, cls)
+            try:
+                results = {}
+
+                previous = np.zeros(keys, dtype=bool)
+                inst.ino_record(log)
+                t0 = time.perf_counter()
+                for frame in frames:
+                    for key in np.flatnonzero(frame != previous).tolist():
+                        inst.leds[key] = bool(frame[key])
+                    previous = frame
+                results['per key'] = (time.perf_counter() - t0, _traffic(log))
+                inst.ino_record(None)
+
+                array = ShadowArray(inst, 'leds', values=np.zeros(keys, dtype=bool))
+                inst.ino_record(log)
+                t0 = time.perf_counter()
+                for frame in frames:
+                    array.values[:] = frame
+                    array.sync()
+                results['shadow'] = (time.perf_counter() - t0, _traffic(log))
+                inst.ino_record(None)
+            finally:
+                MessageBasedDriver.finalize(inst)
+
+    print('%-10s %12s %14s' % ('', 'ms/frame', 'bytes/frame'))
+    for name, (elapsed, traffic) in results.items():
+        print('%-10s %12.2f %14.1f' % (name, elapsed / args.frames * 1e3, traffic / args.frames))
+    speedup = results['per key'][0] / results['shadow'][0]
+    print('speedup x%.1f' % speedup)
+
+    return 0 if speedup >= SHADOW_BUDGET else 1
+
+
+BENCHMARKS = {'importtime': importtime,
+              'generate': generate,
+              'rx': rx,
+              'codec': codec,
+              'emulate': emulate,
+              'sharedring': sharedring,
+              'aggregate': aggregate,
+              'unacknowledged': unacknowledged,
+              'reconnect': reconnect,
+              'shadow': shadow,
+              }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='lantz.ino benchmarks')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    args, pending = parser.parse_known_args(args)
+
+    sys.exit(BENCHMARKS[args.benchmark](pending))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.ino.clock
+    ~~~~~~~~~~~~~~~
+
+    Map the clock of the board (micros()) to the clock of the host.
+
+    Each round trip gives a sample: the board time stamped in the reply and
+    the host times at which the command was sent and the reply received. The
+    board time is assumed to be at the middle of the round trip, which is
+    wrong by at most half the round trip time. Only the samples with a round
+    trip close to the shortest one are used to fit
+
+        host = offset + (1 + drift) * board
+
+    so that the serial latency jitter does not end up in the timestamps.
+
+    The lantz.ino package provides helper classes and methods to work with Arduino.
+
+    :copyright: 2018 by The Lantz Authors
+    :license: BSD, see LICENSE for more details.
+"""
+
+from collections import deque
+import statistics
+import threading
+
+#: micros() wraps around after 2 ** 32 microseconds (~71.6 minutes).
+WRAP = 2 ** 32
+
+#: Samples with a round trip up to this factor of the shortest one are used in the fit.
+RTT_TOLERANCE = 1.5
+
+#: Minimum board time span (in seconds) of the samples to estimate the drift.
+MIN_DRIFT_SPAN = 1.0
+
+
+class ClockEstimator:
+    """Running estimate of the offset and drift of the board clock.
+
+    Host times are in the time.monotonic() base, board times in seconds
+    (unwrapped micros() / 1e6).
+
+    :param window: number of round trips kept.
+    """
+
+    def __init__(self, window=128):
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget all samples (e.g. after the board was reset).
+        """
+        with self._lock:
+            # (board seconds, host seconds at the middle of the round trip, round trip seconds)
+            self._samples = deque(maxlen=self.window)
+            self._last_raw = None
+            self._last_us = 0
+            self._fit = None
+
+    def unwrap(self, raw):
+        """Convert a micros() value to seconds since the first one seen, following wrap arounds.
+        """
+        with self._lock:
+            return self._unwrap(raw)
+
+    def _unwrap(self, raw):
+        if self._last_raw is None:
+            self._last_raw = raw
+            self._last_us = 0
+            return 0.0
+
+        delta = (raw - self._last_raw) % WRAP
+        if delta >= WRAP // 2:
+            # An older stamp (e.g. a reply that arrived late).
+            return (self._last_us + delta - WRAP) / 1e6
+
+        self._last_raw = raw
+        self._last_us += delta
+        return self._last_us / 1e6
+
+    def add(self, sent, received, raw):
+        """Add a round trip.
+
+        :param sent: host time at which the command was sent.
+        :param received: host time at which the reply was received.
+        :param raw: micros() value stamped by the board.
+        :return: the board time in seconds (see `to_host`).
+        """
+        with self._lock:
+            board = self._unwrap(raw)
+            self._samples.append((board, (sent + received) / 2, received - sent))
+            self._fit = None
+            return board
+
+    def _fitted(self):
+        """Return (offset, slope), fitting the samples if needed.
+        """
+        with self._lock:
+            if self._fit is not None:
+                return self._fit
+
+            if not self._samples:
+                raise ValueError('No round trip measured yet.')
+
+            best = min(rtt for _, _, rtt in self._samples) * RTT_TOLERANCE
+            used = [(board, host) for board, host, rtt in self._samples if rtt <= best]
+
+            boards = [board for board, _ in used]
+            hosts = [host for _, host in used]
+            board_mean = statistics.mean(boards)
+            host_mean = statistics.mean(hosts)
+
+            slope = 1.0
+            if len(used) > 1 and max(boards) - min(boards) >= MIN_DRIFT_SPAN:
+                var = sum((board - board_mean) ** 2 for board in boards)
+                cov = sum((board - board_mean) * (host - host_mean) for board, host in used)
+                slope = cov / var
+
+            self._fit = (host_mean - slope * board_mean, slope)
+            return self._fit
+
+    @property
+    def offset(self):
+        """Host time (in seconds) at board time 0."""
+        return self._fitted()[0]
+
+    @property
+    def drift(self):
+        """Rate difference of the host clock relative to the board one (e.g. 50e-6 for 50 ppm)."""
+        return self._fitted()[1] - 1
+
+    def to_host(self, board):
+        """Convert a board time (in seconds, as returned by `add` or `unwrap`) to host time.
+        """
+        offset, slope = self._fitted()
+        return offset + slope * board
+
+    @property
+    def rtt_min(self):
+        """Shortest round trip time (in seconds) in the window."""
+        with self._lock:
+            return min(rtt for _, _, rtt in self._samples) if self._samples else None
+
+    @property
+    def rtt_median(self):
+        """Median round trip time (in seconds) in the window."""
+        with self._lock:
+            return statistics.median(rtt for _, _, rtt in self._samples) if self._samples else None
+
+    @property
+    def latency(self):
+        """Estimated one way latency of the link (in seconds): half the shortest round trip."""
+        rtt = self.rtt_min
+        return None if rtt is None else rtt / 2
+
+    def __len__(self):
+        return len(self._samples)
+
+    def __repr__(self):
+        if not self._samples:
+            return '<ClockEstimator (no samples)>'
+        return ('<ClockEstimator drift %.1f ppm, latency %.1f us, %d samples>'
+                % (self.drift * 1e6, self.latency * 1e6, len(self._samples)))
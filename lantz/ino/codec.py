@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.ino.codec
+    ~~~~~~~~~~~~~~~
+
+    Specialized encoders and decoders of feat values.
+
+    The generic processors of lantz (built by Feat.rebuild from values, units,
+    limits, get_funcs and set_funcs) check every value against all the possible
+    cases on each call. The wire format of an INOFeat is known when the class is
+    created, so each feat gets functions compiled for its own configuration:
+
+    - decoder: reply of the board -> user value (post_get).
+    - encoder: user value -> wire value (pre_set).
+    - formatter: command format string -> function building the command (an f-string).
+
+    Unusual values (e.g. a plain number for a feat with units) are delegated to
+    the lantz processors, so warnings and errors are the same.
+
+    Most feats (and all the keys of a dictfeat) share a configuration, so the
+    compiled functions are cached by it.
+
+    Compare them with the generic processors::
+
+        python -m lantz.ino.bench codec
+
+    The lantz.ino package provides helper classes and methods to work with Arduino.
+
+    :copyright: 2018 by The Lantz Authors
+    :license: BSD, see LICENSE for more details.
+"""
+
+import functools
+import string
+import threading
+
+from lantz.core import Q_
+from lantz.core.processors import MyRange, range_checker, to_magnitude_converter, to_quantity_converter
+
+
+def _compile(name, source, namespace):
+    code = compile(source, '<lantz.ino.codec %s>' % name, 'exec')
+    exec(code, namespace)
+    return namespace[name]
+
+
+# (kind, frozen configuration) -> compiled function (or None).
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def _freeze(obj):
+    """Hashable key of a configuration value, telling apart equal values of different types (e.g. 1 and True).
+
+    :raises TypeError: if the value cannot be used as a key.
+    """
+    if isinstance(obj, dict):
+        return 'dict', tuple((_freeze(key), _freeze(value)) for key, value in obj.items())
+    if isinstance(obj, (set, frozenset)):
+        return 'set', frozenset(_freeze(value) for value in obj)
+    if isinstance(obj, (list, tuple)):
+        return 'seq', tuple(_freeze(value) for value in obj)
+    if obj is None or isinstance(obj, (str, int, float)):
+        return type(obj), obj
+    if isinstance(obj, Q_):
+        return 'quantity', obj.magnitude, str(obj.units)
+    if hasattr(obj, 'dimensionality'):
+        return 'units', str(obj)
+    if callable(obj):
+        # Functions are compared by identity.
+        return 'callable', obj
+    raise TypeError('Cannot freeze %r' % (obj, ))
+
+
+def _cached(kind, build, *config):
+    """Return build(*config), reusing the result for an equal configuration.
+    """
+    try:
+        key = (kind, _freeze(config))
+        hash(key)
+    except TypeError:
+        return build(*config)
+
+    with _CACHE_LOCK:
+        if key in _CACHE:
+            return _CACHE[key]
+
+    func = build(*config)
+    with _CACHE_LOCK:
+        return _CACHE.setdefault(key, func)
+
+
+def _units(units):
+    if isinstance(units, str):
+        units = Q_(1, units)
+    return units.units
+
+
+def _dict_lookup(name, mapping):
+    """Source lines of a dict lookup raising ValueError as the lantz mapper.
+    """
+    return ['    try:',
+            '        value = %s[value]' % name,
+            '    except (KeyError, TypeError):',
+            '        raise ValueError("{!r} not in {}".format(value, tuple(%s.keys())))' % name]
+
+
+def compile_decoder(get_funcs=None, values=None, units=None):
+    """Function converting the reply of the board into the user value.
+
+    Same steps as Feat.rebuild: get_funcs, reverse values, units.
+
+    :return: a function or None if no processing is needed.
+    :raises TypeError: if the configuration is not supported (use the lantz processors).
+    """
+    return _cached('decoder', _compile_decoder, get_funcs, values, units)
+
+
+def _compile_decoder(get_funcs, values, units):
+    lines = []
+    namespace = {'Q_': Q_}
+
+    for ndx, func in enumerate(get_funcs or ()):
+        if func is None:
+            continue
+        namespace['func%d' % ndx] = func
+        lines.append('    value = func%d(value)' % ndx)
+
+    if values:
+        if isinstance(values, dict):
+            namespace['reverse'] = {value: key for key, value in values.items()}
+            lines.extend(_dict_lookup('reverse', namespace['reverse']))
+        elif isinstance(values, set):
+            namespace['valid'] = set(values)
+            lines.extend(['    if value not in valid:',
+                          '        raise ValueError("{!r} not in {}".format(value, valid))'])
+        else:
+            raise TypeError('Cannot compile values of type %s' % type(values))
+
+    if units:
+        namespace['units'] = _units(units)
+        namespace['generic'] = to_quantity_converter(units)
+        lines.extend(['    if isinstance(value, Q_):',
+                      '        return generic(value)',
+                      '    return Q_(float(value), units)'])
+
+    if not lines:
+        return None
+
+    if not lines[-1].lstrip().startswith('return'):
+        lines.append('    return value')
+
+    return _compile('decode', 'def decode(value):\n%s\n' % '\n'.join(lines), namespace)
+
+
+def compile_encoder(values=None, units=None, limits=None, set_funcs=None):
+    """Function converting the user value into the wire value.
+
+    Same steps as Feat.rebuild: units, values, limits, set_funcs.
+
+    :return: a function or None if no processing is needed.
+    :raises TypeError: if the configuration is not supported (use the lantz processors).
+    """
+    return _cached('encoder', _compile_encoder, values, units, limits, set_funcs)
+
+
+def _compile_encoder(values, units, limits, set_funcs):
+    lines = []
+    namespace = {'Q_': Q_}
+
+    if units:
+        namespace['units'] = _units(units)
+        namespace['generic'] = to_magnitude_converter(units)
+        # Quantities in the units of the feat need no conversion.
+        lines.extend(['    if isinstance(value, Q_) and value._units == units._units:',
+                      '        value = value.magnitude',
+                      '    else:',
+                      '        value = generic(value)'])
+
+    if values:
+        if isinstance(values, dict):
+            # A copy: the function is shared by the feats with an equal configuration.
+            namespace['mapping'] = dict(values)
+            lines.extend(_dict_lookup('mapping', values))
+        elif isinstance(values, set):
+            namespace['valid'] = set(values)
+            lines.extend(['    if value not in valid:',
+                          '        raise ValueError("{!r} not in {}".format(value, valid))'])
+        else:
+            raise TypeError('Cannot compile values of type %s' % type(values))
+
+    if limits:
+        if isinstance(limits[0], (list, tuple)):
+            namespace['check'] = range_checker(tuple(MyRange(*l) for l in limits))
+        else:
+            namespace['check'] = range_checker(MyRange(*limits))
+        lines.append('    value = check(value)')
+
+    for ndx, func in enumerate(set_funcs or ()):
+        if func is None:
+            continue
+        namespace['func%d' % ndx] = func
+        lines.append('    value = func%d(value)' % ndx)
+
+    if not lines:
+        return None
+
+    lines.append('    return value')
+
+    return _compile('encode', 'def encode(value):\n%s\n' % '\n'.join(lines), namespace)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_format(fmt, *args):
+    """Compile a command format string into a function of the given arguments.
+
+    Positional fields are named after the arguments in order::
+
+        >>> compile_format('VOLT {key} {value:.2f}', 'key', 'value')(1, 2.5)
+        'VOLT 1 2.50'
+    """
+    positional = iter(args)
+    parts = []
+    for literal, field, spec, conversion in string.Formatter().parse(fmt):
+        parts.append(literal.replace('{', '{{').replace('}', '}}'))
+        if field is None:
+            continue
+        if field == '':
+            field = next(positional)
+        if field not in args:
+            raise ValueError('Unknown field %r in %r' % (field, fmt))
+        parts.append('{%s%s%s}' % (field,
+                                   '!' + conversion if conversion else '',
+                                   ':' + spec if spec else ''))
+
+    source = 'def format_command(%s):\n    return f%r\n' % (', '.join(args), ''.join(parts))
+    return _compile('format_command', source, {})
+
+
+@functools.lru_cache(maxsize=None)
+def compile_field(fmt, field):
+    """Compile the format of a single field of a command format string into a function of its value::
+
+        >>> compile_field('VOLT {key} {value:.2f}', 'value')(2.5)
+        '2.50'
+    """
+    for literal, name, spec, conversion in string.Formatter().parse(fmt):
+        if name == field:
+            return compile_format('{%s%s%s}' % (field, '!' + conversion if conversion else '',
+                                                ':' + spec if spec else ''), field)
+    raise ValueError('No field %r in %r' % (field, fmt))
@@ -15,8 +15,6 @@ from collections import namedtuple
 import os
 import pickle
 
-import yaml
-
 
 def write_user_timestamp(folder):
     hfile = os.path.join(folder, 'inodriver_user.h')
@@ -43,12 +41,45 @@ def read_user_timestamp(folder):
         return (None, None), (hfile_ts, cppfile_ts)
 
 
+def _strip_timestamp(content):
+    return [line for line in content.splitlines() if not line.startswith('///  Generation timestamp:')]
+
+
+def write_if_changed(filename, content):
+    """Write content to a file unless it is already there.
+
+    The generation timestamp in the header is ignored in the comparison,
+    so regenerating an unchanged class does not touch the file (and does
+    not trigger a rebuild).
+
+    :return: True if the file was written.
+    """
+    try:
+        with open(filename, 'r', encoding='utf-8') as fi:
+            if _strip_timestamp(fi.read()) == _strip_timestamp(content):
+                return False
+    except FileNotFoundError:
+        pass
+
+    with open(filename, 'w', encoding='utf-8') as fo:
+        fo.write(content)
+
+    return True
+
+
 def user_local_matches_remote(sketch_folder):
     last, current = read_user_timestamp(sketch_folder)
     return last == current
 
 
-class Packfile(namedtuple('Packfile', 'sketch_folder class_spec fqbn port usbID')):
+class Packfile(namedtuple('Packfile', 'sketch_folder class_spec fqbn port usbID reset dtr rts',
+                          defaults=(None, None, None))):
+    """Sketch, driver class and board of a project.
+
+    reset, dtr and rts are optional (see INODriver.via_serial): reset is
+    False to keep the board running when the port is opened, dtr and rts
+    the state in which the lines are set after opening the port.
+    """
 
     @classmethod
     def from_defaults(cls, sketch_folder, class_spec):
@@ -56,12 +87,25 @@ class Packfile(namedtuple('Packfile', 'sketch_folder class_spec fqbn port usbID'
 
     @classmethod
     def from_file(cls, filename):
+        import yaml
+
         with open(filename, 'r', encoding='utf-8') as fi:
-            data = yaml.load(fi)
+            data = yaml.safe_load(fi)
 
         return cls(*map(data.get, cls._fields))
 
+    @property
+    def serial_options(self):
+        """Keyword arguments of INODriver.via_serial given in the packfile."""
+        options = {'reset': self.reset is not False}
+        if self.dtr is not None:
+            options['dtr'] = bool(self.dtr)
+        if self.rts is not None:
+            options['rts'] = bool(self.rts)
+        return options
+
     def to_file(self, filename):
+        import yaml
+
         with open(filename, mode='w', encoding='utf-8') as fo:
             yaml.dump(dict(self._asdict()), fo, default_flow_style=False)
-
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.ino.emulate
+    ~~~~~~~~~~~~~~~~~
+
+    Build the sketch with the host compiler and run it behind a pseudo terminal.
+
+    The generated code (SerialCommand, bridge and user files) is compiled with
+    g++ against a minimal Arduino core (templates/shim.py) in which Serial is
+    the standard input and output of the process. The process is connected
+    to a pseudo terminal, so a driver talks to the real firmware logic::
+
+        with Emulator(build(packfile)) as emu:
+            with MyDriver.via_serial(emu.port) as inst:
+                ...
+
+    Only the Arduino core subset of the shim is available (no libraries).
+
+    With uart=True the bytes are received at the baud rate given to
+    Serial.begin and dropped when the receive buffer of the board is full,
+    to test how the sketch copes with overflows (see Emulator.dropped).
+
+    The lantz.ino package provides helper classes and methods to work with Arduino.
+
+    :copyright: 2018 by The Lantz Authors
+    :license: BSD, see LICENSE for more details.
+"""
+
+import glob
+import os
+import shutil
+import subprocess
+import time
+
+from . import common
+from .templates import ino, shim
+
+#: Compiler and flags used to build the emulator.
+CXX = 'g++'
+CXXFLAGS = ('-std=gnu++11', '-O2', '-pthread', '-DARDUINO=100')
+
+#: Sources of the sketch compiled in the emulator (besides the .ino file).
+SOURCES = ('SerialCommand.cpp', 'inodriver_bridge.cpp', 'inodriver_user.cpp')
+
+
+class BuildError(Exception):
+    """The compiler failed.
+    """
+
+
+def build_folder(sketch_folder):
+    return os.path.join(sketch_folder, '.emulate')
+
+
+def build(packfile, cxx=CXX, force=False):
+    """Compile the sketch of a packfile for the host.
+
+    The build is skipped if the executable is newer than the sketch files.
+
+    :param packfile: Packfile or path of the sketch folder.
+    :return: path of the executable.
+    """
+    folder = packfile.sketch_folder if isinstance(packfile, common.Packfile) else packfile
+    folder = os.path.abspath(folder)
+
+    out = build_folder(folder)
+    os.makedirs(out, exist_ok=True)
+
+    executable = os.path.join(out, 'sketch')
+
+    sources = [os.path.join(folder, name) for name in SOURCES]
+    missing = [source for source in sources if not os.path.exists(source)]
+    if missing:
+        raise FileNotFoundError('Missing sketch files (generate them first): %s' % ', '.join(missing))
+
+    inos = glob.glob(os.path.join(folder, '*.ino'))
+
+    inputs = sources + inos + glob.glob(os.path.join(folder, '*.h'))
+    if not force and os.path.exists(executable):
+        if os.path.getmtime(executable) >= max(os.path.getmtime(path) for path in inputs):
+            return executable
+
+    common.write_if_changed(os.path.join(out, 'Arduino.h'), shim.H)
+    common.write_if_changed(os.path.join(out, 'shim.cpp'), shim.CPP)
+
+    # As the Arduino builder, the .ino file gets the Arduino.h include.
+    if inos:
+        with open(inos[0], encoding='utf-8') as fi:
+            content = '#include <Arduino.h>\n#line 1 "%s"\n%s' % (inos[0], fi.read())
+    else:
+        content = '#include <Arduino.h>\n' + ino.CPP
+    common.write_if_changed(os.path.join(out, 'sketch.cpp'), content)
+
+    cmd = [cxx, *CXXFLAGS, '-I', out, '-I', folder,
+           *sources, os.path.join(out, 'sketch.cpp'), os.path.join(out, 'shim.cpp'),
+           '-o', executable]
+
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    if result.returncode:
+        raise BuildError('Could not build the emulator:\n%s' % result.stdout)
+
+    return executable
+
+
+class Emulator:
+    """Run a sketch built for the host behind a pseudo terminal.
+
+    :param executable: path returned by build.
+    :param uart: receive at the baud rate of the sketch, dropping bytes on overflow.
+    """
+
+    def __init__(self, executable, uart=False):
+        self.executable = executable
+        self.uart = uart
+
+        #: Path of the pseudo terminal to connect to.
+        self.port = None
+
+        #: Number of received bytes dropped by the board (after stop, with uart=True).
+        self.dropped = None
+
+        self._process = None
+        self._master = self._slave = None
+
+    def start(self):
+        import pty
+        import tty
+
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+
+        args = [self.executable] + (['--uart'] if self.uart else [])
+        self._process = subprocess.Popen(args, stdin=self._master, stdout=self._master,
+                                         stderr=subprocess.PIPE, universal_newlines=True)
+        return self
+
+    def stop(self, timeout=5):
+        if self._process is None:
+            return
+
+        self._process.terminate()
+        try:
+            _, err = self._process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            _, err = self._process.communicate()
+
+        for line in err.splitlines():
+            if line.startswith('rx_dropped '):
+                self.dropped = int(line.split()[1])
+
+        self._process = None
+        os.close(self._master)
+        os.close(self._slave)
+
+    @property
+    def running(self):
+        return self._process is not None and self._process.poll() is None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def check_compiler(cxx=CXX):
+    if shutil.which(cxx) is None:
+        raise FileNotFoundError('%s not found. A host C++ compiler is required to emulate a sketch.' % cxx)
+
+
+def soak(inst, duration, command='INFO?', check=None):
+    """Query a command repeatedly.
+
+    :param inst: initialized driver connected to an emulator.
+    :param duration: seconds.
+    :param check: callable receiving each reply, returning False if it is wrong.
+    :return: (queries, errors, queries per second)
+    """
+    queries = errors = 0
+    t0 = time.perf_counter()
+    end = t0 + duration
+    while time.perf_counter() < end:
+        try:
+            reply = inst.query(command)
+            if check is not None and not check(reply):
+                errors += 1
+        except Exception:
+            errors += 1
+        queries += 1
+    elapsed = time.perf_counter() - t0
+    return queries, errors, queries / elapsed
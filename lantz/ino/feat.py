@@ -14,18 +14,64 @@
 
 import collections
 
-from lantz.core import mfeats
+from lantz.core import mfeats, Feat, Q_
 
-from .base import INOFeat, INODictFeat
+from .base import (INOFeat, INODictFeat, DESCRIPTION,
+                   _write_aggregate_setup, _write_aggregate_wrapper, _write_aggregate_loop, _write_feat_wrapped)
+
+#: Value of an AggregateFeat. mean, min, max and rms are quantities if the feat has units.
+Aggregate = collections.namedtuple('Aggregate', 'mean min max rms count')
+
+
+def _fixed_point(feat, fixed_point, units, limits):
+    """Configure a feat to exchange integers with the board.
+
+    The wire value is the magnitude (in units) divided by scale, rounded and
+    sent as a signed integer of the given bits.
+
+    :return: the limits of the feat (the representable range if None).
+    :raises ValueError: if the given limits exceed the representable range.
+    """
+    scale, bits = fixed_point
+
+    if bits not in (8, 16, 32):
+        raise ValueError('Fixed point bits must be 8, 16 or 32 (not %r)' % bits)
+    if not scale > 0:
+        raise ValueError('Fixed point scale must be positive (not %r)' % scale)
+
+    feat.INO_DATATYPE = 'L' if bits == 32 else 'I'
+    feat.ino_fixed_point = (scale, bits)
+    feat.ino_description = '%s (fixed point, 1 = %g %s)' % (DESCRIPTION[feat.INO_DATATYPE], scale, units or '')
+
+    inverse = round(1 / scale)
+    if inverse and abs(inverse * scale - 1) < 1e-9:
+        # Dividing by an integer (e.g. 100 for 0.01) avoids representation errors.
+        feat._ino_feat_kwargs.update(get_funcs=(lambda value: int(value) / inverse, ),
+                                     set_funcs=(lambda value: int(round(value * inverse)), ))
+    else:
+        feat._ino_feat_kwargs.update(get_funcs=(lambda value: int(value) * scale, ),
+                                     set_funcs=(lambda value: int(round(value / scale)), ))
+
+    lowest, highest = -2 ** (bits - 1), 2 ** (bits - 1) - 1
+    if limits is None:
+        return (lowest * scale, highest * scale)
+
+    # (max, ) or (min, max[, step]) as in lantz.
+    low, high = (0, limits[0]) if len(limits) == 1 else limits[:2]
+    if round(low / scale) < lowest or round(high / scale) > highest:
+        raise ValueError('Limits %r exceed the range of %d bits fixed point numbers (%g, %g)'
+                         % (tuple(limits), bits, lowest * scale, highest * scale))
+
+    return limits
 
 
 class BoolFeat(INOFeat, mfeats.BoolFeat):
 
     INO_DATATYPE = 'B'
 
-    def __init__(self, cmd, getter=True, setter=True):
+    def __init__(self, cmd, getter=True, setter=True, fresh=0):
 
-        INOFeat.__init__(self, cmd)
+        INOFeat.__init__(self, cmd, fresh)
 
         get_cmd = ('%s?' % cmd) if getter else None
         set_cmd = ('%s {}' % cmd) if setter else None
@@ -38,12 +84,24 @@ class BoolFeat(INOFeat, mfeats.BoolFeat):
 
 
 class QuantityFeat(INOFeat, mfeats.QuantityFeat):
+    """A Quantity Feat exchanged as a float, or as an integer if fixed_point is given.
+
+    :param fixed_point: (scale, bits) to send round(magnitude / scale) as a signed
+                        integer of 8, 16 or 32 bits. The user functions in the
+                        board receive and return that integer. The limits must
+                        lie within the representable range.
+    """
 
     INO_DATATYPE = 'F'
 
-    def __init__(self, cmd, number_format='.2f', units=None, limits=None, getter=True, setter=True):
+    def __init__(self, cmd, number_format='.2f', units=None, limits=None, getter=True, setter=True,
+                 fixed_point=None, fresh=0):
 
-        INOFeat.__init__(self, cmd)
+        INOFeat.__init__(self, cmd, fresh)
+
+        if fixed_point:
+            limits = _fixed_point(self, fixed_point, units, limits)
+            number_format = 'd'
 
         get_cmd = ('%s?' % cmd) if getter else None
         set_cmd = ('%s {:%s}' % (cmd, number_format)) if setter else None
@@ -51,13 +109,82 @@ class QuantityFeat(INOFeat, mfeats.QuantityFeat):
         mfeats.QuantityFeat.__init__(self, get_cmd, set_cmd, units=units, limits=limits)
 
 
+def _parse_aggregate_value(raw):
+    # Serial.print writes ovf for values beyond the range of an unsigned long.
+    return float('inf') if raw == 'ovf' else float(raw)
+
+
+class AggregateFeat(INOFeat, mfeats.MFeatMixin, Feat):
+    """Mean, minimum, maximum and RMS of a signal, computed by the board.
+
+    The board samples get_<CMD>() (a float) in each loop iteration and keeps
+    running sums in fixed memory. Getting the feat returns an Aggregate of
+    the samples since the previous get (or push) and starts a new window.
+    INODriver.ino_push makes the board send it periodically instead.
+    Only the aggregate crosses the link, not the samples.
+
+    :param units: units of the samples.
+    :param interval: minimum time between samples in microseconds
+                     (0 samples in every loop iteration).
+    :param digits: decimal digits sent by the board.
+    """
+
+    INO_DATATYPE = 'A'
+
+    # Reading the feat starts a new window.
+    INO_IN_STATE = False
+
+    def __init__(self, cmd, units=None, interval=0, digits=4):
+
+        INOFeat.__init__(self, cmd)
+
+        self.ino_units = units
+        self.ino_interval = int(interval)
+        self.ino_digits = digits
+        self.ino_push_command = '%s!' % cmd
+
+        self._ino_feat_kwargs.update(get_funcs=(self.ino_decode, ))
+
+        mfeats.MFeatMixin.__init__(self, '%s?' % cmd, None)
+
+    def ino_decode(self, reply):
+        """Convert a reply (or push) of the board into an Aggregate.
+        """
+        *values, count = reply.split(',')
+        if len(values) != 4:
+            raise ValueError('Unexpected aggregate %r' % reply)
+
+        values = [_parse_aggregate_value(value) for value in values]
+        if self.ino_units:
+            values = [Q_(value, self.ino_units) for value in values]
+
+        return Aggregate(*values, int(count))
+
+    def ino_commands(self):
+        return [(self.ino_cmd + '?', 'wrapperGet_' + self.ino_cmd),
+                (self.ino_push_command, 'wrapperPush_' + self.ino_cmd)]
+
+    def ino_write_setup(self, fo, register='sCmd.addCommand'):
+        _write_aggregate_setup(fo, self.name, self.ino_cmd, register)
+
+    def ino_write_wrapper(self, fh, fo):
+        _write_aggregate_wrapper(fh, fo, self.ino_cmd, self.ino_digits)
+
+    def ino_write_wrapped(self, fh, fo):
+        # The user function returns a sample.
+        _write_feat_wrapped(fh, fo, self.ino_cmd, 'F', True, False)
+
+    def ino_write_loop(self, fo):
+        _write_aggregate_loop(fo, self.ino_cmd, self.ino_interval, self.ino_digits)
+
+
 class IntFeat(INOFeat, mfeats.IntFeat):
 
     INO_DATATYPE = 'I'
 
-    def __init__(self, cmd, number_format='d', limits=None, getter=True, setter=True):
+    def __init__(self, cmd, number_format='d', limits=None, getter=True, setter=True, fresh=0):
 
-        INOFeat.__init__(self, cmd)
+        INOFeat.__init__(self, cmd, fresh)
 
         get_cmd = ('%s?' % cmd) if getter else None
         set_cmd = ('%s {:%s}' % (cmd, number_format)) if setter else None
@@ -69,9 +196,9 @@ class FloatFeat(INOFeat, mfeats.FloatFeat):
 
     INO_DATATYPE = 'F'
 
-    def __init__(self, cmd, number_format='d', limits=None, getter=True, setter=True):
+    def __init__(self, cmd, number_format='d', limits=None, getter=True, setter=True, fresh=0):
 
-        INOFeat.__init__(self, cmd)
+        INOFeat.__init__(self, cmd, fresh)
 
         get_cmd = ('%s?' % cmd) if getter else None
         set_cmd = ('%s {:%s}' % (cmd, number_format)) if setter else None
@@ -83,14 +210,14 @@ class BoolDictFeat(INODictFeat, mfeats.BoolDictFeat):
 
     INO_DATATYPE = 'B'
 
-    def __init__(self, cmd, keys, getter=True, setter=True):
+    def __init__(self, cmd, keys, getter=True, setter=True, indexed=None, fresh=0):
 
-        INODictFeat.__init__(self, cmd, keys)
+        INODictFeat.__init__(self, cmd, keys, indexed, fresh)
 
         get_cmd = ('%s? {key}' % cmd) if getter else None
         set_cmd = ('%s {key} {value}' % cmd) if setter else None
 
-        mfeats.BoolDictFeat.__init__(self, get_cmd, set_cmd, '1', '0', keys=keys)
+        mfeats.BoolDictFeat.__init__(self, get_cmd, set_cmd, '1', '0', keys=self.ino_wire_keys)
 
     def get_initial_value(self):
         # This is required because in Arduino a Bool is actually a string
@@ -100,28 +227,38 @@ class BoolDictFeat(INODictFeat, mfeats.BoolDictFeat):
 
 
 class QuantityDictFeat(INODictFeat, mfeats.QuantityDictFeat):
+    """A Quantity DictFeat exchanged as a float, or as an integer if fixed_point is given.
+
+    See QuantityFeat.
+    """
 
     INO_DATATYPE = 'F'
 
-    def __init__(self, cmd, keys, number_format='.2f', units=None, limits=None, getter=True, setter=True):
+    def __init__(self, cmd, keys, number_format='.2f', units=None, limits=None, getter=True, setter=True,
+                 fixed_point=None, indexed=None, fresh=0):
+
+        INODictFeat.__init__(self, cmd, keys, indexed, fresh)
 
-        INODictFeat.__init__(self, cmd, keys)
+        if fixed_point:
+            limits = _fixed_point(self, fixed_point, units, limits)
+            number_format = 'd'
 
         get_cmd = ('%s? {key}' % cmd) if getter else None
         set_cmd = ('%s {key} {value:%s}' % (cmd, number_format)) if setter else None
 
-        mfeats.QuantityDictFeat.__init__(self, get_cmd, set_cmd, units=units, limits=limits, keys=keys)
+        mfeats.QuantityDictFeat.__init__(self, get_cmd, set_cmd, units=units, limits=limits, keys=self.ino_wire_keys)
 
 
 class IntDictFeat(INODictFeat, mfeats.IntDictFeat):
 
     INO_DATATYPE = 'I'
 
-    def __init__(self, cmd, keys, number_format='d', limits=None, getter=True, setter=True):
+    def __init__(self, cmd, keys, number_format='d', limits=None, getter=True, setter=True, indexed=None,
+                 fresh=0):
 
-        INODictFeat.__init__(self, cmd, keys)
+        INODictFeat.__init__(self, cmd, keys, indexed, fresh)
 
         get_cmd = ('%s? {key}' % cmd) if getter else None
         set_cmd = ('%s {key} {value:%s}' % (cmd, number_format)) if setter else None
 
-        mfeats.IntDictFeat.__init__(self, get_cmd, set_cmd, limits=limits, keys=keys)
+        mfeats.IntDictFeat.__init__(self, get_cmd, set_cmd, limits=limits, keys=self.ino_wire_keys)
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.ino.record
+    ~~~~~~~~~~~~~~~~
+
+    Record the serial traffic of an INODriver and replay it offline.
+
+    The log is a binary file made of a header followed by records::
+
+        header: magic (8s), version (H), padding (6x), wall clock start (d), monotonic start (d)
+        record: direction (c, b'W' or b'R'), monotonic time since start (d), length (I), data
+
+    LogReader scans the file using memory-mapped I/O. Replay serves a log
+    through a pseudo terminal, so a driver can connect to it as if it was the board.
+
+    The lantz.ino package provides helper classes and methods to work with Arduino.
+
+    :copyright: 2018 by The Lantz Authors
+    :license: BSD, see LICENSE for more details.
+"""
+
+from collections import namedtuple
+import mmap
+import os
+import struct
+import threading
+import time
+
+MAGIC = b'LZINOREC'
+VERSION = 1
+
+HEADER = struct.Struct('<8sH6xdd')
+RECORD = struct.Struct('<cdI')
+
+#: Bytes written by the host.
+WRITE = b'W'
+
+#: Bytes read by the host.
+READ = b'R'
+
+#: A single record. data is a memoryview into the mapped file.
+Record = namedtuple('Record', 'direction timestamp data')
+
+
+class Recorder:
+    """Append the traffic to a binary log.
+
+    :param path: path of the log file (truncated if it exists).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'wb')
+        self._start = time.monotonic()
+        self._file.write(HEADER.pack(MAGIC, VERSION, time.time(), self._start))
+
+    def record(self, direction, data):
+        with self._lock:
+            self._file.write(RECORD.pack(direction, time.monotonic() - self._start, len(data)))
+            self._file.write(data)
+
+    def write(self, data):
+        """Record bytes written by the host."""
+        self.record(WRITE, data)
+
+    def read(self, data):
+        """Record bytes read by the host."""
+        self.record(READ, data)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class LogReader:
+    """Memory-mapped reader of a binary log.
+
+    Iterating yields Record tuples. The data of each record is a memoryview
+    into the mapped file and is only valid until the reader is closed.
+
+    :param path: path of the log file.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as fi:
+            size = os.fstat(fi.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError('%s is not a lantz-ino traffic log' % path)
+            self._mm = mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._view = memoryview(self._mm)
+
+        magic, version, self.wall_start, self.monotonic_start = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError('%s is not a lantz-ino traffic log' % path)
+        if version != VERSION:
+            raise ValueError('Unsupported log version %d' % version)
+
+    def scan(self):
+        """Iterate over the records without touching their data.
+
+        :return: iterator of (direction, timestamp, offset, length)
+        """
+        unpack_from, size = RECORD.unpack_from, RECORD.size
+        mm = self._mm
+        offset, end = HEADER.size, len(mm)
+
+        while offset + size <= end:
+            direction, timestamp, length = unpack_from(mm, offset)
+            offset += size
+            if offset + length > end:
+                # Truncated record (e.g. the recorder was killed).
+                break
+            yield direction, timestamp, offset, length
+            offset += length
+
+    def __iter__(self):
+        view = self._view
+        for direction, timestamp, offset, length in self.scan():
+            yield Record(direction, timestamp, view[offset:offset + length])
+
+    def summary(self):
+        """Return number of records, bytes written, bytes read and duration (in seconds).
+        """
+        count = written = read = 0
+        last = 0.0
+        for direction, timestamp, offset, length in self.scan():
+            count += 1
+            if direction == WRITE:
+                written += length
+            else:
+                read += length
+            last = timestamp
+
+        return count, written, read, last
+
+    def close(self):
+        self._view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            # Some records are still referenced.
+            # The map is released when they are garbage collected.
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Replay:
+    """Serve a recording through a pseudo terminal.
+
+    Each recorded host write is awaited (and checked if strict is True) before
+    the following reads are served, which keep their original delay with respect
+    to the preceding write divided by speed. Use speed=None to serve as fast as possible.
+
+    Connect a driver to `port`::
+
+        with Replay('run.inolog', speed=10) as replay:
+            with MyDriver.via_serial(replay.port) as inst:
+                ...
+
+    :param path: path of the log file.
+    :param speed: replay speed factor.
+    :param strict: raise if the host writes differ from the recording.
+    """
+
+    def __init__(self, path, speed=1.0, strict=False):
+        import pty
+        import tty
+
+        self.path = path
+        self.speed = speed
+        self.strict = strict
+
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+
+        #: Path of the pseudo terminal to connect to.
+        self.port = os.ttyname(self._slave)
+
+        #: Exception raised in the replay thread, if any.
+        self.error = None
+
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='ino-replay', daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Wait until the whole recording has been served."""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def close(self):
+        self._stop.set()
+        os.close(self._master)
+        os.close(self._slave)
+        if self._thread is not None:
+            self._thread.join(1)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _receive(self, expected):
+        received = b''
+        while len(received) < len(expected):
+            received += os.read(self._master, len(expected) - len(received))
+        if self.strict and received != expected:
+            raise ValueError('Host wrote %r, recorded %r' % (received, expected))
+
+    def _run(self):
+        anchor_ts, anchor_time = 0.0, time.monotonic()
+        try:
+            with LogReader(self.path) as reader:
+                for direction, timestamp, data in reader:
+                    if self._stop.is_set():
+                        break
+                    if direction == WRITE:
+                        self._receive(bytes(data))
+                        anchor_ts, anchor_time = timestamp, time.monotonic()
+                    else:
+                        if self.speed:
+                            delay = anchor_time + (timestamp - anchor_ts) / self.speed - time.monotonic()
+                            if delay > 0:
+                                time.sleep(delay)
+                        os.write(self._master, data)
+        except Exception as e:
+            if not self._stop.is_set():
+                self.error = e
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.ino.scheduler
+    ~~~~~~~~~~~~~~~~~~~
+
+    Poll feats at given rates, across one or many boards.
+
+    Each board is polled by its own thread. The reads that are due at the
+    same time are pipelined when the driver uses sequence tags
+    (INO_SEQUENCE_TAGS), otherwise they are done one after the other as the
+    protocol has a single command in flight. Values are timestamped with the
+    time of the board when the driver uses INO_TIMESTAMPS.
+
+    When a board cannot keep up with the requested rates, the polls with the
+    lowest priority are slowed down (and suspended if needed) so that the
+    ones with higher priority keep their period::
+
+        with Scheduler() as sched:
+            sched.add(inst, 'temperature', 0.05, priority=1, callback=print)
+            volts = sched.add(inst, 'volts', 1, key=0, buffer=RingBuffer(1000))
+            time.sleep(10)
+
+        print(volts.buffer.values())
+
+    The lantz.ino package provides helper classes and methods to work with Arduino.
+
+    :copyright: 2018 by The Lantz Authors
+    :license: BSD, see LICENSE for more details.
+"""
+
+from collections import deque
+import logging
+import threading
+import time
+
+logger = logging.getLogger('lantz.ino.scheduler')
+
+#: Fraction of the link time that polls can use before shedding.
+MAX_LOAD = 0.9
+
+#: Weight of each new measurement in the average read time.
+COST_WEIGHT = 0.2
+
+
+class RingBuffer:
+    """Keep the last values of a poll as (timestamp, value) tuples.
+
+    :param size: maximum number of values.
+    """
+
+    def __init__(self, size):
+        self._items = deque(maxlen=size)
+
+    def append(self, item):
+        self._items.append(item)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(list(self._items))
+
+    def last(self):
+        """Last (timestamp, value) tuple or None."""
+        try:
+            return self._items[-1]
+        except IndexError:
+            return None
+
+    def timestamps(self):
+        return [item[0] for item in list(self._items)]
+
+    def values(self):
+        return [item[1] for item in list(self._items)]
+
+    def clear(self):
+        self._items.clear()
+
+
+def _get_command(driver, name, key):
+    """Command sent to the board to get a feat (None if it cannot be pipelined).
+    """
+    cls = driver.__class__
+    if key is None:
+        feat = cls._lantz_feats.get(name)
+    else:
+        feat = cls._lantz_dictfeats.get(name)
+
+    if not hasattr(feat, 'ino_get_command'):
+        return None
+
+    return feat.ino_get_command(key)
+
+
+class Poll:
+    """A feat (or a key of a DictFeat) polled periodically.
+
+    Created by Scheduler.add.
+    """
+
+    def __init__(self, driver, name, period, key=None, priority=0, callback=None, buffer=None):
+        if not period > 0:
+            raise ValueError('The period must be positive (not %r)' % period)
+
+        cls = driver.__class__
+        if key is None and name not in cls._lantz_feats:
+            raise ValueError('%s has no feat named %r' % (cls.__qualname__, name))
+        if key is not None and name not in cls._lantz_dictfeats:
+            raise ValueError('%s has no dictfeat named %r' % (cls.__qualname__, name))
+
+        self.driver = driver
+        self.name = name
+        self.key = key
+        self.period = period
+        self.priority = priority
+        self.callback = callback
+        self.buffer = buffer
+
+        #: Command pipelined for this poll (None if not possible).
+        self.command = _get_command(driver, name, key)
+
+        #: Period actually used, longer than period if shed (None if suspended).
+        self.effective_period = period
+
+        #: Time (time.monotonic) of the next read.
+        self.due = time.monotonic()
+
+        #: Number of reads, of reads that failed and of periods not read (shed or late).
+        self.count = 0
+        self.errors = 0
+        self.shed = 0
+
+        #: Time (time.monotonic) of the last read.
+        self.last = None
+
+        #: Last exception raised while reading.
+        self.error = None
+
+    @property
+    def suspended(self):
+        return self.effective_period is None
+
+    def read(self):
+        if self.key is None:
+            return getattr(self.driver, self.name)
+        return getattr(self.driver, self.name)[self.key]
+
+    def deliver(self, timestamp, value):
+        if self.buffer is not None:
+            self.buffer.append((timestamp, value))
+        if self.callback is not None:
+            self.callback(timestamp, value)
+
+    def __repr__(self):
+        target = self.name if self.key is None else '%s[%r]' % (self.name, self.key)
+        return '<Poll %s every %g s>' % (target, self.period)
+
+
+class _Board:
+    """Polls of a single driver and the thread that runs them.
+    """
+
+    def __init__(self, driver, max_load):
+        self.driver = driver
+        self.max_load = max_load
+        self.polls = []
+
+        #: Average time of a read, in seconds.
+        self.cost = 0.0
+
+        self._changed = threading.Condition()
+        self._stop = False
+        self._thread = None
+
+    def add(self, poll):
+        with self._changed:
+            self.polls.append(poll)
+            self.plan()
+            self._changed.notify()
+
+    def remove(self, poll):
+        with self._changed:
+            self.polls.remove(poll)
+            self.plan()
+            self._changed.notify()
+
+    def plan(self):
+        """Assign the link time to the polls by priority.
+        """
+        available = self.max_load
+        cost = self.cost
+        for poll in sorted(self.polls, key=lambda p: (-p.priority, p.period)):
+            load = cost / poll.period
+            if load <= available:
+                poll.effective_period = poll.period
+                available -= load
+            elif available > 0:
+                poll.effective_period = cost / available
+                available = 0
+            else:
+                poll.effective_period = None
+
+    def start(self):
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='ino-poll-%s' % self.driver.__class__.__name__)
+        self._thread.start()
+
+    def stop(self):
+        with self._changed:
+            self._stop = True
+            self._changed.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _due(self):
+        """Wait for the polls that are due.
+
+        :return: list of polls, by priority (empty if stopped).
+        """
+        with self._changed:
+            while not self._stop:
+                now = time.monotonic()
+                active = [poll for poll in self.polls if not poll.suspended]
+                due = [poll for poll in active if poll.due <= now]
+                if due:
+                    return sorted(due, key=lambda p: (-p.priority, p.due))
+
+                timeout = min(poll.due for poll in active) - now if active else None
+                self._changed.wait(timeout)
+
+        return []
+
+    def _run(self):
+        while True:
+            due = self._due()
+            if not due:
+                return
+
+            t0 = time.monotonic()
+            with self.driver.ino_pipeline(poll.command for poll in due if poll.command):
+                for poll in due:
+                    self._read(poll)
+            elapsed = time.monotonic() - t0
+
+            with self._changed:
+                self.cost += COST_WEIGHT * (elapsed / len(due) - self.cost)
+                self.plan()
+
+    def _read(self, poll):
+        try:
+            value = poll.read()
+        except Exception as e:
+            poll.errors += 1
+            poll.error = e
+            logger.warning('Polling %r failed: %s', poll, e)
+            value = None
+            failed = True
+        else:
+            failed = False
+
+        now = time.monotonic()
+        poll.count += 1
+
+        timestamp = None
+        if not failed and getattr(poll.driver, 'INO_TIMESTAMPS', False):
+            timestamp = poll.driver.ino_timestamp()
+
+        if poll.last is not None:
+            poll.shed += max(0, round((now - poll.last) / poll.period) - 1)
+        poll.last = now
+
+        # Skip the periods that were missed instead of catching up.
+        period = poll.effective_period or poll.period
+        poll.due = max(poll.due + period, now)
+
+        if not failed:
+            try:
+                poll.deliver(now if timestamp is None else timestamp, value)
+            except Exception:
+                logger.exception('Callback of %r failed', poll)
+
+
+class Scheduler:
+    """Poll feats of one or many INODrivers at given rates.
+
+    :param max_load: fraction of the time each link can be busy with polls
+                     before the polls with lower priority are shed.
+    """
+
+    def __init__(self, max_load=MAX_LOAD):
+        self.max_load = max_load
+        self._boards = {}
+        self._running = False
+
+    def add(self, driver, name, period, key=None, priority=0, callback=None, buffer=None):
+        """Poll a feat (or a key of a DictFeat if key is given).
+
+        :param driver: an initialized driver.
+        :param period: seconds between reads.
+        :param priority: polls with higher priority are shed last.
+        :param callback: called as callback(timestamp, value) after each read,
+                         from the polling thread of the board. timestamp is
+                         in the time.monotonic() base.
+        :param buffer: a RingBuffer (or any object with an append method)
+                       to which (timestamp, value) tuples are appended.
+        :return: Poll
+        """
+        poll = Poll(driver, name, period, key, priority, callback, buffer)
+
+        board = self._boards.get(id(driver))
+        if board is None:
+            board = self._boards[id(driver)] = _Board(driver, self.max_load)
+            if self._running:
+                board.start()
+
+        board.add(poll)
+        return poll
+
+    def remove(self, poll):
+        self._boards[id(poll.driver)].remove(poll)
+
+    @property
+    def polls(self):
+        return [poll for board in self._boards.values() for poll in board.polls]
+
+    def load(self, driver):
+        """Estimated fraction of time the link of driver would be busy at the requested rates.
+        """
+        board = self._boards[id(driver)]
+        return sum(board.cost / poll.period for poll in board.polls)
+
+    def start(self):
+        self._running = True
+        for board in self._boards.values():
+            board.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        for board in self._boards.values():
+            board.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.ino.server
+    ~~~~~~~~~~~~~~~~
+
+    Share one INODriver (and therefore one serial port) among many processes.
+
+    INOServer owns the driver and listens on a local Unix socket. Requests from
+    all clients are executed in order by a single worker, which batches the
+    pending requests and answers identical consecutive reads with a single query.
+
+    INOClient connects to the socket and exposes the same Feat, DictFeat and
+    Action interface of the driver.
+
+    The protocol is newline delimited JSON::
+
+        -> {"id": 1, "op": "get", "name": "temperature"}
+        <- {"id": 1, "value": {"magnitude": 21.5, "units": "degC"}}
+
+    The lantz.ino package provides helper classes and methods to work with Arduino.
+
+    :copyright: 2018 by The Lantz Authors
+    :license: BSD, see LICENSE for more details.
+"""
+
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import threading
+
+
+class ServerError(Exception):
+    """An error raised by the driver in the server process.
+    """
+
+
+def default_socket_path(packfile_path):
+    """Socket path for a given packfile: foo.pack.yaml -> foo.sock
+    """
+    base = packfile_path
+    for ext in ('.yaml', '.pack'):
+        if base.endswith(ext):
+            base = base[:-len(ext)]
+    return base + '.sock'
+
+
+def _encode(value):
+    """Convert a value into something that json can serialize.
+
+    Quantities become {"magnitude": ..., "units": ...}, tuples (including
+    namedtuples such as the Aggregate of an AggregateFeat) become lists and
+    NumPy scalars and arrays become numbers and lists.
+    """
+    if hasattr(value, 'magnitude') and hasattr(value, 'units'):
+        return {'magnitude': _encode(value.magnitude), 'units': str(value.units)}
+    if isinstance(value, dict):
+        return {key if isinstance(key, (str, int, float, bool)) or key is None else str(key): _encode(item)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if hasattr(value, 'tolist'):
+        # NumPy scalars and arrays.
+        return _encode(value.tolist())
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if set(value.keys()) == {'magnitude', 'units'}:
+            from lantz.core import Q_
+            return Q_(value['magnitude'], value['units'])
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+
+def _dumps(message):
+    return (json.dumps(message) + '\n').encode('utf-8')
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        lock = threading.Lock()
+
+        def respond(data):
+            with lock:
+                try:
+                    self.wfile.write(data)
+                    self.wfile.flush()
+                except (OSError, ValueError):
+                    # The client has disconnected.
+                    pass
+
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError as e:
+                respond(_dumps({'id': None, 'error': 'Invalid request: %s' % e}))
+                continue
+
+            self.server.submit(request, respond)
+
+
+class INOServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serve the feats of an initialized driver over a Unix socket.
+
+    :param driver: an initialized INODriver.
+    :param path: path of the Unix socket.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, driver, path):
+        self.driver = driver
+        self.path = path
+
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+
+        super().__init__(path, _Handler)
+
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._work, name='ino-server', daemon=True)
+        self._worker.start()
+
+    def server_bind(self):
+        # Only the owner can connect, from the creation of the socket.
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+    def submit(self, request, respond):
+        self._queue.put((request, respond))
+
+    def server_close(self):
+        super().server_close()
+        self._queue.put(None)
+        self._worker.join()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def describe(self):
+        cls = self.driver.__class__
+        return {'class': cls.__qualname__,
+                'feats': list(cls._lantz_feats.keys()),
+                'dictfeats': {name: list(feat.keys) if feat.keys else None
+                              for name, feat in cls._lantz_dictfeats.items()},
+                'actions': list(cls._lantz_actions.keys()),
+                }
+
+    def execute(self, request):
+        op = request.get('op')
+        name = request.get('name')
+        driver = self.driver
+
+        if op == 'get':
+            if 'key' in request:
+                return getattr(driver, name)[request['key']]
+            return getattr(driver, name)
+        elif op == 'set':
+            value = _decode(request['value'])
+            if 'key' in request:
+                getattr(driver, name)[request['key']] = value
+            else:
+                setattr(driver, name, value)
+        elif op == 'call':
+            return getattr(driver, name)(*request.get('args', ()))
+        elif op == 'query':
+            return driver.query(request['command'])
+        elif op == 'describe':
+            return self.describe()
+        else:
+            raise ValueError('Unknown operation %r' % op)
+
+    def _work(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Reads already answered in this batch since the last write.
+            reads = {}
+
+            for item in batch:
+                if item is None:
+                    return
+
+                request, respond = item
+
+                # Any failure (including values json cannot serialize) is answered
+                # with an error, the worker keeps serving.
+                request_id = request.get('id') if isinstance(request, dict) else None
+                try:
+                    read_key = None
+                    if request.get('op') == 'get':
+                        read_key = (request.get('name'), json.dumps(request.get('key')))
+                    else:
+                        reads.clear()
+
+                    if read_key in reads:
+                        value = reads[read_key]
+                    else:
+                        value = _encode(self.execute(request))
+                        if read_key is not None:
+                            reads[read_key] = value
+                    data = _dumps({'id': request_id, 'value': value})
+                except Exception as e:
+                    data = _dumps({'id': request_id, 'error': '%s: %s' % (e.__class__.__name__, e)})
+
+                respond(data)
+
+
+class _BoundedDict:
+
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+
+    def __getitem__(self, key):
+        return self._client._request('get', name=self._name, key=key)
+
+    def __setitem__(self, key, value):
+        self._client._request('set', name=self._name, key=key, value=_encode(value))
+
+    def __repr__(self):
+        return '%r.%s[]' % (self._client, self._name)
+
+
+class INOClient:
+    """Proxy to a driver served by INOServer.
+
+    Feats, DictFeats and Actions are accessed as in the driver::
+
+        with INOClient('board.sock') as inst:
+            print(inst.temperature)
+            inst.leds[3] = True
+
+    :param path: path of the Unix socket.
+    :param timeout: socket timeout in seconds.
+    """
+
+    def __init__(self, path, timeout=None):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(path)
+
+        object.__setattr__(self, '_sock', sock)
+        object.__setattr__(self, '_file', sock.makefile('rwb'))
+        object.__setattr__(self, '_lock', threading.Lock())
+        object.__setattr__(self, '_next_id', 0)
+        object.__setattr__(self, '_description', self._request('describe'))
+
+    def _request(self, op, **kwargs):
+        with self._lock:
+            object.__setattr__(self, '_next_id', self._next_id + 1)
+            message = dict(kwargs, id=self._next_id, op=op)
+
+            self._file.write((json.dumps(message) + '\n').encode('utf-8'))
+            self._file.flush()
+
+            line = self._file.readline()
+            if not line:
+                raise ConnectionError('Connection closed by the server.')
+
+        reply = json.loads(line.decode('utf-8'))
+
+        if 'error' in reply:
+            raise ServerError(reply['error'])
+
+        return _decode(reply.get('value'))
+
+    def query(self, command):
+        """Send a raw command to the board and return the reply.
+        """
+        return self._request('query', command=command)
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __dir__(self):
+        d = self._description
+        return sorted(set(super().__dir__()) | set(d['feats']) | set(d['dictfeats']) | set(d['actions']))
+
+    def __getattr__(self, item):
+        if item.startswith('_'):
+            raise AttributeError(item)
+
+        d = self._description
+
+        if item in d['feats']:
+            return self._request('get', name=item)
+        elif item in d['dictfeats']:
+            return _BoundedDict(self, item)
+        elif item in d['actions']:
+            return lambda *args: self._request('call', name=item, args=args)
+
+        raise AttributeError('%s has no feat, dictfeat or action named %r' % (d['class'], item))
+
+    def __setattr__(self, item, value):
+        if item in self._description['feats']:
+            self._request('set', name=item, value=_encode(value))
+        else:
+            object.__setattr__(self, item, value)
+
+    def __repr__(self):
+        return '<INOClient %s at %s>' % (self._description['class'], self._sock.getpeername())
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.ino.shadow
+    ~~~~~~~~~~~~~~~~
+
+    Keep the values of a dictfeat in a NumPy array and send only what changed.
+
+    A ShadowArray holds the values of all the keys of a dictfeat (in declared
+    order) and a copy of what the board has. The array is modified freely
+    (e.g. with vectorized operations) and `sync` sends the keys that differ::
+
+        leds = ShadowArray(inst, 'leds')
+        leds.pull()                     # or assume the values given to the constructor
+        leds.values[10:20] = True
+        leds['status'] = False
+        leds.sync()
+
+    Consecutive changed keys are sent in range commands (<CMD>* <first index>
+    <value> ...) when the driver has INO_RANGE_SET = True; unchanged keys in
+    small gaps are resent to join the runs. Other keys are sent one by one.
+    Commands are pipelined with sequence tags (INO_SEQUENCE_TAGS), and inside
+    `ino_unacknowledged` they are not even waited for.
+
+    Quantities are stored as magnitudes in the units of the dictfeat.
+
+    The lantz.ino package provides helper classes and methods to work with Arduino.
+
+    :copyright: 2018 by The Lantz Authors
+    :license: BSD, see LICENSE for more details.
+"""
+
+from contextlib import nullcontext
+
+import numpy as np
+
+from lantz.core import Q_
+from lantz.core.errors import InstrumentError
+
+from .base import INODictFeat
+from .sink import COLUMN_TYPES
+
+
+class ShadowArray:
+    """Host copy of the values of a dictfeat, synchronized by difference.
+
+    :param driver: an INODriver.
+    :param name: name of a dictfeat with a setter.
+    :param values: values of the keys (in the order of ino_keys) known to be
+                   in the board. If None, the values are zero and all keys
+                   are sent in the first sync (unless `pull` is called before).
+    :param gap: maximum number of unchanged keys resent to join two runs of
+                changed keys in a single range command.
+    """
+
+    def __init__(self, driver, name, values=None, gap=2):
+        cls = driver.__class__
+        feat = cls._lantz_dictfeats.get(name)
+        if not isinstance(feat, INODictFeat) or not feat.fset:
+            raise ValueError('%s has no settable INODictFeat named %r' % (cls.__qualname__, name))
+
+        self.driver = driver
+        self.name = name
+        self.feat = feat
+        self.gap = gap
+
+        #: Keys in the order of the array.
+        self.keys = list(feat.ino_keys)
+        self._index = {key: ndx for ndx, key in enumerate(self.keys)}
+
+        units = feat.units_iget(driver) if hasattr(feat, 'units_iget') else None
+
+        #: Units of the values (None for dictfeats without units).
+        self.units = units or None
+
+        dtype = '<f8' if self.units else COLUMN_TYPES.get(feat.INO_DATATYPE, '<f8')
+
+        #: Values of the keys, to be modified and then synced.
+        self.values = np.zeros(len(self.keys), dtype=dtype)
+        if values is not None:
+            self.values[:] = [self._magnitude(value) for value in values]
+
+        # Values in the board, and keys whose value in the board is unknown.
+        self._synced = self.values.copy()
+        self._stale = np.full(len(self.keys), values is None)
+
+        # True if the bridge has the range setter of the dictfeat.
+        self._ranged = feat in cls.ino_range_feats()
+
+        self._subproperties = [feat.subproperty(driver, key) for key in self.keys]
+        self._encoders = [sub.pre_set_iget(driver) for sub in self._subproperties]
+        self._wire_keys = [feat.ino_wire_key(key) for key in self.keys]
+
+    def _magnitude(self, value):
+        if self.units and hasattr(value, 'to'):
+            return value.to(self.units).magnitude
+        return value
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, key):
+        value = self.values[self._index[key]]
+        return Q_(value, self.units) if self.units else value
+
+    def __setitem__(self, key, value):
+        self.values[self._index[key]] = self._magnitude(value)
+
+    @property
+    def dirty(self):
+        """Indices of the keys that changed since the last sync."""
+        changed = self.values != self._synced
+        if self.values.dtype.kind == 'f':
+            changed &= ~(np.isnan(self.values) & np.isnan(self._synced))
+        return np.flatnonzero(changed | self._stale)
+
+    def mark_dirty(self, keys=None):
+        """Send these keys (all if None) in the next sync, even if unchanged.
+        """
+        if keys is None:
+            self._stale[:] = True
+        else:
+            self._stale[[self._index[key] for key in keys]] = True
+
+    def _runs(self, indices, gap):
+        """Group sorted indices into (first, last) runs, joining those separated by up to gap indices.
+        """
+        runs = []
+        first = last = indices[0]
+        for ndx in indices[1:]:
+            if ndx - last - 1 > gap:
+                runs.append((first, last))
+                first = ndx
+            last = ndx
+        runs.append((first, last))
+        return runs
+
+    def _encode(self, ndx, value):
+        if self.units:
+            value = Q_(float(value), self.units)
+        else:
+            value = value.item()
+        encoder = self._encoders[ndx]
+        return value if encoder is None else encoder(value)
+
+    def commands(self):
+        """Commands that the next sync would send.
+
+        :return: list of (first index, number of keys, command) tuples.
+        """
+        dirty = self.dirty
+        if not len(dirty):
+            return []
+
+        feat = self.feat
+        values = self.values
+        commands = []
+        for first, last in self._runs(dirty.tolist(), self.gap if self._ranged else 0):
+            wire = [self._encode(ndx, values[ndx]) for ndx in range(first, last + 1)]
+            if self._ranged and last > first:
+                commands.extend(feat.ino_range_commands(first, wire))
+            else:
+                commands.extend((ndx, 1, feat._ino_format_set(self._wire_keys[ndx], value))
+                                for ndx, value in zip(range(first, last + 1), wire))
+        return commands
+
+    def sync(self):
+        """Send the keys that changed since the last sync.
+
+        :return: number of commands sent.
+        :raises InstrumentError: if the board rejects a command. The keys of
+                                 the failed command are sent again in the next sync.
+                                 (Inside `ino_unacknowledged`, errors are raised
+                                 later as AsyncCommandError and the keys are
+                                 considered synced.)
+        """
+        commands = self.commands()
+        if not commands:
+            return 0
+
+        driver = self.driver
+        sent = self.values.copy()
+
+        unacknowledged = getattr(driver._ino_local, 'unacknowledged', False)
+
+        try:
+            with nullcontext() if unacknowledged else driver.ino_pipeline([command for _, _, command in commands]):
+                for first, count, command in commands:
+                    reply = driver.set_query(command)
+                    if reply is not None and reply != 'OK':
+                        # Part of a range may have been set.
+                        self._stale[first:first + count] = True
+                        raise InstrumentError('%s: %s' % (command, reply))
+                    self._synced[first:first + count] = sent[first:first + count]
+                    self._stale[first:first + count] = False
+        finally:
+            # The values cached by the dictfeat are no longer valid.
+            for first, count, _ in commands:
+                for sub in self._subproperties[first:first + count]:
+                    sub.invalidate_cache(driver)
+                    driver._ino_invalidate(sub)
+
+        return len(commands)
+
+    def pull(self):
+        """Read the values of all the keys from the board (pipelined if possible).
+
+        :return: the values.
+        """
+        driver = self.driver
+        feat = self.feat
+        proxy = getattr(driver, self.name)
+        with driver.ino_pipeline([feat.ino_get_command(key) for key in self.keys]):
+            values = [self._magnitude(proxy[key]) for key in self.keys]
+
+        self.values[:] = values
+        self._synced[:] = self.values
+        self._stale[:] = False
+        return self.values
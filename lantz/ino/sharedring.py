@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.ino.sharedring
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Publish samples to other processes through a ring buffer in shared memory.
+
+    The driver process owns a SharedRing and appends records to it. Any number
+    of processes attach a SharedRingReader by name and get NumPy views of the
+    new records, without copies nor a round trip through the publisher::
+
+        # Driver process (e.g. as the buffer of a poll)
+        ring = SharedRing('board1-temp', capacity=100000)
+        sched.add(inst, 'temperature', 0.001, buffer=ring)
+
+        # Consumer processes
+        reader = SharedRingReader('board1-temp')
+        for seq, view in reader.read():
+            plot(view['timestamp'], view['value'])
+
+    Records are numbered from 0 in the order they were appended (the sequence
+    number). Record seq lives in slot seq % capacity, so a slow reader loses
+    the oldest ones: `read` skips them and counts them in `lost`. The views
+    point to the shared memory and are overwritten once the publisher wraps
+    around; call `valid(seq)` after using them to detect that.
+
+    Requires Python 3.8 (multiprocessing.shared_memory) and NumPy.
+
+    The lantz.ino package provides helper classes and methods to work with Arduino.
+
+    :copyright: 2018 by The Lantz Authors
+    :license: BSD, see LICENSE for more details.
+"""
+
+import ast
+import mmap
+import os
+import struct
+
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8
+    shared_memory = None
+
+MAGIC = b'LZRING01'
+
+#: magic, head (number of records appended), reserved (head + records being written),
+#: capacity, item size, data offset, dtype length
+HEADER = struct.Struct('<8sQQQII I')
+
+#: Offset of head and reserved in the header.
+COUNTERS_OFFSET = 8
+
+#: Data starts at a multiple of this offset.
+ALIGNMENT = 64
+
+#: Record of a sample: host timestamp and value.
+SAMPLE_DTYPE = np.dtype([('timestamp', '<f8'), ('value', '<f8')])
+
+
+def _check_available():
+    if shared_memory is None:
+        raise RuntimeError('Shared memory rings require Python 3.8 or newer.')
+
+
+def _attach(name):
+    """Map an existing shared memory block read-only.
+
+    SharedMemory would map it read-write and register it in the resource
+    tracker, which unlinks it when the consumer exits.
+
+    :return: an object with a buffer and a close method.
+    """
+    if os.name != 'posix':
+        return shared_memory.SharedMemory(name)
+
+    import _posixshmem
+
+    fd = _posixshmem.shm_open(name if name.startswith('/') else '/' + name, os.O_RDONLY, mode=0)
+    try:
+        return mmap.mmap(fd, os.fstat(fd).st_size, prot=mmap.PROT_READ)
+    finally:
+        os.close(fd)
+
+
+class _Ring:
+
+    def _map(self, buf, capacity, dtype, offset):
+        self.capacity = capacity
+        self.dtype = dtype
+        self._counters = np.ndarray((2, ), dtype='<u8', buffer=buf, offset=COUNTERS_OFFSET)
+        self._data = np.ndarray((capacity, ), dtype=dtype, buffer=buf, offset=offset)
+
+    @property
+    def head(self):
+        """Number of records appended so far (sequence number of the next one)."""
+        return int(self._counters[0])
+
+    @property
+    def oldest(self):
+        """Sequence number of the oldest record that is not being overwritten."""
+        return max(int(self._counters[1]) - self.capacity, 0)
+
+    def close(self):
+        self._counters = self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SharedRing(_Ring):
+    """Ring buffer of records in shared memory, written by a single publisher.
+
+    :param name: name of the shared memory block (None for a random one, see `name`).
+    :param capacity: number of records.
+    :param dtype: NumPy dtype of a record (default: timestamp and value).
+    """
+
+    def __init__(self, name=None, capacity=65536, dtype=SAMPLE_DTYPE):
+        _check_available()
+
+        dtype = np.dtype(dtype)
+        descr = repr(np.lib.format.dtype_to_descr(dtype)).encode('ascii')
+        offset = -(-(HEADER.size + len(descr)) // ALIGNMENT) * ALIGNMENT
+
+        self._shm = shared_memory.SharedMemory(name, create=True, size=offset + capacity * dtype.itemsize)
+
+        #: Name to attach readers.
+        self.name = self._shm.name
+
+        buf = self._shm.buf
+        HEADER.pack_into(buf, 0, MAGIC, 0, 0, capacity, dtype.itemsize, offset, len(descr))
+        buf[HEADER.size:HEADER.size + len(descr)] = descr
+
+        self._map(buf, capacity, dtype, offset)
+        self._samples = dtype == SAMPLE_DTYPE
+
+    def extend(self, records):
+        """Append an array (or sequence) of records.
+        """
+        records = np.asarray(records, dtype=self.dtype)
+        counters = self._counters
+        count = len(records)
+        head = int(counters[0])
+        end = head + count
+
+        # Readers check reserved to know which records are being overwritten.
+        counters[1] = end
+
+        if count > self.capacity:
+            # Only the last ones fit.
+            records = records[-self.capacity:]
+            head = end - self.capacity
+            count = self.capacity
+
+        start = head % self.capacity
+        first = min(count, self.capacity - start)
+        self._data[start:start + first] = records[:first]
+        self._data[:count - first] = records[first:]
+
+        # Publish after the data is written.
+        counters[0] = end
+
+    def append(self, record):
+        """Append a record.
+
+        With the default dtype, record is a (timestamp, value) tuple as
+        delivered by the Scheduler (quantities are stored as their magnitude).
+        """
+        counters = self._counters
+        head = int(counters[0])
+        counters[1] = head + 1
+        if self._samples:
+            timestamp, value = record
+            self._data[head % self.capacity] = (timestamp, getattr(value, 'magnitude', value))
+        else:
+            self._data[head % self.capacity] = record
+        counters[0] = head + 1
+
+    def close(self, unlink=True):
+        """Close the ring and (by default) remove it. Attached readers keep their mapping.
+        """
+        super().close()
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+
+class SharedRingReader(_Ring):
+    """Read the records of a SharedRing published by another process.
+
+    The block is mapped read-only (on POSIX systems), and so are the returned views.
+
+    :param name: name of the shared memory block.
+    :param start: sequence number of the first record to read (default: only new records).
+    """
+
+    def __init__(self, name, start=None):
+        _check_available()
+
+        self._mapping = _attach(name)
+        buf = getattr(self._mapping, 'buf', self._mapping)
+
+        magic, _, _, capacity, itemsize, offset, size = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            self._mapping.close()
+            raise ValueError('%s is not a lantz shared ring' % name)
+
+        descr = ast.literal_eval(bytes(buf[HEADER.size:HEADER.size + size]).decode('ascii'))
+        dtype = np.lib.format.descr_to_dtype(descr)
+        if dtype.itemsize != itemsize:
+            self._mapping.close()
+            raise ValueError('Inconsistent record size in %s' % name)
+
+        #: Name of the shared memory block.
+        self.name = name
+
+        self._map(buf, capacity, dtype, offset)
+        self._data.flags.writeable = False
+
+        #: Sequence number of the next record to read.
+        self.tail = self.head if start is None else start
+
+        #: Number of records overwritten before they were read.
+        self.lost = 0
+
+    def read(self, maximum=None):
+        """Return the records appended since the last read.
+
+        :param maximum: maximum number of records.
+        :return: list of (sequence number of the first record, view) tuples
+                 (two when the records wrap around the end of the buffer).
+        """
+        head = self.head
+        oldest = self.oldest
+        if self.tail < oldest:
+            self.lost += oldest - self.tail
+            self.tail = oldest
+
+        count = head - self.tail
+        if maximum is not None:
+            count = min(count, maximum)
+
+        out = []
+        seq = self.tail
+        while count > 0:
+            start = seq % self.capacity
+            n = min(count, self.capacity - start)
+            out.append((seq, self._data[start:start + n]))
+            seq += n
+            count -= n
+
+        self.tail = seq
+        return out
+
+    def read_copy(self, maximum=None):
+        """Like `read` but return a single array (a copy) and the sequence number of its first record.
+
+        The records overwritten while copying are counted in `lost` and dropped.
+        """
+        chunks = self.read(maximum)
+        if not chunks:
+            return self.tail, np.empty(0, dtype=self.dtype)
+
+        seq = chunks[0][0]
+        data = np.concatenate([view for _, view in chunks])
+
+        # Drop what the publisher overwrote during the copy.
+        oldest = self.oldest
+        if seq < oldest:
+            self.lost += oldest - seq
+            data = data[oldest - seq:]
+            seq = oldest
+
+        return seq, data
+
+    def valid(self, seq):
+        """True if the record seq (and the following ones) have not been overwritten yet.
+        """
+        return seq >= self.oldest
+
+    def close(self):
+        super().close()
+        try:
+            self._mapping.close()
+        except BufferError:
+            # Views returned by read are still alive, the mapping is released with them.
+            pass
+
+    @property
+    def pending(self):
+        """Number of records appended and not read yet (including lost ones)."""
+        return self.head - self.tail
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.ino.sink
+    ~~~~~~~~~~~~~~
+
+    Record feats to disk in fixed size chunks.
+
+    A RecordingSink keeps a single chunk of rows in memory (a NumPy structured
+    array) and appends it to the file each time it is full, so the memory used
+    does not grow with the length of the run. Each row has a timestamp and a
+    column per feat (or dictfeat key); quantities are stored as magnitudes in
+    the units of the feat, which are saved with the column names.
+
+    The format is given by the extension of the path:
+
+    - .h5 / .hdf5: a resizable, chunked dataset (requires h5py).
+    - .npy: a memory-mapped file preallocated for `rows` rows. On close the
+      header is updated to the number of rows recorded and the file is
+      truncated, so np.load reads it as usual. The metadata is written next to
+      it (<name>.json), also after each chunk in case the run is interrupted.
+
+    Rows come from a poll of the Scheduler (the sink is its buffer)::
+
+        with RecordingSink(inst, 'temperature', 'run.h5') as sink:
+            with Scheduler() as sched:
+                sched.add(inst, 'temperature', 0.01, buffer=sink)
+                time.sleep(3600)
+
+    or from `sample`, which gets all the columns at once (pipelined)::
+
+        sink = RecordingSink(inst, ['temperature', 'volts'], 'run.npy', rows=10 ** 6)
+        sink.sample()
+
+    Timestamps are in the time.monotonic() base (aligned with the board clock
+    when the driver uses INO_TIMESTAMPS). Add the clock_offset metadata to
+    get wall clock times.
+
+    The lantz.ino package provides helper classes and methods to work with Arduino.
+
+    :copyright: 2018 by The Lantz Authors
+    :license: BSD, see LICENSE for more details.
+"""
+
+from contextlib import nullcontext
+from datetime import datetime
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+#: Rows kept in memory and written at once.
+CHUNK = 4096
+
+#: NumPy type of the columns by INO_DATATYPE (for feats without units).
+COLUMN_TYPES = {'B': '?', 'I': '<i8', 'L': '<i8', 'F': '<f8'}
+
+
+def _columns(driver, names):
+    """Expand feat names into (column name, feat, key, dtype, units) tuples.
+
+    :param names: feat or dictfeat names, or (dictfeat name, key) tuples.
+                  A dictfeat name adds a column per key.
+    """
+    cls = driver.__class__
+
+    if isinstance(names, (str, tuple)):
+        names = [names]
+
+    columns = []
+    for name in names:
+        if isinstance(name, tuple):
+            name, keys = name[0], [name[1]]
+        else:
+            keys = [None]
+
+        if name in cls._lantz_feats:
+            feat = cls._lantz_feats[name]
+            keys = [None]
+        elif name in cls._lantz_dictfeats:
+            feat = cls._lantz_dictfeats[name]
+            if keys == [None]:
+                keys = list(feat.ino_keys if hasattr(feat, 'ino_keys') else feat.keys)
+        else:
+            raise ValueError('%s has no feat or dictfeat named %r' % (cls.__qualname__, name))
+
+        units = feat.units_iget(driver) if hasattr(feat, 'units_iget') else None
+        if units:
+            units = str(units)
+            dtype = '<f8'
+        else:
+            units = None
+            dtype = COLUMN_TYPES.get(getattr(feat, 'INO_DATATYPE', None), '<f8')
+
+        for key in keys:
+            column = name if key is None else '%s[%s]' % (name, key)
+            columns.append((column, feat, key, dtype, units))
+
+    return columns
+
+
+class _NpyFile:
+    """Preallocated memory-mapped .npy file.
+    """
+
+    def __init__(self, path, dtype, rows, metadata):
+        if not rows:
+            raise ValueError('The number of rows must be given to preallocate %s' % path)
+
+        self.path = path
+        self.metadata_path = os.path.splitext(path)[0] + '.json'
+        self.metadata = metadata
+        self.capacity = rows
+        self.rows = 0
+
+        self._mm = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(rows, ))
+        self._offset = self._mm.offset
+        self._write_metadata()
+
+    def _write_metadata(self):
+        with open(self.metadata_path, 'w', encoding='utf-8') as fo:
+            json.dump(dict(self.metadata, rows=self.rows), fo, indent=2)
+
+    def write(self, chunk):
+        end = self.rows + len(chunk)
+        if end > self.capacity:
+            raise ValueError('%s is full (%d rows)' % (self.path, self.capacity))
+
+        self._mm[self.rows:end] = chunk
+        self._mm.flush()
+        self.rows = end
+        self._write_metadata()
+
+    def close(self):
+        descr = self._mm.dtype
+        del self._mm
+
+        # Rewrite the header with the recorded rows, keeping its length.
+        with open(self.path, 'r+b') as fo:
+            preamble = fo.read(8)
+            size = 2 if preamble[6] == 1 else 4
+            header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (
+                np.lib.format.dtype_to_descr(descr), self.rows)
+            length = self._offset - len(preamble) - size
+            fo.seek(len(preamble) + size)
+            fo.write(header.ljust(length - 1).encode('latin1') + b'\n')
+            fo.truncate(self._offset + self.rows * descr.itemsize)
+
+        self._write_metadata()
+
+
+class _HDF5File:
+    """Resizable chunked dataset in an HDF5 file.
+    """
+
+    def __init__(self, path, dtype, chunk, metadata, dataset='data'):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError('h5py is required to record to HDF5 files (or use a .npy path).')
+
+        self.path = path
+        self.rows = 0
+
+        self._file = h5py.File(path, 'a')
+        if dataset in self._file:
+            del self._file[dataset]
+        self._dataset = self._file.create_dataset(dataset, shape=(0, ), maxshape=(None, ),
+                                                  dtype=dtype, chunks=(chunk, ))
+        for key, value in metadata.items():
+            self._dataset.attrs[key] = value if isinstance(value, (str, int, float)) else json.dumps(value)
+
+    def write(self, chunk):
+        end = self.rows + len(chunk)
+        self._dataset.resize((end, ))
+        self._dataset[self.rows:end] = chunk
+        self._file.flush()
+        self.rows = end
+
+    def close(self):
+        self._file.close()
+
+
+class RecordingSink:
+    """Record feats of a driver in fixed size chunks to an HDF5 or .npy file.
+
+    :param driver: an INODriver (or any lantz driver).
+    :param feats: a feat name or a list of feat names, dictfeat names (a column
+                  per key) and (dictfeat name, key) tuples.
+    :param path: .h5, .hdf5 or .npy file.
+    :param chunk: rows kept in memory and written at once.
+    :param rows: maximum number of rows (required for .npy files).
+    :param dataset: name of the dataset (HDF5 only).
+    """
+
+    def __init__(self, driver, feats, path, chunk=CHUNK, rows=None, dataset='data'):
+        self.driver = driver
+        self.path = path
+
+        self._columns = _columns(driver, feats)
+
+        #: NumPy dtype of a row.
+        self.dtype = np.dtype([('timestamp', '<f8')] + [(column, dtype) for column, _, _, dtype, _ in self._columns])
+
+        #: Column name -> units (None for columns without units).
+        self.units = {column: units for column, _, _, _, units in self._columns}
+
+        self.metadata = {'driver': '%s.%s' % (driver.__class__.__module__, driver.__class__.__qualname__),
+                         'columns': list(self.dtype.names),
+                         'units': self.units,
+                         'started': datetime.now().isoformat(),
+                         'clock_offset': time.time() - time.monotonic()}
+
+        ext = os.path.splitext(path)[1].lower()
+        if ext in ('.h5', '.hdf5'):
+            self._file = _HDF5File(path, self.dtype, chunk, self.metadata, dataset)
+        elif ext == '.npy':
+            self._file = _NpyFile(path, self.dtype, rows, self.metadata)
+        else:
+            raise ValueError('Unknown file type %r (use .h5, .hdf5 or .npy)' % ext)
+
+        self._chunk = np.zeros(chunk, dtype=self.dtype)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def columns(self):
+        return self.dtype.names[1:]
+
+    @property
+    def rows(self):
+        """Number of rows recorded (including those not written yet)."""
+        return self._file.rows + self._count
+
+    def append(self, row):
+        """Add a row.
+
+        :param row: (timestamp, value) tuple. value is a single value (for a
+                    sink of one column, e.g. as the buffer of a Scheduler poll),
+                    a sequence of values in column order or a dict of column
+                    name to value. Quantities are converted to the units of the column.
+        """
+        timestamp, value = row
+        if isinstance(value, dict):
+            values = [value[column] for column in self.columns]
+        elif len(self._columns) == 1:
+            values = [value]
+        else:
+            values = list(value)
+
+        record = [timestamp]
+        for (_, _, _, _, units), value in zip(self._columns, values):
+            if units is not None and hasattr(value, 'to'):
+                value = value.to(units).magnitude
+            record.append(value)
+
+        with self._lock:
+            self._chunk[self._count] = tuple(record)
+            self._count += 1
+            if self._count == len(self._chunk):
+                self._write()
+
+    def sample(self):
+        """Get all the columns from the driver (pipelined if possible) and add a row.
+
+        :return: the row.
+        """
+        driver = self.driver
+        commands = [feat.ino_get_command(key) for _, feat, key, _, _ in self._columns
+                    if hasattr(feat, 'ino_get_command')]
+
+        pipeline = getattr(driver, 'ino_pipeline', None)
+        timestamp = None
+        values = []
+        with pipeline(commands) if pipeline else nullcontext():
+            for _, feat, key, _, _ in self._columns:
+                value = getattr(driver, feat.name)
+                if key is not None:
+                    value = value[key]
+                if timestamp is None and getattr(driver, 'INO_TIMESTAMPS', False):
+                    # The time of the first reply.
+                    timestamp = driver.ino_timestamp()
+                values.append(value)
+
+        row = (time.monotonic() if timestamp is None else timestamp, values)
+        self.append(row)
+        return row
+
+    def _write(self):
+        self._file.write(self._chunk[:self._count])
+        self._count = 0
+
+    def flush(self):
+        """Write the rows in memory.
+        """
+        with self._lock:
+            if self._count:
+                self._write()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
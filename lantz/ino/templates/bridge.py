@@ -8,6 +8,11 @@ IN_H_HEADER = r"""
 
 const char COMPILE_DATE_TIME[] = __DATE__ " " __TIME__;
 
+// Replies are printed to Reply (Serial, or a non-blocking queue; see INODriver.INO_TX_QUEUE).
+// Print to Reply (instead of Serial) to keep the order with the replies.
+extern Print &Reply;
+
+void begin_reply();
 void ok();
 void error(const char*);
 void error_i(int);
@@ -19,21 +24,72 @@ IN_CPP_HEADER = r"""
 
 SerialCommand sCmd;
 
+#ifdef BRIDGE_TIMESTAMPS
+unsigned long reply_stamp;
+bool reply_stamped = false;
+
+void stamp_reply(unsigned long time) {
+  reply_stamp = time;
+  reply_stamped = true;
+}
+#endif
+
+void begin_reply() {
+  // Echo the sequence tag of the command (if any)
+  const char *tag = sCmd.getTag();
+  if (tag != NULL) {
+    Reply.print(tag);
+    Reply.print(' ');
+  }
+#ifdef BRIDGE_TIMESTAMPS
+  // t<micros() in hex> when the command was received (or as given to stamp_reply)
+  Reply.print('t');
+  Reply.print(reply_stamped ? reply_stamp : sCmd.getTime(), HEX);
+  Reply.print(' ');
+  reply_stamped = false;
+#endif
+}
+
+// Commands sent with the ~ prefix (unacknowledged) get no OK, and their errors
+// are pushed as !E <command> <error>
+void begin_error() {
+  if (sCmd.isUnacknowledged()) {
+    Reply.print("!E ");
+    Reply.print(sCmd.getCommand());
+    Reply.print(' ');
+    return;
+  }
+  begin_reply();
+  Reply.print("ERROR: ");
+}
+
 void ok() {
-  Serial.println("OK");
+  if (sCmd.isUnacknowledged()) {
+    return;
+  }
+  begin_reply();
+  Reply.println("OK");
 }
 
 void error(const char* msg) {
-  Serial.print("ERROR: ");
-  Serial.println(msg);
+  begin_error();
+  Reply.println(msg);
 }
 
 void error_i(int errno) {
-  Serial.print("ERROR: ");
-  Serial.println(errno);
+  begin_error();
+  Reply.println(errno);
 }
 
-void bridge_loop() {
+"""
+
+REPLY_SERIAL = r"""
+Print &Reply = Serial;
+
+"""
+
+POLL = r"""
+void bridge_poll() {
   while (Serial.available() > 0) {
     sCmd.readSerial();
   }
@@ -41,9 +97,112 @@ void bridge_loop() {
 
 """
 
+BUDGET_H = r"""
+#define BRIDGE_RX_BUDGET %d
+#define BRIDGE_TIME_BUDGET %dUL
+#define BRIDGE_TX_QUEUE %d
+#define BRIDGE_REPLY_RESERVE %d
+"""
+
+REPLY_QUEUE = r"""
+//// Non-blocking replies
+// Replies are queued and sent as the serial transmit buffer has room.
+
+class ReplyQueue : public Print {
+  public:
+    size_t write(uint8_t c) {
+      if (count == BRIDGE_TX_QUEUE) {
+        // Queue full: send the oldest byte (blocking) to make room.
+        Serial.write(data[head]);
+        head = (head + 1) % BRIDGE_TX_QUEUE;
+        count--;
+      }
+      data[(head + count) % BRIDGE_TX_QUEUE] = c;
+      count++;
+      return 1;
+    }
+    using Print::write;
+
+    unsigned int room() {
+      return BRIDGE_TX_QUEUE - count;
+    }
+
+    void send() {
+      int n = Serial.availableForWrite();
+      while (n-- > 0 && count > 0) {
+        Serial.write(data[head]);
+        head = (head + 1) % BRIDGE_TX_QUEUE;
+        count--;
+      }
+    }
+
+  private:
+    uint8_t data[BRIDGE_TX_QUEUE];
+    unsigned int head = 0;
+    unsigned int count = 0;
+};
+
+ReplyQueue replyQueue;
+Print &Reply = replyQueue;
+
+unsigned int reply_room() {
+  return replyQueue.room();
+}
+
+void reply_send() {
+  replyQueue.send();
+}
+
+"""
+
+REPLY_DIRECT = r"""
+unsigned int reply_room() {
+  return Serial.availableForWrite();
+}
+
+void reply_send() {
+}
+
+"""
+
+POLL_BUDGET = r"""
+// Bounded work in each loop iteration: at most BRIDGE_RX_BUDGET received
+// characters or BRIDGE_TIME_BUDGET microseconds (the handlers are not interrupted).
+// Commands are left in the receive buffer while there is no room for their reply.
+void bridge_poll() {
+  unsigned long start = micros();
+  unsigned int received = 0;
+
+  reply_send();
+  while (Serial.available() > 0 && received < BRIDGE_RX_BUDGET) {
+    if (reply_room() < BRIDGE_REPLY_RESERVE) {
+      break;
+    }
+    sCmd.readSerial(1);
+    received++;
+    if (micros() - start >= BRIDGE_TIME_BUDGET) {
+      break;
+    }
+  }
+  reply_send();
+}
+
+"""
+
+LOOP = r"""
+void bridge_loop() {
+  bridge_poll();
+#ifdef BRIDGE_AGGREGATES
+  aggregate_loop();
+#endif
+}
+
+"""
+
 IN_H_BODY = r"""
 
 void getInfo();
+void getSync();
 void unrecognized(const char *);
 """
 
@@ -52,8 +211,16 @@ IN_CPP_BODY = r"""
 //// Code 
 
 void getInfo() {
-  Serial.print("%s,");
-  Serial.println(COMPILE_DATE_TIME);
+  begin_reply();
+  Reply.print("%s,");
+  Reply.println(COMPILE_DATE_TIME);
+}
+
+void getSync() {
+  char *token = sCmd.next();
+  begin_reply();
+  Reply.print("SYNC ");
+  Reply.println(token != NULL ? token : "");
 }
 
 void unrecognized(const char *command) {
@@ -73,8 +240,299 @@ IN_SETUP = r"""
   // if the operation is successfull
 
   // All parameters are ascii encoded strings
+
+  // A command might be preceded by a sequence tag
+  //    @<tag> <command> <parameters>
+  // which is echoed back at the beginning of the reply
+  //    @<tag> <reply>
+
+  // A setter or call prefixed with ~ does not return OK
+  //    ~<command> <parameters>
+  // and its errors are returned when they happen as
+  //    !E <command> <error>
   sCmd.addCommand("INFO?", getInfo); 
 
+  // Resynchronization:
+  //   SYNC? <token>
+  // Returns: SYNC <token>
+  sCmd.addCommand("SYNC?", getSync); 
+
   sCmd.setDefaultHandler(unrecognized); 
 
-"""
\ No newline at end of file
+"""
+TIME_H = r"""
+#define BRIDGE_TIMESTAMPS
+
+// Stamp the next reply with this time (micros()) instead of the time
+// at which the command was received (e.g. the time of a measurement).
+void stamp_reply(unsigned long);
+void getBoardTime();
+"""
+
+TIME_SETUP = r"""
+  // Clock of the board:
+  //   TIME?
+  // Returns: <L> micros()
+  // With timestamps, all the replies are preceded by t<micros() in hex>
+  sCmd.addCommand("TIME?", getBoardTime);
+
+"""
+
+TIME_CPP = r"""
+void getBoardTime() {
+  unsigned long now = micros();
+  begin_reply();
+  Reply.println(now);
+}
+
+"""
+
+STATS_H = r"""
+#define BRIDGE_STATS_SIZE %d
+
+void getStats();
+void stats_record(unsigned int, unsigned long);
+"""
+
+STATS_SETUP = r"""
+  // Statistics:
+  //   STATS? [<I> reset]
+  // Returns: <loop max us>,<bridge max us>,<loops>;<command>,<count>,<total us>,<max us>;...
+  sCmd.addCommand("STATS?", getStats);
+
+  sCmd.setTimingHandler(stats_record);
+
+"""
+
+STATS_CPP = r"""
+//// Handler timing and loop statistics
+
+unsigned long stats_count[BRIDGE_STATS_SIZE];
+unsigned long stats_total[BRIDGE_STATS_SIZE];
+unsigned long stats_max[BRIDGE_STATS_SIZE];
+
+unsigned long stats_loops = 0;
+unsigned long stats_loop_last = 0;
+unsigned long stats_loop_max = 0;
+unsigned long stats_bridge_max = 0;
+
+void stats_record(unsigned int index, unsigned long elapsed) {
+  if (index >= BRIDGE_STATS_SIZE) {
+    return;
+  }
+  stats_count[index]++;
+  stats_total[index] += elapsed;
+  if (elapsed > stats_max[index]) {
+    stats_max[index] = elapsed;
+  }
+}
+
+void stats_reset() {
+  for (unsigned int i = 0; i < BRIDGE_STATS_SIZE; i++) {
+    stats_count[i] = 0;
+    stats_total[i] = 0;
+    stats_max[i] = 0;
+  }
+  stats_loops = 0;
+  stats_loop_last = 0;
+  stats_loop_max = 0;
+  stats_bridge_max = 0;
+}
+
+void getStats() {
+  char *arg = sCmd.next();
+
+  begin_reply();
+  Reply.print(stats_loop_max);
+  Reply.print(',');
+  Reply.print(stats_bridge_max);
+  Reply.print(',');
+  Reply.print(stats_loops);
+  for (unsigned int i = 0; i < BRIDGE_STATS_SIZE; i++) {
+    if (stats_count[i] == 0) {
+      continue;
+    }
+    Reply.print(';');
+    Reply.print(sCmd.getCommandName(i));
+    Reply.print(',');
+    Reply.print(stats_count[i]);
+    Reply.print(',');
+    Reply.print(stats_total[i]);
+    Reply.print(',');
+    Reply.print(stats_max[i]);
+  }
+  Reply.println();
+
+  if (arg != NULL && atoi(arg)) {
+    stats_reset();
+  }
+}
+
+void bridge_loop() {
+  unsigned long start = micros();
+  if (stats_loops > 0 && start - stats_loop_last > stats_loop_max) {
+    stats_loop_max = start - stats_loop_last;
+  }
+  stats_loop_last = start;
+  stats_loops++;
+
+  bridge_poll();
+#ifdef BRIDGE_AGGREGATES
+  aggregate_loop();
+#endif
+
+  unsigned long elapsed = micros() - start;
+  if (elapsed > stats_bridge_max) {
+    stats_bridge_max = elapsed;
+  }
+}
+
+"""
+
+STATE_H = r"""
+void getState();
+"""
+
+STATE_SETUP = r"""
+  // State of all readable feats and dictfeat keys (see INODriver.ino_state_layout):
+  //   STATE?
+  // Returns: <value>,<value>,...
+  sCmd.addCommand("STATE?", getState);
+
+"""
+
+STATE_BEGIN = r"""
+void getState() {
+  begin_reply();
+"""
+
+STATE_VALUE = r"""  Reply.print(%s);
+"""
+
+STATE_SEPARATOR = r"""  Reply.print(',');
+"""
+
+STATE_END = r"""  Reply.println();
+}
+
+"""
+
+AGGREGATE_H = r"""
+#define BRIDGE_AGGREGATES
+
+// Running aggregate of the samples of an AggregateFeat.
+struct Aggregate {
+  unsigned long count;
+  float sum;
+  float sumsq;
+  float min;
+  float max;
+  unsigned long sampled;  // micros() of the last sample
+  unsigned long period;   // ms between pushes (0: no push)
+  unsigned long pushed;   // millis() of the last push
+};
+
+void aggregate_loop();
+"""
+
+AGGREGATE_CPP = r"""
+//// Aggregate feats
+// Samples are added to a running aggregate in each loop iteration (at most every
+// interval microseconds). Reading the aggregate (or pushing it) starts a new window.
+
+void aggregate_reset(Aggregate &a) {
+  a.count = 0;
+  a.sum = 0;
+  a.sumsq = 0;
+  a.min = INFINITY;
+  a.max = -INFINITY;
+}
+
+void aggregate_sample(Aggregate &a, float (*get)(), unsigned long interval) {
+  unsigned long now = micros();
+  if (a.count > 0 && interval > 0 && now - a.sampled < interval) {
+    return;
+  }
+  a.sampled = now;
+  float value = get();
+  if (a.count == 0) {
+    // The window starts (min and max are not initialized in a new Aggregate)
+    aggregate_reset(a);
+  }
+  a.count++;
+  a.sum += value;
+  a.sumsq += value * value;
+  if (value < a.min) {
+    a.min = value;
+  }
+  if (value > a.max) {
+    a.max = value;
+  }
+}
+
+// <mean>,<min>,<max>,<rms>,<count> (nan if there are no samples)
+void aggregate_print(Aggregate &a, int digits) {
+  if (a.count == 0) {
+    Reply.print("nan,nan,nan,nan,0");
+  } else {
+    Reply.print(a.sum / a.count, digits);
+    Reply.print(',');
+    Reply.print(a.min, digits);
+    Reply.print(',');
+    Reply.print(a.max, digits);
+    Reply.print(',');
+    Reply.print(sqrt(a.sumsq / a.count), digits);
+    Reply.print(',');
+    Reply.print(a.count);
+  }
+  a.count = 0;
+}
+
+void aggregate_reply(Aggregate &a, int digits) {
+  begin_reply();
+  aggregate_print(a, digits);
+  Reply.println();
+}
+
+void aggregate_set_period(Aggregate &a) {
+  char *arg = sCmd.next();
+  if (arg == NULL) {
+    error("No value stated");
+    return;
+  }
+  a.period = atol(arg);
+  a.pushed = millis();
+  ok();
+}
+
+// !<command> <aggregate>, preceded by t<micros() in hex> with timestamps.
+void aggregate_push(Aggregate &a, const char *command, int digits) {
+  if (a.period == 0 || millis() - a.pushed < a.period) {
+    return;
+  }
+  a.pushed += a.period;
+  Reply.print('!');
+#ifdef BRIDGE_TIMESTAMPS
+  Reply.print('t');
+  Reply.print(micros(), HEX);
+  Reply.print(' ');
+#endif
+  Reply.print(command);
+  Reply.print(' ');
+  aggregate_print(a, digits);
+  Reply.println();
+}
+
+"""
+
+AGGREGATE_LOOP_BEGIN = r"""
+void aggregate_loop() {
+"""
+
+AGGREGATE_LOOP_FEAT = r"""  aggregate_sample(aggregate_%s, get_%s, %dUL);
+  aggregate_push(aggregate_%s, "%s", %d);
+"""
+
+AGGREGATE_LOOP_END = r"""}
+
+"""
@@ -45,16 +45,33 @@ H = r"""
 // Uncomment the next line to run the library in debug mode (verbose messages)
 //#define SERIALCOMMAND_DEBUG
 
+#ifndef pgm_read_ptr
+  #define pgm_read_ptr(addr) (*(void * const *)(addr))
+#endif
+
+// Entry of a static command table stored in program memory (see setCommandTable)
+struct SerialCommandEntry {
+  char command[SERIALCOMMAND_MAXCOMMANDLENGTH + 1];
+  void (*function)();
+};
+
 
 class SerialCommand {
   public:
     SerialCommand();      // Constructor
     void addCommand(const char *command, void(*function)());  // Add a command to the processing dictionary.
     void setDefaultHandler(void (*function)(const char *));   // A handler to call when no valid command received.
+    void setTimingHandler(void (*function)(unsigned int, unsigned long));  // A handler to report the duration of each command.
+    void setCommandTable(const SerialCommandEntry *table, unsigned int count);  // Add a PROGMEM table of commands sorted by name.
 
-    void readSerial();    // Main entry point.
+    void readSerial(unsigned int maxChars = 0xFFFF);  // Main entry point. Reads at most maxChars characters.
     void clearBuffer();   // Clears the input buffer.
     char *next();         // Returns pointer to next token found in command buffer (for getting arguments to commands).
+    const char *getCommandName(unsigned int index);  // Returns the name of a registered command.
+    const char *getTag(); // Returns the sequence tag (e.g. "@1f") of the command being processed or NULL.
+    const char *getCommand();  // Returns the name of the command being processed (without the ~ prefix).
+    boolean isUnacknowledged();  // True if the command being processed was sent with the ~ prefix.
+    unsigned long getTime();  // Returns micros() when the command being processed was received.
 
   private:
     // Command/handler dictionary
@@ -63,17 +80,32 @@ class SerialCommand {
       void (*function)();
     };                                    // Data structure to hold Command/Handler function key-value pairs
     SerialCommandCallback *commandList;   // Actual definition for command/handler array
-    byte commandCount;
+    unsigned int commandCount;
+
+    // Static command table (in program memory, sorted by command)
+    const SerialCommandEntry *commandTable;
+    unsigned int commandTableCount;
+    char commandName[SERIALCOMMAND_MAXCOMMANDLENGTH + 1];  // Copy of a command name read from the table
 
     // Pointer to the default handler function
     void (*defaultHandler)(const char *);
 
+    // Pointer to the timing handler function (command index, elapsed microseconds)
+    void (*timingHandler)(unsigned int, unsigned long);
+
     char delim[2]; // null-terminated list of character to be used as delimeters for tokenizing (default " ")
     char term;     // Character that signals end of command (default '\n')
 
     char buffer[SERIALCOMMAND_BUFFER + 1]; // Buffer of stored characters while waiting for terminator character
     byte bufPos;                        // Current position in the buffer
     char *last;                         // State variable used by strtok_r during processing
+    char *tag;                          // Sequence tag of the current command (points into buffer)
+    char *command;                      // Name of the current command (points into buffer)
+    boolean unacknowledged;             // The current command was prefixed with ~
+    unsigned long received;             // micros() when the terminator of the current command was read
+
+    void call(unsigned int index, void (*function)());  // Execute (and time) a handler.
+    int findInTable(const char *command);  // Binary search in the command table. Returns -1 if not found.
 };
 
 #endif //SerialCommand_h
@@ -112,9 +144,16 @@ CPP = r"""
 SerialCommand::SerialCommand()
   : commandList(NULL),
     commandCount(0),
+    commandTable(NULL),
+    commandTableCount(0),
     defaultHandler(NULL),
+    timingHandler(NULL),
     term('\n'),           // default terminator for commands, newline character
-    last(NULL)
+    last(NULL),
+    tag(NULL),
+    command(NULL),
+    unacknowledged(false),
+    received(0)
 {
   strcpy(delim, " "); // strtok_r needs a null-terminated string
   clearBuffer();
@@ -135,6 +174,7 @@ void SerialCommand::addCommand(const char *command, void (*function)()) {
 
   commandList = (SerialCommandCallback *) realloc(commandList, (commandCount + 1) * sizeof(SerialCommandCallback));
   strncpy(commandList[commandCount].command, command, SERIALCOMMAND_MAXCOMMANDLENGTH);
+  commandList[commandCount].command[SERIALCOMMAND_MAXCOMMANDLENGTH] = '\0';
   commandList[commandCount].function = function;
   commandCount++;
 }
@@ -147,29 +187,91 @@ void SerialCommand::setDefaultHandler(void (*function)(const char *)) {
   defaultHandler = function;
 }
 
+/**
+ * This sets up a handler to be called after each matched command with the
+ * index of the command and the time (in microseconds) spent in its handler.
+ */
+void SerialCommand::setTimingHandler(void (*function)(unsigned int, unsigned long)) {
+  timingHandler = function;
+}
+
+
+/**
+ * This sets up a static table of commands stored in program memory (PROGMEM),
+ * which must be sorted by command. It is searched (with a binary search) after
+ * the commands added with addCommand, saving RAM and time in large command sets.
+ */
+void SerialCommand::setCommandTable(const SerialCommandEntry *table, unsigned int count) {
+  commandTable = table;
+  commandTableCount = count;
+}
+
+/**
+ * Execute a handler, reporting the time spent to the timing handler (if any).
+ * Commands in the table are indexed after those added with addCommand.
+ */
+void SerialCommand::call(unsigned int index, void (*function)()) {
+  if (timingHandler != NULL) {
+    unsigned long start = micros();
+    (*function)();
+    (*timingHandler)(index, micros() - start);
+  } else {
+    (*function)();
+  }
+}
+
+/**
+ * Look for a command in the static table.
+ */
+int SerialCommand::findInTable(const char *command) {
+  unsigned int lo = 0;
+  unsigned int hi = commandTableCount;
+  while (lo < hi) {
+    unsigned int mid = lo + (hi - lo) / 2;
+    int cmp = strncmp_P(command, commandTable[mid].command, SERIALCOMMAND_MAXCOMMANDLENGTH);
+    if (cmp == 0) {
+      return mid;
+    } else if (cmp < 0) {
+      hi = mid;
+    } else {
+      lo = mid + 1;
+    }
+  }
+  return -1;
+}
 
 /**
  * This checks the Serial stream for characters, and assembles them into a buffer.
  * When the terminator character (default '\n') is seen, it starts parsing the
  * buffer for a prefix command, and calls handlers setup by addCommand() member
  */
-void SerialCommand::readSerial() {
-  while (Serial.available() > 0) {
+void SerialCommand::readSerial(unsigned int maxChars) {
+  while (maxChars > 0 && Serial.available() > 0) {
+    maxChars--;
     char inChar = Serial.read();   // Read single available character, there may be more waiting
     #ifdef SERIALCOMMAND_DEBUG
       Serial.print(inChar);   // Echo back to serial stream
     #endif
 
     if (inChar == term) {     // Check for the terminator (default '\r') meaning end of command
+      received = micros();
       #ifdef SERIALCOMMAND_DEBUG
         Serial.print("Received: ");
         Serial.println(buffer);
       #endif
 
-      char *command = strtok_r(buffer, delim, &last);   // Search for command at start of buffer
+      command = strtok_r(buffer, delim, &last);   // Search for command at start of buffer
+      if (command != NULL && command[0] == '@') {       // A leading @<tag> token is echoed back in the reply
+        tag = command;
+        command = strtok_r(NULL, delim, &last);
+      }
+      if (command != NULL && command[0] == '~') {       // ~<command>: the sender does not wait for OK
+        unacknowledged = true;
+        command++;
+      }
       if (command != NULL) {
         boolean matched = false;
-        for (int i = 0; i < commandCount; i++) {
+        for (unsigned int i = 0; i < commandCount; i++) {
           #ifdef SERIALCOMMAND_DEBUG
             Serial.print("Comparing [");
             Serial.print(command);
@@ -186,11 +288,18 @@ void SerialCommand::readSerial() {
             #endif
 
             // Execute the stored handler function for the command
-            (*commandList[i].function)();
+            call(i, commandList[i].function);
             matched = true;
             break;
           }
         }
+        if (!matched && commandTable != NULL) {
+          int found = findInTable(command);
+          if (found >= 0) {
+            call(commandCount + found, (void (*)()) pgm_read_ptr(&commandTable[found].function));
+            matched = true;
+          }
+        }
         if (!matched && (defaultHandler != NULL)) {
           (*defaultHandler)(command);
         }
@@ -216,6 +325,9 @@ void SerialCommand::readSerial() {
 void SerialCommand::clearBuffer() {
   buffer[0] = '\0';
   bufPos = 0;
+  tag = NULL;
+  command = NULL;
+  unacknowledged = false;
 }
 
 /**
@@ -225,4 +337,51 @@ void SerialCommand::clearBuffer() {
 char *SerialCommand::next() {
   return strtok_r(NULL, delim, &last);
 }
+
+/**
+ * Retrieve the name of the command registered at a given index.
+ * Returns NULL if the index is out of range.
+ */
+const char *SerialCommand::getCommandName(unsigned int index) {
+  if (index < commandCount) {
+    return commandList[index].command;
+  }
+  index -= commandCount;
+  if (index >= commandTableCount) {
+    return NULL;
+  }
+  strncpy_P(commandName, commandTable[index].command, SERIALCOMMAND_MAXCOMMANDLENGTH);
+  commandName[SERIALCOMMAND_MAXCOMMANDLENGTH] = '\0';
+  return commandName;
+}
+
+/**
+ * Retrieve the sequence tag of the command being processed.
+ * Returns NULL if the command was not tagged.
+ */
+const char *SerialCommand::getTag() {
+  return tag;
+}
+
+/**
+ * Retrieve the name of the command being processed (NULL outside a handler).
+ */
+const char *SerialCommand::getCommand() {
+  return command;
+}
+
+/**
+ * True if the command being processed was prefixed with ~ (no OK is expected,
+ * errors are reported asynchronously).
+ */
+boolean SerialCommand::isUnacknowledged() {
+  return unacknowledged;
+}
+
+/**
+ * Retrieve the time (micros()) at which the command being processed was received.
+ */
+unsigned long SerialCommand::getTime() {
+  return received;
+}
 """
\ No newline at end of file
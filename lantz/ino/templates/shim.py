@@ -0,0 +1,415 @@
+
+# Minimal Arduino core to build a sketch with the host compiler (see lantz.ino.emulate).
+# The serial port is stdin (received bytes) and stdout (sent bytes).
+
+H = r"""
+#ifndef Arduino_h
+#define Arduino_h
+
+#include <ctype.h>
+#include <math.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define ARDUINO_HOST_EMULATION 1
+
+typedef uint8_t byte;
+typedef bool boolean;
+
+#define HIGH 0x1
+#define LOW  0x0
+
+#define INPUT 0x0
+#define OUTPUT 0x1
+#define INPUT_PULLUP 0x2
+
+#define LED_BUILTIN 13
+#define NUM_PINS 70
+
+#define DEC 10
+#define HEX 16
+#define OCT 8
+#define BIN 2
+
+// Program memory is regular memory
+#define PROGMEM
+#define F(string_literal) (string_literal)
+#define PSTR(string_literal) (string_literal)
+#define pgm_read_byte(addr) (*(const uint8_t *)(addr))
+#define pgm_read_word(addr) (*(const uint16_t *)(addr))
+#define pgm_read_dword(addr) (*(const uint32_t *)(addr))
+#define pgm_read_ptr(addr) (*(void * const *)(addr))
+#define strncmp_P strncmp
+#define strncpy_P strncpy
+#define strcmp_P strcmp
+#define strlen_P strlen
+#define memcpy_P memcpy
+
+#define constrain(amt, low, high) ((amt) < (low) ? (low) : ((amt) > (high) ? (high) : (amt)))
+
+// Size of the serial buffers of the AVR core
+#define SERIAL_RX_BUFFER_SIZE 64
+#define SERIAL_TX_BUFFER_SIZE 64
+
+unsigned long millis();
+unsigned long micros();
+void delay(unsigned long ms);
+void delayMicroseconds(unsigned int us);
+
+void pinMode(uint8_t pin, uint8_t mode);
+void digitalWrite(uint8_t pin, uint8_t value);
+int digitalRead(uint8_t pin);
+int analogRead(uint8_t pin);
+void analogWrite(uint8_t pin, int value);
+
+long random(long howbig);
+long random(long howsmall, long howbig);
+void randomSeed(unsigned long seed);
+
+class Print {
+  public:
+    virtual ~Print() {}
+    virtual size_t write(uint8_t c) = 0;
+    virtual size_t write(const uint8_t *buffer, size_t size);
+    virtual int availableForWrite() { return 0; }
+    virtual void flush() {}
+
+    size_t write(const char *str) { return str == NULL ? 0 : write((const uint8_t *)str, strlen(str)); }
+    size_t write(const char *buffer, size_t size) { return write((const uint8_t *)buffer, size); }
+
+    size_t print(const char *str) { return write(str); }
+    size_t print(char c) { return write((uint8_t)c); }
+    size_t print(unsigned char value, int base = DEC) { return print((unsigned long)value, base); }
+    size_t print(int value, int base = DEC) { return print((long)value, base); }
+    size_t print(unsigned int value, int base = DEC) { return print((unsigned long)value, base); }
+    size_t print(long value, int base = DEC);
+    size_t print(unsigned long value, int base = DEC);
+    size_t print(double value, int digits = 2);
+
+    size_t println() { return write("\r\n"); }
+    template <typename T> size_t println(T value) { size_t n = print(value); return n + println(); }
+    template <typename T> size_t println(T value, int format) { size_t n = print(value, format); return n + println(); }
+};
+
+class Stream : public Print {
+  public:
+    virtual int available() = 0;
+    virtual int read() = 0;
+    virtual int peek() = 0;
+};
+
+class HardwareSerial : public Stream {
+  public:
+    void begin(unsigned long baud);
+    void end() {}
+    int available();
+    int read();
+    int peek();
+    int availableForWrite();
+    void flush();
+    size_t write(uint8_t c);
+    size_t write(const uint8_t *buffer, size_t size);
+    using Print::write;
+    operator bool() { return true; }
+};
+
+extern HardwareSerial Serial;
+
+#endif // Arduino_h
+"""
+
+CPP = r"""
+// Host implementation of the Arduino core subset declared in Arduino.h
+//
+// Usage: <sketch> [--uart]
+//   Received bytes are read from stdin and sent bytes written to stdout.
+//   With --uart, bytes are transferred at the baud rate given to Serial.begin as in
+//   the board: received bytes are dropped when the receive buffer (SERIAL_RX_BUFFER_SIZE)
+//   is full and writes block when the transmit buffer (SERIAL_TX_BUFFER_SIZE) is full.
+//   Without it, the sender waits for room in the buffer and writes do not block.
+//   On exit, the number of dropped bytes is written to stderr.
+
+#include "Arduino.h"
+
+#include <algorithm>
+#include <chrono>
+#include <condition_variable>
+#include <csignal>
+#include <mutex>
+#include <thread>
+
+#include <errno.h>
+#include <unistd.h>
+
+HardwareSerial Serial;
+
+static auto start_time = std::chrono::steady_clock::now();
+
+unsigned long micros() {
+  return (unsigned long) std::chrono::duration_cast<std::chrono::microseconds>(
+      std::chrono::steady_clock::now() - start_time).count();
+}
+
+unsigned long millis() {
+  return micros() / 1000;
+}
+
+void delay(unsigned long ms) {
+  std::this_thread::sleep_for(std::chrono::milliseconds(ms));
+}
+
+void delayMicroseconds(unsigned int us) {
+  std::this_thread::sleep_for(std::chrono::microseconds(us));
+}
+
+static int pin_values[NUM_PINS];
+
+void pinMode(uint8_t pin, uint8_t mode) {
+  if (pin < NUM_PINS && mode == INPUT_PULLUP) {
+    pin_values[pin] = HIGH;
+  }
+}
+
+void digitalWrite(uint8_t pin, uint8_t value) {
+  if (pin < NUM_PINS) {
+    pin_values[pin] = value ? HIGH : LOW;
+  }
+}
+
+int digitalRead(uint8_t pin) {
+  return pin < NUM_PINS ? pin_values[pin] : LOW;
+}
+
+int analogRead(uint8_t pin) {
+  return pin < NUM_PINS ? pin_values[pin] : 0;
+}
+
+void analogWrite(uint8_t pin, int value) {
+  if (pin < NUM_PINS) {
+    pin_values[pin] = value;
+  }
+}
+
+long random(long howbig) {
+  return howbig > 0 ? rand() % howbig : 0;
+}
+
+long random(long howsmall, long howbig) {
+  return howsmall >= howbig ? howsmall : howsmall + random(howbig - howsmall);
+}
+
+void randomSeed(unsigned long seed) {
+  srand(seed);
+}
+
+//// Print
+
+size_t Print::write(const uint8_t *buffer, size_t size) {
+  size_t n = 0;
+  while (size--) {
+    n += write(*buffer++);
+  }
+  return n;
+}
+
+size_t Print::print(long value, int base) {
+  if (base == DEC) {
+    char buf[24];
+    snprintf(buf, sizeof(buf), "%ld", value);
+    return write(buf);
+  }
+  return print((unsigned long) value, base);
+}
+
+size_t Print::print(unsigned long value, int base) {
+  char buf[8 * sizeof(long) + 1];
+  char *str = &buf[sizeof(buf) - 1];
+  *str = '\0';
+  if (base < 2) {
+    base = 10;
+  }
+  do {
+    unsigned long digit = value % base;
+    value /= base;
+    *--str = digit < 10 ? digit + '0' : digit + 'A' - 10;
+  } while (value);
+  return write(str);
+}
+
+size_t Print::print(double value, int digits) {
+  // Same special values as the AVR core
+  if (isnan(value)) return print("nan");
+  if (isinf(value)) return print("inf");
+  if (value > 4294967040.0) return print("ovf");
+  if (value < -4294967040.0) return print("ovf");
+
+  char buf[48];
+  snprintf(buf, sizeof(buf), "%.*f", digits, value);
+  return write(buf);
+}
+
+//// Serial
+
+static std::mutex rx_mutex;
+static std::condition_variable rx_room;
+static uint8_t rx_buffer[SERIAL_RX_BUFFER_SIZE];
+static unsigned int rx_head = 0;
+static unsigned int rx_count = 0;
+static unsigned long rx_dropped = 0;
+static unsigned long baud_rate = 0;
+static bool uart_mode = false;
+
+static void receive_loop() {
+  uint8_t chunk[256];
+  auto next = std::chrono::steady_clock::now();
+  for (;;) {
+    ssize_t n = ::read(STDIN_FILENO, chunk, uart_mode ? 1 : sizeof(chunk));
+    if (n < 0 && errno == EINTR) {
+      continue;
+    }
+    if (n <= 0) {
+      // The host closed the port.
+      std::raise(SIGTERM);
+      return;
+    }
+    if (uart_mode && baud_rate > 0) {
+      // 10 bits per byte (start, 8 data, stop)
+      next = std::max(next + std::chrono::microseconds(10000000UL / baud_rate), std::chrono::steady_clock::now());
+      std::this_thread::sleep_until(next);
+    }
+    std::unique_lock<std::mutex> lock(rx_mutex);
+    for (ssize_t i = 0; i < n; i++) {
+      if (rx_count == SERIAL_RX_BUFFER_SIZE) {
+        if (uart_mode) {
+          rx_dropped++;
+          continue;
+        }
+        rx_room.wait(lock, [] { return rx_count < SERIAL_RX_BUFFER_SIZE; });
+      }
+      rx_buffer[(rx_head + rx_count) % SERIAL_RX_BUFFER_SIZE] = chunk[i];
+      rx_count++;
+    }
+  }
+}
+
+void HardwareSerial::begin(unsigned long baud) {
+  baud_rate = baud;
+}
+
+int HardwareSerial::available() {
+  std::lock_guard<std::mutex> lock(rx_mutex);
+  return rx_count;
+}
+
+int HardwareSerial::peek() {
+  std::lock_guard<std::mutex> lock(rx_mutex);
+  return rx_count ? rx_buffer[rx_head] : -1;
+}
+
+int HardwareSerial::read() {
+  std::lock_guard<std::mutex> lock(rx_mutex);
+  if (rx_count == 0) {
+    return -1;
+  }
+  uint8_t c = rx_buffer[rx_head];
+  rx_head = (rx_head + 1) % SERIAL_RX_BUFFER_SIZE;
+  rx_count--;
+  rx_room.notify_one();
+  return c;
+}
+
+// In --uart mode, time at which the transmit buffer is empty.
+static std::chrono::steady_clock::time_point tx_empty;
+
+static std::chrono::microseconds byte_time() {
+  return std::chrono::microseconds(10000000UL / baud_rate);
+}
+
+static int tx_queued() {
+  if (!uart_mode || baud_rate == 0) {
+    return 0;
+  }
+  auto pending = tx_empty - std::chrono::steady_clock::now();
+  return pending.count() > 0 ? (int) (pending / byte_time()) + 1 : 0;
+}
+
+int HardwareSerial::availableForWrite() {
+  return std::max(SERIAL_TX_BUFFER_SIZE - 1 - tx_queued(), 0);
+}
+
+void HardwareSerial::flush() {
+  if (uart_mode && baud_rate > 0) {
+    std::this_thread::sleep_until(tx_empty);
+  }
+}
+
+size_t HardwareSerial::write(uint8_t c) {
+  return write(&c, 1);
+}
+
+size_t HardwareSerial::write(const uint8_t *buffer, size_t size) {
+  if (uart_mode && baud_rate > 0) {
+    // Block while the transmit buffer is full, as the AVR core.
+    for (size_t i = 0; i < size; i++) {
+      auto now = std::chrono::steady_clock::now();
+      if (tx_queued() >= SERIAL_TX_BUFFER_SIZE - 1) {
+        std::this_thread::sleep_until(tx_empty - byte_time() * (SERIAL_TX_BUFFER_SIZE - 2));
+        now = std::chrono::steady_clock::now();
+      }
+      tx_empty = std::max(tx_empty, now) + byte_time();
+    }
+  }
+
+  size_t sent = 0;
+  while (sent < size) {
+    ssize_t n = ::write(STDOUT_FILENO, buffer + sent, size - sent);
+    if (n < 0) {
+      if (errno == EINTR) {
+        continue;
+      }
+      break;
+    }
+    sent += n;
+  }
+  return sent;
+}
+
+//// Main
+
+void setup();
+void loop();
+
+static volatile std::sig_atomic_t stop_requested = 0;
+
+static void request_stop(int) {
+  stop_requested = 1;
+}
+
+int main(int argc, char **argv) {
+  for (int i = 1; i < argc; i++) {
+    if (strcmp(argv[i], "--uart") == 0) {
+      uart_mode = true;
+    }
+  }
+
+  std::signal(SIGTERM, request_stop);
+  std::signal(SIGINT, request_stop);
+
+  setup();
+
+  std::thread(receive_loop).detach();
+
+  while (!stop_requested) {
+    loop();
+    if (Serial.available() == 0) {
+      // Idle: do not spin a host core.
+      std::this_thread::sleep_for(std::chrono::microseconds(50));
+    }
+  }
+
+  fprintf(stderr, "rx_dropped %lu\n", rx_dropped);
+  return 0;
+}
+"""
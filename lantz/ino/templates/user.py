@@ -10,6 +10,7 @@ void user_loop();
 CPP = r"""
 
 #include "inodriver_user.h"
+#include "inodriver_bridge.h"
 
 void user_setup() {
 }
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.ino.testsuite
+    ~~~~~~~~~~~~~~~~~~~
+
+    Behavior tests of lantz.ino.
+
+    Most tests talk to the generated firmware built for the host and run
+    behind a pseudo terminal (lantz.ino.emulate); they are skipped if no C++
+    compiler is found. Faults that the firmware does not produce (lost or
+    stale replies) are injected with a board emulated in Python (see helpers).
+
+        python -m unittest lantz.ino.testsuite
+
+    :copyright: 2018 by The Lantz Authors
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+import unittest
+
+
+def testsuite():
+    """A testsuite that has all the lantz.ino tests.
+    """
+    return unittest.defaultTestLoader.discover(os.path.dirname(__file__), top_level_dir=_top_level())
+
+
+def load_tests(loader, tests, pattern):
+    # unittest protocol, so that the package can be given to python -m unittest.
+    return testsuite()
+
+
+def _top_level():
+    # The folder containing the lantz package.
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+
+def main():
+    """Runs the testsuite as command line application.
+    """
+    try:
+        unittest.main(module=__name__, defaultTest='testsuite')
+    except Exception as e:
+        print('Error: %s' % e)
+
+
+if __name__ == '__main__':
+    main()
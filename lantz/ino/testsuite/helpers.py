@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.ino.testsuite.helpers
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Boards for the tests: the generated sketch built for the host
+    (EmulatorTestCase) and a board emulated in Python (FakeBoard), to
+    inject faults that the firmware does not produce.
+
+    :copyright: 2018 by The Lantz Authors
+    :license: BSD, see LICENSE for more details.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from lantz.ino import emulate
+from lantz.ino.templates import ino, serialcommand
+
+
+def write_sketch(cls, folder, user_code=None, user_prelude=''):
+    """Generate the sketch of a driver class, with the given user functions.
+
+    :param user_code: function name (e.g. 'get_TEMP') -> body replacing the
+                      generated one in inodriver_user.cpp.
+    :param user_prelude: code inserted before the user functions (e.g. variables).
+    """
+    cls.ino_bridge_write(folder)
+    cls.ino_user_write(folder, overwrite=True)
+
+    path = os.path.join(folder, 'inodriver_user.cpp')
+    with open(path, encoding='utf-8') as fi:
+        content = fi.read()
+
+    for name, body in (user_code or {}).items():
+        content, count = re.subn(r'(\b%s\([^)]*\) \{\n)(.*?)(\n\};)' % re.escape(name),
+                                 lambda match: match.group(1) + '  ' + body + match.group(3),
+                                 content, flags=re.DOTALL)
+        if count != 1:
+            raise ValueError('%s not found in the user file of %s' % (name, cls.__qualname__))
+
+    content = content.replace('#include "inodriver_bridge.h"\n', '#include "inodriver_bridge.h"\n' + user_prelude + '\n')
+
+    with open(path, 'w', encoding='utf-8') as fo:
+        fo.write(content)
+
+    for filename, text in (('%s.ino' % os.path.basename(folder), ino.CPP),
+                           ('SerialCommand.cpp', serialcommand.CPP),
+                           ('SerialCommand.h', serialcommand.H)):
+        with open(os.path.join(folder, filename), 'w', encoding='utf-8') as fo:
+            fo.write(text)
+
+
+class EmulatorTestCase(unittest.TestCase):
+    """Tests against the sketch of driver_class built for the host.
+
+    The sketch is built and started once for the test case.
+    """
+
+    #: INODriver subclass (defined at module level, so that it can be hashed).
+    driver_class = None
+
+    #: See write_sketch.
+    user_code = {}
+    user_prelude = ''
+
+    #: Run the emulator in uart mode (see lantz.ino.emulate.Emulator).
+    uart = False
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            emulate.check_compiler()
+        except FileNotFoundError as e:
+            raise unittest.SkipTest(str(e))
+
+        cls.folder = tempfile.mkdtemp(prefix='lantz-ino-test-')
+        sketch = os.path.join(cls.folder, 'sketch')
+        os.makedirs(sketch)
+        write_sketch(cls.driver_class, sketch, cls.user_code, cls.user_prelude)
+        cls.executable = emulate.build(sketch)
+        cls.emulator = emulate.Emulator(cls.executable, uart=cls.uart).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.emulator.stop()
+        shutil.rmtree(cls.folder, ignore_errors=True)
+
+    def connect(self, driver_class=None, **kwargs):
+        """Initialized driver connected to the emulator, finalized at the end of the test.
+
+        The sketch keeps running between connections (reset=False skips the settle time).
+        """
+        inst = (driver_class or self.driver_class).via_serial(self.emulator.port, reset=False, **kwargs)
+        inst.initialize()
+        self.addCleanup(inst.finalize)
+        return inst
+
+
+class FakeBoard:
+    """Board emulated in Python behind a pseudo terminal (POSIX only).
+
+    Answers INFO?, SYNC?, INITIALIZE, FINALIZE and the getters and setters of
+    the given values, echoing sequence tags. Everything else is an error.
+
+    :param class_name: name of the driver class reported by INFO?.
+    :param values: command (with the key for dictfeats, e.g. 'REL 1') -> value.
+    """
+
+    def __init__(self, class_name, values=None):
+        import pty
+        import tty
+
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+
+        #: Name of the serial port.
+        self.port = os.ttyname(self.slave)
+
+        self.class_name = class_name
+        self.values = dict(values or {})
+
+        #: Received commands.
+        self.log = []
+
+        #: Number of commands (other than SYNC?) whose reply is lost.
+        self.drop = 0
+
+        #: If True, nothing is answered.
+        self.silent = False
+
+        #: Time (in seconds) taken to process each command.
+        self.delay = 0
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+    def send(self, line):
+        """Send a line to the host (e.g. a stale reply).
+        """
+        os.write(self.master, (line + '\r\n').encode('ascii'))
+
+    def handle(self, command, args):
+        """Reply to a command (without tag).
+        """
+        if command == 'INFO?':
+            return '%s,Jan  1 2019 00:00:00' % self.class_name
+        if command in ('INITIALIZE', 'FINALIZE'):
+            return 'OK'
+        if command == 'SYNC?' and args:
+            return 'SYNC ' + args[0]
+        if command.endswith('?'):
+            key = ' '.join([command[:-1]] + args)
+            if key in self.values:
+                return str(self.values[key])
+        elif args:
+            key = ' '.join([command] + args[:-1])
+            if key in self.values:
+                self.values[key] = args[-1]
+                return 'OK'
+        return 'ERROR: Unknown command'
+
+    def _run(self):
+        buffer = b''
+        while True:
+            try:
+                buffer += os.read(self.master, 1024)
+            except OSError:
+                return
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                self._receive(line.decode('ascii').strip())
+
+    def _receive(self, line):
+        parts = line.split()
+        if not parts:
+            return
+        self.log.append(line)
+
+        tag = parts.pop(0) if parts[0].startswith('@') else None
+        if not parts:
+            return
+
+        if self.delay:
+            time.sleep(self.delay)
+
+        if self.silent:
+            return
+
+        if self.drop and parts[0] != 'SYNC?':
+            self.drop -= 1
+            return
+
+        reply = self.handle(parts[0], parts[1:])
+        self.send(reply if tag is None else '%s %s' % (tag, reply))
+
+
+class FakeBoardTestCase(unittest.TestCase):
+    """Tests against a FakeBoard, created for each test.
+    """
+
+    #: INODriver subclass (defined at module level, so that it can be hashed).
+    driver_class = None
+
+    #: Initial values of the FakeBoard.
+    values = {}
+
+    def setUp(self):
+        if os.name != 'posix':
+            raise unittest.SkipTest('FakeBoard requires a pseudo terminal.')
+
+        self.board = FakeBoard(self.driver_class.__qualname__, self.values)
+        self.addCleanup(self.board.close)
+
+    def connect(self, driver_class=None, timeout=200, **kwargs):
+        """Initialized driver connected to the board, finalized at the end of the test.
+
+        :param timeout: timeout of the resource in milliseconds.
+        """
+        inst = (driver_class or self.driver_class).via_serial(self.board.port, reset=False, **kwargs)
+        inst.initialize()
+        inst.resource.timeout = timeout
+        self.addCleanup(inst.finalize)
+        return inst
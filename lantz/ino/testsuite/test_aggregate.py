@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+
+from lantz.core import Q_
+from lantz.ino import INODriver, AggregateFeat, IntFeat, RingBuffer
+
+from lantz.ino.testsuite.helpers import EmulatorTestCase
+
+
+class AggregateDriver(INODriver):
+
+    signal = AggregateFeat('SIG', units='V')
+    count = IntFeat('CNT')
+
+
+class TimedAggregateDriver(AggregateDriver):
+    INO_SEQUENCE_TAGS = True
+    INO_TIMESTAMPS = True
+
+
+class DecodeTest(unittest.TestCase):
+
+    def test_decode(self):
+        value = AggregateDriver.signal.ino_decode('1.5,-1.0,4.0,2.0,10')
+        self.assertEqual(value.mean, Q_(1.5, 'V'))
+        self.assertEqual(value.max, Q_(4.0, 'V'))
+        self.assertEqual(value.count, 10)
+
+        # Values beyond the range printed by the board.
+        self.assertEqual(AggregateDriver.signal.ino_decode('ovf,0,ovf,ovf,3').max.magnitude, float('inf'))
+
+        with self.assertRaises(ValueError):
+            AggregateDriver.signal.ino_decode('1.5,3')
+
+    def test_commands(self):
+        commands = dict(AggregateDriver.ino_commands())
+        self.assertIn('SIG?', commands)
+        self.assertIn('SIG!', commands)
+        self.assertNotIn('SIG', commands)
+
+
+class AggregateTest(EmulatorTestCase):
+
+    driver_class = AggregateDriver
+    user_prelude = 'long samples = 0;'
+    user_code = {'get_SIG': 'return samples++ % 10;',
+                 'get_CNT': 'return 3;'}
+
+    def test_get(self):
+        inst = self.connect()
+        inst.signal
+        time.sleep(0.05)
+
+        value = inst.signal
+        self.assertGreater(value.count, 10)
+        self.assertEqual(value.min, Q_(0, 'V'))
+        self.assertEqual(value.max, Q_(9, 'V'))
+        self.assertAlmostEqual(value.mean.magnitude, 4.5, delta=0.5)
+        self.assertAlmostEqual(value.rms.magnitude, 5.3, delta=0.5)
+
+    def test_push(self):
+        inst = self.connect()
+        pushes = []
+        buffer = RingBuffer(100)
+
+        inst.ino_push('signal', 0.05, callback=lambda timestamp, value: pushes.append((timestamp, value)),
+                      buffer=buffer)
+        self.listen(inst, 0.5)
+        inst.ino_push('signal', 0)
+
+        # Replies are still read between the pushes.
+        self.assertEqual(inst.count, 3)
+
+        received = len(pushes)
+        self.assertGreaterEqual(received, 6)
+        self.assertEqual(len(buffer), received)
+        self.assertEqual(buffer.values()[-1].max, Q_(9, 'V'))
+
+        timestamps = [timestamp for timestamp, _ in pushes]
+        intervals = [b - a for a, b in zip(timestamps, timestamps[1:])]
+        self.assertAlmostEqual(sum(intervals) / len(intervals), 0.05, delta=0.02)
+
+        # Stopped.
+        self.listen(inst, 0.2)
+        self.assertEqual(len(pushes), received)
+
+    def test_errors(self):
+        inst = self.connect()
+        with self.assertRaisesRegex(ValueError, 'no pushable feat'):
+            inst.ino_push('count', 1)
+        with self.assertRaisesRegex(ValueError, 'at least 1 ms'):
+            inst.ino_push('signal', 0.0001)
+
+    def listen(self, inst, duration):
+        inst.ino_listen(duration)
+
+
+class TimedAggregateTest(AggregateTest):
+
+    driver_class = TimedAggregateDriver
+
+    def listen(self, inst, duration):
+        # The reader thread delivers the pushes.
+        time.sleep(duration)
+
+    def test_timestamps(self):
+        inst = self.connect()
+        buffer = RingBuffer(100)
+
+        inst.ino_push('signal', 0.02, buffer=buffer)
+        time.sleep(0.3)
+        inst.ino_push('signal', 0)
+
+        # Stamped by the board clock: sent before they were read.
+        timestamp, _ = buffer.last()
+        self.assertLess(abs(time.monotonic() - timestamp), 0.35)
+        self.assertGreater(len(buffer), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from lantz.ino import INODriver, IntFeat, QuantityFeat
+
+from lantz.ino.testsuite.helpers import EmulatorTestCase
+
+COMMANDS = 100
+
+
+class BudgetDriver(INODriver):
+    INO_STATS = True
+    INO_STATE = True
+    INO_RX_BUDGET = 16
+    INO_TIME_BUDGET = 2000
+    INO_TX_QUEUE = 128
+
+    temperature = QuantityFeat('TEMP', units='degC', setter=False)
+    count = IntFeat('CNT')
+
+
+class BudgetTest(EmulatorTestCase):
+
+    driver_class = BudgetDriver
+    user_prelude = 'int count = 0;'
+    user_code = {'get_TEMP': 'return 21.5;',
+                 'get_CNT': 'return count;',
+                 'set_CNT': 'count = value;\n  return 0;'}
+
+    # Receive at the baud rate, with the buffers of the board.
+    uart = True
+
+    def test_flood(self):
+        inst = self.connect()
+        inst.ino_stats(reset=True)
+
+        inst.resource.write_raw(b'TEMP?\n' * COMMANDS)
+        replies = [inst.read() for _ in range(COMMANDS)]
+        self.assertEqual(replies, ['21.50'] * COMMANDS)
+
+        stats = inst.ino_stats()
+        self.assertEqual(stats.handlers['TEMP?'].count, COMMANDS)
+
+        # Without the budgets, the loop blocks for hundreds of milliseconds
+        # while the replies are sent at the baud rate.
+        self.assertLess(stats.loop_max_us, 50000)
+
+    def test_long_replies(self):
+        inst = self.connect()
+        inst.count = 12345
+        inst.temperature
+
+        # Replies longer than the free room in the queue are deferred, not truncated.
+        for _ in range(10):
+            snapshot = inst.snapshot()
+            self.assertEqual(snapshot['count'], 12345)
+            self.assertEqual(snapshot['temperature'].magnitude, 21.5)
+            self.assertEqual(set(inst.ino_stats().handlers) & {'CNT', 'TEMP?'}, {'CNT', 'TEMP?'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import random
+import time
+import unittest
+
+from lantz.ino import INODriver, IntFeat
+from lantz.ino.clock import ClockEstimator, WRAP
+
+from lantz.ino.testsuite.helpers import EmulatorTestCase
+
+
+class TimeDriver(INODriver):
+    INO_TIMESTAMPS = True
+
+    count = IntFeat('CNT')
+
+
+class TimeTagDriver(TimeDriver):
+    INO_SEQUENCE_TAGS = True
+
+
+class UntimedDriver(INODriver):
+
+    count = IntFeat('CNT')
+
+
+class EstimatorTest(unittest.TestCase):
+
+    def test_unwrap(self):
+        clock = ClockEstimator()
+        self.assertEqual(clock.unwrap(WRAP - 1000), 0)
+        self.assertEqual(clock.unwrap(500), 1500e-6)
+        self.assertEqual(clock.unwrap(1500), 2500e-6)
+
+        # A late reply stamped before the last one.
+        self.assertEqual(clock.unwrap(1000), 2000e-6)
+        self.assertEqual(clock.unwrap(2500), 3500e-6)
+
+    def test_no_samples(self):
+        clock = ClockEstimator()
+        self.assertIsNone(clock.latency)
+        with self.assertRaises(ValueError):
+            clock.offset
+
+    def test_fit(self):
+        clock = ClockEstimator(window=200)
+        rng = random.Random(0)
+        drift, offset = 50e-6, 1000.0
+
+        for ndx in range(200):
+            board = ndx * 0.02
+            # The board time is at the middle of the round trips with the shortest latency.
+            rtt = 0.002 if ndx % 4 == 0 else rng.uniform(0.004, 0.05)
+            middle = offset + board * (1 + drift)
+            before = rng.uniform(0, rtt) if ndx % 4 else rtt / 2
+            clock.add(middle - before, middle - before + rtt, round(board * 1e6) % WRAP)
+
+        self.assertAlmostEqual(clock.drift, drift, delta=5e-6)
+        self.assertAlmostEqual(clock.to_host(2.0), offset + 2.0 * (1 + drift), delta=1e-4)
+        self.assertAlmostEqual(clock.latency, 0.001)
+        self.assertGreater(clock.rtt_median, clock.rtt_min)
+
+        clock.reset()
+        self.assertEqual(len(clock), 0)
+
+    def test_short_span(self):
+        clock = ClockEstimator()
+        clock.add(10.0, 10.002, 0)
+        clock.add(10.1, 10.102, 100000)
+
+        # Not enough time to measure the drift.
+        self.assertEqual(clock.drift, 0)
+        self.assertAlmostEqual(clock.offset, 10.001)
+
+
+class TimestampTest(EmulatorTestCase):
+
+    driver_class = TimeDriver
+
+    def check(self, inst):
+        self.assertGreater(len(inst.ino_clock), 0)
+
+        t0 = time.monotonic()
+        inst.count
+        stamp = inst.ino_timestamp()
+        t1 = time.monotonic()
+
+        # Within the round trip, allowing for the error of the estimate.
+        margin = inst.ino_clock.rtt_median
+        self.assertLessEqual(t0 - margin, stamp)
+        self.assertLessEqual(stamp, t1 + margin)
+
+    def test_timestamp(self):
+        self.check(self.connect())
+
+    def test_not_generated(self):
+        with self.assertRaises(ValueError):
+            UntimedDriver('ASRL1::INSTR').ino_sync_clock()
+
+
+class TaggedTimestampTest(TimestampTest):
+
+    driver_class = TimeTagDriver
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from pint.errors import DimensionalityError
+
+from lantz.core import Q_
+from lantz.ino import codec
+
+
+class DecoderTest(unittest.TestCase):
+
+    def test_nothing_to_do(self):
+        self.assertIsNone(codec.compile_decoder())
+
+    def test_units(self):
+        self.assertEqual(codec.compile_decoder((float, ), units='V')('2.5'), Q_(2.5, 'V'))
+        self.assertEqual(codec.compile_decoder(units='V')(Q_(2500, 'mV')), Q_(2.5, 'V'))
+
+    def test_values(self):
+        decode = codec.compile_decoder(values={True: '1', False: '0'})
+        self.assertIs(decode('1'), True)
+        with self.assertRaises(ValueError):
+            decode('2')
+
+        decode = codec.compile_decoder(values={'a', 'b'})
+        self.assertEqual(decode('a'), 'a')
+        with self.assertRaises(ValueError):
+            decode('c')
+
+
+class EncoderTest(unittest.TestCase):
+
+    def test_units(self):
+        encode = codec.compile_encoder(units='V')
+        self.assertEqual(encode(Q_(2.5, 'V')), 2.5)
+        self.assertEqual(encode(Q_(2500, 'mV')), 2.5)
+        # The same error as the lantz processors.
+        with self.assertRaises(DimensionalityError):
+            encode(Q_(1, 's'))
+
+    def test_limits(self):
+        encode = codec.compile_encoder(limits=(0, 10), set_funcs=(int, ))
+        self.assertEqual(encode(3.7), 3)
+        with self.assertRaises(ValueError):
+            encode(11)
+
+    def test_values(self):
+        encode = codec.compile_encoder(values={True: '1', False: '0'})
+        self.assertEqual(encode(False), '0')
+        with self.assertRaises(ValueError):
+            encode('x')
+
+
+class CacheTest(unittest.TestCase):
+
+    def test_shared(self):
+        self.assertIs(codec.compile_encoder(units='V', limits=(0, 5)),
+                      codec.compile_encoder(units='V', limits=(0, 5)))
+        self.assertIsNot(codec.compile_encoder(units='V', limits=(0, 5)),
+                         codec.compile_encoder(units='V', limits=(0, 6)))
+
+    def test_types(self):
+        # Equal values of different types must not share a function.
+        as_int = codec.compile_encoder(values={1: 'x'})
+        as_bool = codec.compile_encoder(values={True: 'x'})
+        self.assertIsNot(as_int, as_bool)
+        self.assertEqual(as_bool(True), 'x')
+
+        self.assertIsNot(codec.compile_decoder(get_funcs=(float, ), units='V'),
+                         codec.compile_decoder(get_funcs=(int, ), units='V'))
+
+    def test_mutation(self):
+        values = {True: '1', False: '0'}
+        encode = codec.compile_encoder(values=values)
+        values[True] = '2'
+        self.assertEqual(encode(True), '1')
+
+    def test_freeze(self):
+        self.assertNotEqual(codec._freeze(1), codec._freeze(True))
+        self.assertNotEqual(codec._freeze([1]), codec._freeze({1}))
+        with self.assertRaises(TypeError):
+            codec._freeze(object())
+
+
+class FormatTest(unittest.TestCase):
+
+    def test_format(self):
+        self.assertEqual(codec.compile_format('VOLT {key} {value:.2f}', 'key', 'value')(1, 2.5), 'VOLT 1 2.50')
+        self.assertEqual(codec.compile_format('CNT {}', 'value')(3), 'CNT 3')
+        self.assertEqual(codec.compile_format('A{{B}} {}', 'value')(3), 'A{B} 3')
+
+        with self.assertRaises(ValueError):
+            codec.compile_format('VOLT {other}', 'key')
+
+    def test_field(self):
+        self.assertEqual(codec.compile_field('VOLT {key} {value:.2f}', 'value')(2.5), '2.50')
+        with self.assertRaises(ValueError):
+            codec.compile_field('VOLT {key}', 'value')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from lantz.ino import INODriver, IntFeat
+
+from lantz.ino.testsuite.helpers import EmulatorTestCase
+
+FEATS = 300
+
+
+class ManyDriver(INODriver):
+    INO_STATS = True
+
+    locals().update({'feat%03d' % ndx: IntFeat('F%03d' % ndx) for ndx in range(FEATS)})
+
+
+class ListDriver(INODriver):
+    INO_COMMAND_TABLE = False
+
+    count = IntFeat('CNT')
+
+
+class DuplicatedDriver(INODriver):
+
+    count = IntFeat('CNT')
+    other = IntFeat('CNT')
+
+
+class CollidingDriver(INODriver):
+
+    first = IntFeat('THRESHOLD1', getter=False)
+    second = IntFeat('THRESHOLD2', getter=False)
+
+
+class GenerateTest(unittest.TestCase):
+
+    def bridge(self, cls):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        cls.ino_bridge_write(folder)
+        with open(os.path.join(folder, 'inodriver_bridge.cpp'), encoding='utf-8') as fi:
+            return fi.read()
+
+    def test_table(self):
+        self.assertGreater(len(ManyDriver.ino_commands()), 255)
+        self.assertIn('setCommandTable', self.bridge(ManyDriver))
+        self.assertNotIn('setCommandTable', self.bridge(ListDriver))
+
+    def test_validate(self):
+        ManyDriver.ino_validate()
+
+        with self.assertRaisesRegex(ValueError, 'defined twice'):
+            DuplicatedDriver.ino_validate()
+
+        with self.assertRaisesRegex(ValueError, 'indistinguishable'):
+            CollidingDriver.ino_validate()
+
+
+class CommandTableTest(EmulatorTestCase):
+
+    driver_class = ManyDriver
+    user_prelude = 'int values[%d];' % FEATS
+    user_code = dict([('get_F%03d' % ndx, 'return %d + values[%d];' % (ndx, ndx)) for ndx in range(FEATS)] +
+                     [('set_F%03d' % ndx, 'values[%d] = value;\n  return 0;' % ndx) for ndx in range(FEATS)])
+
+    def test_all_commands(self):
+        inst = self.connect()
+        for ndx in range(FEATS):
+            self.assertEqual(getattr(inst, 'feat%03d' % ndx), ndx)
+
+        inst.feat299 = 1
+        self.assertEqual(inst.feat299, 300)
+        self.assertEqual(inst.feat000, 0)
+
+    def test_unknown(self):
+        inst = self.connect()
+        for command in ('F300?', 'A?', 'ZZZ', 'F1'):
+            self.assertTrue(inst.query(command).startswith('ERROR'), command)
+
+    def test_stats(self):
+        inst = self.connect()
+        inst.ino_stats(reset=True)
+        inst.feat000
+        inst.feat299 = 0
+
+        handlers = inst.ino_stats().handlers
+        self.assertEqual(handlers['F000?'].count, 1)
+        self.assertEqual(handlers['F299'].count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from lantz.core.messagebased import MessageBasedDriver
+from lantz.ino import INODriver, IntFeat, emulate
+
+from lantz.ino.testsuite.helpers import EmulatorTestCase, write_sketch
+
+
+class EmulatedDriver(INODriver):
+
+    count = IntFeat('CNT')
+
+
+class BuildTest(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            emulate.check_compiler()
+        except FileNotFoundError as e:
+            raise unittest.SkipTest(str(e))
+
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def test_missing_files(self):
+        with self.assertRaises(FileNotFoundError):
+            emulate.build(self.folder)
+
+    def test_compiler_error(self):
+        write_sketch(EmulatedDriver, self.folder, {'get_CNT': 'return undeclared_variable;'})
+        with self.assertRaisesRegex(emulate.BuildError, 'undeclared_variable'):
+            emulate.build(self.folder)
+
+    def test_up_to_date(self):
+        write_sketch(EmulatedDriver, self.folder)
+        executable = emulate.build(self.folder)
+        built = os.path.getmtime(executable)
+
+        time.sleep(0.01)
+        self.assertEqual(emulate.build(self.folder), executable)
+        self.assertEqual(os.path.getmtime(executable), built)
+
+        emulate.build(self.folder, force=True)
+        self.assertGreater(os.path.getmtime(executable), built)
+
+
+class EmulatorTest(EmulatorTestCase):
+
+    driver_class = EmulatedDriver
+    user_prelude = 'int count = 0;'
+    user_code = {'get_CNT': 'return count;',
+                 'set_CNT': 'count = value;\n  return 0;'}
+
+    def test_info(self):
+        inst = self.connect()
+        self.assertEqual(inst.query('INFO?').partition(',')[0], 'EmulatedDriver')
+
+    def test_soak(self):
+        inst = self.connect()
+        inst.count = 42
+
+        queries, errors, rate = emulate.soak(inst, 0.3, 'CNT?', lambda reply: reply == '42')
+        self.assertGreater(queries, 10)
+        self.assertEqual(errors, 0)
+
+    def test_long_line(self):
+        inst = self.connect()
+        self.assertTrue(inst.query('X' * 100).startswith('ERROR'))
+        inst.count = 7
+        self.assertEqual(inst.count, 7)
+
+    def test_overflow(self):
+        with emulate.Emulator(self.executable, uart=True) as emulator:
+            inst = EmulatedDriver.via_serial(emulator.port)
+            # Open the port without the settle time and INITIALIZE of INODriver.
+            MessageBasedDriver.initialize(inst)
+            try:
+                # The replies are longer than the commands, so the board
+                # falls behind and its receive buffer overflows.
+                data = b'INFO?\n' * 200
+                inst.resource.write_raw(data)
+                time.sleep(len(data) * 10 / 9600 + 0.5)
+            finally:
+                MessageBasedDriver.finalize(inst)
+
+        self.assertFalse(emulator.running)
+        self.assertGreater(emulator.dropped, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
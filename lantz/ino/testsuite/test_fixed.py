@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from lantz.ino import INODriver, QuantityFeat, QuantityDictFeat
+
+from lantz.ino.testsuite.helpers import EmulatorTestCase
+
+
+class FixedDriver(INODriver):
+
+    temperature = QuantityFeat('TEMP', units='degC', fixed_point=(0.01, 16))
+    volts = QuantityDictFeat('VOLT', keys=[1, 2], units='V', fixed_point=(0.001, 32), limits=(0, 5))
+    gain = QuantityFeat('GAIN', fixed_point=(0.3, 8))
+
+
+class LimitedDriver(INODriver):
+
+    offset = QuantityFeat('OFF', fixed_point=(0.01, 16), limits=(-10, 327.67))
+    level = QuantityFeat('LVL', fixed_point=(0.01, 16), limits=(300, ))
+
+
+class OptionTest(unittest.TestCase):
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            QuantityFeat('X', fixed_point=(0.01, 12))
+        with self.assertRaises(ValueError):
+            QuantityFeat('X', fixed_point=(0, 16))
+
+    def test_datatype(self):
+        self.assertEqual(FixedDriver.temperature.INO_DATATYPE, 'I')
+        self.assertEqual(FixedDriver.volts.INO_DATATYPE, 'L')
+
+    def test_representable_range(self):
+        self.assertEqual(FixedDriver.temperature.limits, (-327.68, 327.67))
+
+    def test_limits(self):
+        self.assertEqual(LimitedDriver.offset.limits, (-10, 327.67))
+        self.assertEqual(LimitedDriver.level.limits, (300, ))
+
+        # Sending 100000 to an int16 would wrap around.
+        with self.assertRaisesRegex(ValueError, '16 bits'):
+            QuantityFeat('X', fixed_point=(0.01, 16), limits=(0, 1000))
+        with self.assertRaises(ValueError):
+            QuantityFeat('X', fixed_point=(1, 8), limits=(-129, 0, 1))
+        with self.assertRaises(ValueError):
+            QuantityDictFeat('X', keys=[1], fixed_point=(0.001, 32), limits=(0, 3e6))
+
+
+class FixedPointTest(EmulatorTestCase):
+
+    driver_class = FixedDriver
+    user_prelude = 'int temperature = 0;\nlong volts[3];\nint gain = 0;'
+    user_code = {'get_TEMP': 'return temperature;',
+                 'set_TEMP': 'temperature = value;\n  return 0;',
+                 'get_VOLT': 'return volts[key];',
+                 'set_VOLT': 'volts[key] = value;\n  return 0;',
+                 'get_GAIN': 'return gain;',
+                 'set_GAIN': 'gain = value;\n  return 0;'}
+
+    def test_feat(self):
+        inst = self.connect()
+        inst.temperature = 30.126
+
+        self.assertEqual(inst.query('TEMP?'), '3013')
+        self.assertEqual(inst.temperature.magnitude, 30.13)
+
+        inst.temperature = -300
+        self.assertEqual(inst.temperature.magnitude, -300)
+
+    def test_dictfeat(self):
+        inst = self.connect()
+        inst.volts[1] = 3.3
+        inst.volts[2] = 0.0004
+
+        self.assertEqual(inst.query('VOLT? 1'), '3300')
+        self.assertEqual(inst.volts[1].magnitude, 3.3)
+        self.assertEqual(inst.volts[2].magnitude, 0)
+
+    def test_scale(self):
+        inst = self.connect()
+        inst.gain = 3
+
+        self.assertEqual(inst.query('GAIN?'), '10')
+        self.assertAlmostEqual(inst.gain, 3)
+
+    def test_limits(self):
+        inst = self.connect()
+        with self.assertRaises(ValueError):
+            inst.temperature = 400
+        with self.assertRaises(ValueError):
+            inst.volts[1] = 6
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+
+from lantz.ino import INODriver, IntFeat, IntDictFeat
+
+from lantz.ino.testsuite.helpers import FakeBoardTestCase
+
+
+class FlightDriver(INODriver):
+
+    count = IntFeat('CNT')
+    cached = IntFeat('CCH', fresh=0.3)
+    registers = IntDictFeat('REG', keys=[1, 2])
+
+
+class SharedFlightDriver(FlightDriver):
+    INO_SINGLE_FLIGHT = True
+
+
+class FlightTest(FakeBoardTestCase):
+
+    driver_class = FlightDriver
+    values = {'CNT': 3, 'CCH': 5, 'REG 1': 10, 'REG 2': 20}
+
+    def concurrent(self, func, threads=8):
+        results = []
+        workers = [threading.Thread(target=lambda: results.append(func())) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return results
+
+    def test_default(self):
+        self.assertFalse(INODriver.INO_SINGLE_FLIGHT)
+
+        inst = self.connect()
+        self.board.delay = 0.02
+        del self.board.log[:]
+
+        self.assertEqual(self.concurrent(lambda: inst.count), [3] * 8)
+        self.assertEqual(self.board.log.count('CNT?'), 8)
+
+    def test_shared(self):
+        inst = self.connect(SharedFlightDriver)
+        self.board.delay = 0.02
+        del self.board.log[:]
+
+        self.assertEqual(self.concurrent(lambda: inst.count), [3] * 8)
+        self.assertLess(self.board.log.count('CNT?'), 8)
+
+        # Each key has its own flight.
+        self.assertEqual(self.concurrent(lambda: (inst.registers[1], inst.registers[2])), [(10, 20)] * 8)
+
+    def test_fresh(self):
+        inst = self.connect()
+        del self.board.log[:]
+
+        self.assertEqual([inst.cached for _ in range(3)], [5] * 3)
+        self.assertEqual(self.board.log.count('CCH?'), 1)
+
+        # A set forgets the last value.
+        inst.cached = 6
+        self.assertEqual(inst.cached, 6)
+        self.assertEqual(self.board.log.count('CCH?'), 2)
+
+        time.sleep(0.35)
+        self.board.values['CCH'] = 7
+        self.assertEqual(inst.cached, 7)
+        self.assertEqual(self.board.log.count('CCH?'), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
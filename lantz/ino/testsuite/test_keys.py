@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from lantz.ino import INODriver, BoolDictFeat, IntDictFeat
+
+from lantz.ino.testsuite.helpers import EmulatorTestCase
+
+
+class KeysDriver(INODriver):
+
+    mode = BoolDictFeat('MODE', keys=['slow', 'fast', 'x-y'])
+    chan = IntDictFeat('CHN', keys={10, 3, 7}, indexed=True)
+    plain = IntDictFeat('PLN', keys=[1, 2])
+
+
+class WireKeyTest(unittest.TestCase):
+
+    def test_indexed(self):
+        self.assertTrue(KeysDriver.mode.ino_indexed)
+        self.assertEqual([KeysDriver.mode.ino_wire_key(key) for key in ('slow', 'fast', 'x-y')], [0, 1, 2])
+        self.assertEqual(KeysDriver.chan.ino_keys, [3, 7, 10])
+        self.assertEqual(KeysDriver.chan.ino_wire_key(10), 2)
+
+    def test_not_indexed(self):
+        self.assertFalse(KeysDriver.plain.ino_indexed)
+        self.assertEqual(KeysDriver.plain.ino_wire_key(2), 2)
+
+    def test_mixed_types(self):
+        with self.assertRaises(ValueError):
+            IntDictFeat('X', keys=[1, 'a'])
+
+    def test_string_keys_not_indexed(self):
+        # The board cannot receive string keys.
+        with self.assertRaisesRegex(ValueError, 'indexed=True'):
+            BoolDictFeat('LEDS', keys=['a', 'b'], indexed=False)
+
+
+class KeysTest(EmulatorTestCase):
+
+    driver_class = KeysDriver
+    user_prelude = 'int modes[MODE_KEY_COUNT];'
+    user_code = {'get_MODE': 'return modes[key];',
+                 'set_MODE': 'modes[key] = value;\n  return 0;',
+                 'get_CHN': 'return CHN_KEYS[key];',
+                 'get_PLN': 'return 10 * key;'}
+
+    def test_string_keys(self):
+        inst = self.connect()
+        inst.mode['fast'] = True
+        inst.mode['x-y'] = False
+
+        self.assertEqual(inst.query('MODE? %d' % 1), '1')
+        self.assertTrue(inst.mode['fast'])
+        self.assertFalse(inst.mode['x-y'])
+
+    def test_key_table(self):
+        inst = self.connect()
+        self.assertEqual([inst.chan[key] for key in (3, 7, 10)], [3, 7, 10])
+        self.assertEqual(inst.plain[2], 20)
+
+    def test_invalid_keys(self):
+        inst = self.connect()
+        self.assertTrue(inst.query('MODE? 3').startswith('ERROR'))
+        self.assertTrue(inst.query('CHN? -1').startswith('ERROR'))
+
+        with self.assertRaises(KeyError):
+            inst.mode['nope'] = True
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import subprocess
+import sys
+import unittest
+
+import lantz.ino
+from lantz.ino import bench
+
+
+def imported_by(module):
+    """Modules imported by a fresh interpreter importing module (and lantz before)."""
+    code = ('import sys; import lantz; before = set(sys.modules); import %s; '
+            'print(" ".join(sorted(set(sys.modules) - before)))' % module)
+    out = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE,
+                         check=True, universal_newlines=True)
+    return set(out.stdout.split())
+
+
+class LazyTest(unittest.TestCase):
+
+    def test_forbidden(self):
+        for module in bench.IMPORT_BUDGET:
+            with self.subTest(module=module):
+                modules = imported_by(module)
+                self.assertFalse(modules & set(bench.IMPORT_FORBIDDEN))
+
+    def test_public_names(self):
+        from lantz.ino import base, shadow
+
+        self.assertIs(lantz.ino.INODriver, base.INODriver)
+        self.assertIs(lantz.ino.ShadowArray, shadow.ShadowArray)
+        self.assertEqual(set(lantz.ino.__all__) - set(dir(lantz.ino)), set())
+
+    def test_unknown_name(self):
+        with self.assertRaises(AttributeError):
+            lantz.ino.NotAName
+
+        with self.assertRaises(ImportError):
+            from lantz.ino import NotAName
+
+
+class ImportTimeTest(unittest.TestCase):
+
+    def test_parse(self):
+        stderr = ('import time: self [us] | cumulative | imported package\n'
+                  'import time:       120 |        120 |   lantz.ino.common\n'
+                  'import time:       300 |        420 | lantz.ino\n')
+
+        self.assertEqual(bench.parse_importtime(stderr),
+                         [(120, 120, 1, 'lantz.ino.common'), (300, 420, 0, 'lantz.ino')])
+
+    def test_measure(self):
+        total, modules = bench.measure_import('lantz.ino')
+        self.assertIn('lantz.ino', modules)
+        self.assertNotIn('lantz', modules)
+        self.assertGreater(total, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
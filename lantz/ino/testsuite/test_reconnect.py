@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from lantz.core.messagebased import MessageBasedDriver
+from lantz.ino import INODriver, IntFeat
+from lantz.ino.common import Packfile
+
+from lantz.ino.testsuite.helpers import FakeBoard, FakeBoardTestCase
+
+
+class KeptDriver(INODriver):
+
+    count = IntFeat('CNT')
+
+
+class PackfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def test_defaults(self):
+        pf = Packfile.from_defaults('sketch', 'module:Driver')
+        self.assertEqual((pf.reset, pf.dtr, pf.rts), (None, None, None))
+        self.assertEqual(pf.serial_options, {'reset': True})
+
+        pf = pf._replace(reset=False, dtr=1, rts=0)
+        self.assertEqual(pf.serial_options, {'reset': False, 'dtr': True, 'rts': False})
+
+    def test_file(self):
+        filename = os.path.join(self.folder, 'project.yaml')
+        pf = Packfile('sketch', 'module:Driver', 'arduino:avr:uno', '/dev/ttyACM0', '', False, True, None)
+        pf.to_file(filename)
+        self.assertEqual(Packfile.from_file(filename), pf)
+
+    def test_old_file(self):
+        # Written before reset, dtr and rts were added.
+        filename = os.path.join(self.folder, 'project.yaml')
+        with open(filename, 'w', encoding='utf-8') as fo:
+            fo.write('sketch_folder: sketch\nclass_spec: module:Driver\nfqbn: arduino:avr:uno\nport: ""\nusbID: ""\n')
+
+        pf = Packfile.from_file(filename)
+        self.assertEqual(pf.fqbn, 'arduino:avr:uno')
+        self.assertEqual(pf.serial_options, {'reset': True})
+
+
+class ReconnectTest(FakeBoardTestCase):
+
+    driver_class = KeptDriver
+    values = {'CNT': '0'}
+
+    def test_running(self):
+        inst = KeptDriver.via_serial(self.board.port, reset=False)
+        inst.initialize()
+        inst.count = 5
+        inst.finalize()
+
+        # The same sketch answers the probe: no settle time.
+        start = time.monotonic()
+        inst = self.connect()
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(inst.count, 5)
+
+    def test_hangup(self):
+        import termios
+
+        inst = self.connect()
+        port = inst._ino_serial_port()
+        self.assertFalse(termios.tcgetattr(port.fileno())[2] & termios.HUPCL)
+
+    def test_probe_errors(self):
+        inst = KeptDriver.via_serial(self.board.port, reset=False)
+        MessageBasedDriver.initialize(inst)
+        self.addCleanup(MessageBasedDriver.finalize, inst)
+        inst.resource.timeout = 200
+
+        self.assertTrue(inst._ino_probe())
+
+        # Any failure means that the sketch is not running.
+        with mock.patch.object(inst, 'ino_resync', side_effect=UnicodeDecodeError('ascii', b'\xff', 0, 1, '')):
+            self.assertFalse(inst._ino_probe())
+
+        self.board.silent = True
+        self.assertFalse(inst._ino_probe())
+
+
+class OtherSketchTest(unittest.TestCase):
+
+    def test_settle(self):
+        if os.name != 'posix':
+            raise unittest.SkipTest('FakeBoard requires a pseudo terminal.')
+
+        board = FakeBoard('OtherDriver', {'CNT': '0'})
+        self.addCleanup(board.close)
+
+        inst = KeptDriver.via_serial(board.port, reset=False)
+        start = time.monotonic()
+        inst.initialize()
+        self.addCleanup(inst.finalize)
+
+        # Another sketch answers the probe: wait for the board to start.
+        self.assertGreaterEqual(time.monotonic() - start, 3)
+        self.assertIn('INITIALIZE', board.log)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from lantz.core.messagebased import MessageBasedDriver
+from lantz.ino import INODriver, IntFeat, QuantityFeat
+from lantz.ino.record import LogReader, Recorder, Replay, READ, WRITE
+
+from lantz.ino.testsuite.helpers import FakeBoardTestCase
+
+
+class RecordDriver(INODriver):
+
+    count = IntFeat('CNT')
+    temperature = QuantityFeat('TEMP', units='degC', setter=False)
+
+
+class TemporaryFolder:
+
+    def setUp(self):
+        super().setUp()
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+
+class LogTest(TemporaryFolder, unittest.TestCase):
+
+    def test_roundtrip(self):
+        path = os.path.join(self.folder, 'a.inolog')
+        with Recorder(path) as recorder:
+            recorder.write(b'TEMP?\n')
+            recorder.read(b'21.50\r\n')
+
+        with LogReader(path) as reader:
+            records = [(direction, bytes(data)) for direction, _, data in reader]
+            self.assertEqual(reader.summary()[:3], (2, 6, 7))
+
+        self.assertEqual(records, [(WRITE, b'TEMP?\n'), (READ, b'21.50\r\n')])
+
+    def test_truncated(self):
+        path = os.path.join(self.folder, 'a.inolog')
+        with Recorder(path) as recorder:
+            recorder.write(b'TEMP?\n')
+            recorder.read(b'21.50\r\n')
+
+        with open(path, 'r+b') as fp:
+            fp.truncate(os.path.getsize(path) - 2)
+
+        with LogReader(path) as reader:
+            self.assertEqual(reader.summary()[0], 1)
+
+    def test_not_a_log(self):
+        path = os.path.join(self.folder, 'a.inolog')
+        with open(path, 'wb') as fp:
+            fp.write(b'x' * 64)
+
+        with self.assertRaises(ValueError):
+            LogReader(path)
+
+
+class ReplayTest(TemporaryFolder, FakeBoardTestCase):
+
+    driver_class = RecordDriver
+    values = {'CNT': 3, 'TEMP': '21.50'}
+
+    def record(self):
+        path = os.path.join(self.folder, 'run.inolog')
+        inst = self.connect()
+        inst.ino_record(path)
+        values = [inst.count, inst.temperature.magnitude]
+        inst.count = 4
+        values.append(inst.count)
+        inst.ino_record(None)
+        return path, values
+
+    def replay_driver(self, replay):
+        inst = RecordDriver.via_serial(replay.port)
+        # The recording starts after the initialization.
+        MessageBasedDriver.initialize(inst)
+        self.addCleanup(MessageBasedDriver.finalize, inst)
+        return inst
+
+    def test_replay(self):
+        path, recorded = self.record()
+        self.assertEqual(recorded, [3, 21.5, 4])
+
+        with Replay(path, speed=None, strict=True) as replay:
+            inst = self.replay_driver(replay)
+            inst.resource.timeout = 1000
+            values = [inst.count, inst.temperature.magnitude]
+            inst.count = 4
+            values.append(inst.count)
+            self.assertTrue(replay.wait(1))
+            self.assertIsNone(replay.error)
+
+        self.assertEqual(values, recorded)
+
+    def test_strict(self):
+        path, _ = self.record()
+
+        with Replay(path, speed=None, strict=True) as replay:
+            inst = self.replay_driver(replay)
+            inst.write('TEMP?')
+            self.assertTrue(replay.wait(1))
+            self.assertIsInstance(replay.error, ValueError)
+
+
+if __name__ == '__main__':
+    unittest.main()
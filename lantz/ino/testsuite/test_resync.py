@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+
+from lantz.ino import INODriver, IntFeat
+from lantz.ino.base import DesyncError
+
+from lantz.ino.testsuite.helpers import FakeBoardTestCase
+
+
+class ResyncDriver(INODriver):
+
+    count = IntFeat('CNT')
+
+
+class TaggedResyncDriver(ResyncDriver):
+    INO_SEQUENCE_TAGS = True
+
+
+class ResyncTest(FakeBoardTestCase):
+
+    driver_class = ResyncDriver
+    values = {'CNT': 3}
+
+    def test_lost_reply(self):
+        inst = self.connect()
+        self.board.drop = 1
+
+        start = time.monotonic()
+        self.assertEqual(inst.count, 3)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(self.board.log[-1], 'CNT?')
+        self.assertTrue(self.board.log[-2].startswith('SYNC?'))
+        self.assertEqual(self.board.log[-3], 'CNT?')
+
+    def test_unexpected_reply(self):
+        inst = self.connect()
+        self.board.send('OK')
+        time.sleep(0.05)
+
+        self.assertEqual(inst.count, 3)
+
+    def test_retries_exhausted(self):
+        inst = self.connect()
+        self.board.drop = 1 + inst.INO_RESYNC_RETRIES
+
+        with self.assertRaises(DesyncError):
+            inst.count
+
+    def test_setter_not_retried(self):
+        inst = self.connect()
+        self.board.drop = 1
+
+        with self.assertRaises(DesyncError):
+            inst.count = 5
+
+        self.assertEqual(self.board.log.count('CNT 5'), 1)
+        self.assertEqual(self.board.values['CNT'], 3)
+
+        # The stream was recovered.
+        self.assertEqual(inst.count, 3)
+
+    def test_resync(self):
+        inst = self.connect()
+        for _ in range(3):
+            self.board.send('12')
+
+        inst.ino_resync()
+        self.assertEqual(inst.count, 3)
+
+    def test_no_answer(self):
+        inst = self.connect()
+        self.board.silent = True
+
+        with self.assertRaises(DesyncError):
+            inst.ino_resync()
+
+        self.board.silent = False
+        inst.ino_resync()
+
+
+class TaggedResyncTest(FakeBoardTestCase):
+
+    driver_class = TaggedResyncDriver
+    values = {'CNT': 3}
+
+    def commands(self):
+        # Without the tags.
+        return [line.partition(' ')[2] for line in self.board.log]
+
+    def test_lost_reply(self):
+        inst = self.connect()
+        self.board.drop = 1
+
+        self.assertEqual(inst.count, 3)
+        self.assertEqual(self.commands()[-1], 'CNT?')
+        self.assertTrue(self.commands()[-2].startswith('SYNC?'))
+        self.assertEqual(self.commands()[-3], 'CNT?')
+
+    def test_pipelined(self):
+        inst = self.connect()
+        self.board.drop = 1
+
+        with inst.ino_pipeline(['CNT?']):
+            self.assertEqual(inst.count, 3)
+
+    def test_retries_exhausted(self):
+        inst = self.connect()
+        self.board.drop = 1 + inst.INO_RESYNC_RETRIES
+
+        with self.assertRaises(DesyncError):
+            inst.count
+
+    def test_setter_not_retried(self):
+        inst = self.connect()
+        self.board.drop = 1
+
+        with self.assertRaises(DesyncError):
+            inst.count = 5
+
+        self.assertEqual(self.commands().count('CNT 5'), 1)
+        self.assertEqual(inst.count, 3)
+
+    def test_no_answer(self):
+        inst = self.connect()
+        self.board.silent = True
+
+        with self.assertRaises(DesyncError):
+            inst.count
+
+        self.board.silent = False
+        inst.ino_resync()
+        self.assertEqual(inst.count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import unittest
+
+from pyvisa.errors import VisaIOError
+
+from lantz.core.messagebased import MessageBasedDriver
+from lantz.ino import INODriver
+from lantz.ino.base import RX_COMPACT
+
+
+@unittest.skipUnless(os.name == 'posix', 'requires a pseudo terminal')
+class ReceiveTest(unittest.TestCase):
+
+    def setUp(self):
+        import pty
+        import tty
+
+        self.master, slave = pty.openpty()
+        tty.setraw(slave)
+        self.addCleanup(os.close, self.master)
+        self.addCleanup(os.close, slave)
+
+        self.inst = INODriver.via_serial(os.ttyname(slave))
+        # Open the port without the settle time and INITIALIZE of INODriver.
+        MessageBasedDriver.initialize(self.inst)
+        self.addCleanup(MessageBasedDriver.finalize, self.inst)
+        self.inst.resource.timeout = 500
+
+    def feed(self, data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.master, view[:4096]):]
+
+    def test_lines(self):
+        self.feed(b'1.5\r\nOK\r\n\r\n')
+        self.assertEqual([self.inst.read() for _ in range(3)], ['1.5', 'OK', ''])
+
+    def test_split_termination(self):
+        self.feed(b'12\r')
+        writer = threading.Timer(0.05, self.feed, (b'\n34\r\n', ))
+        writer.start()
+        self.assertEqual(self.inst.read(), '12')
+        self.assertEqual(self.inst.read(), '34')
+        writer.join()
+
+    def test_debug_messages(self):
+        self.feed(b'starting#level 2#42\r\n')
+        with self.assertLogs('lantz', 'DEBUG') as logs:
+            self.assertEqual(self.inst.read(), '42')
+
+        messages = '\n'.join(logs.output)
+        self.assertIn('starting', messages)
+        self.assertIn('level 2', messages)
+
+    def test_values(self):
+        self.feed(b'1\r\n0\r\n-12\r\n2.50\r\n')
+        self.assertIs(self.inst.ino_read_value('B'), True)
+        self.assertIs(self.inst.ino_read_value('B'), False)
+        self.assertEqual(self.inst.ino_read_value('I'), -12)
+        self.assertEqual(self.inst.ino_read_value('F'), 2.5)
+
+    def test_compaction(self):
+        lines = 3 * RX_COMPACT // 8
+        writer = threading.Thread(target=self.feed, args=(b'1234.5\r\n' * lines, ))
+        writer.start()
+        for _ in range(lines):
+            self.assertEqual(self.inst.read(), '1234.5')
+        writer.join()
+
+        self.assertLessEqual(len(self.inst._ino_rx), RX_COMPACT + 4096)
+
+    def test_timeout(self):
+        self.inst.resource.timeout = 50
+        self.feed(b'partial')
+        with self.assertRaises(VisaIOError):
+            self.inst.read()
+
+        # The partial line is kept.
+        self.feed(b' line\r\n')
+        self.assertEqual(self.inst.read(), 'partial line')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+
+from lantz.ino import INODriver, IntFeat, IntDictFeat, QuantityFeat, RingBuffer, Scheduler
+from lantz.ino.scheduler import Poll, _Board
+
+from lantz.ino.testsuite.helpers import FakeBoardTestCase
+
+
+class PolledDriver(INODriver):
+
+    temperature = QuantityFeat('TEMP', units='degC', setter=False)
+    count = IntFeat('CNT')
+    registers = IntDictFeat('REG', keys=[1, 2])
+    missing = IntFeat('MIS')
+
+
+class RingBufferTest(unittest.TestCase):
+
+    def test_size(self):
+        buffer = RingBuffer(3)
+        self.assertIsNone(buffer.last())
+        for ndx in range(5):
+            buffer.append((ndx, ndx * 10))
+
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(buffer.timestamps(), [2, 3, 4])
+        self.assertEqual(buffer.values(), [20, 30, 40])
+        self.assertEqual(buffer.last(), (4, 40))
+
+        buffer.clear()
+        self.assertEqual(list(buffer), [])
+
+
+class SchedulerTest(FakeBoardTestCase):
+
+    driver_class = PolledDriver
+    values = {'TEMP': '21.50', 'CNT': 3, 'REG 1': 10, 'REG 2': 20}
+
+    def test_invalid(self):
+        inst = self.connect()
+        scheduler = Scheduler()
+        with self.assertRaises(ValueError):
+            scheduler.add(inst, 'count', 0)
+        with self.assertRaises(ValueError):
+            scheduler.add(inst, 'nothing', 1)
+        with self.assertRaises(ValueError):
+            scheduler.add(inst, 'count', 1, key=1)
+
+    def test_rates(self):
+        inst = self.connect()
+        received = []
+
+        with Scheduler() as scheduler:
+            fast = scheduler.add(inst, 'temperature', 0.05, callback=lambda timestamp, value: received.append(value))
+            slow = scheduler.add(inst, 'registers', 0.25, key=2, buffer=RingBuffer(10))
+            time.sleep(0.6)
+
+        self.assertGreater(fast.count, 2 * slow.count)
+        self.assertGreater(slow.count, 1)
+        self.assertEqual(received[0].magnitude, 21.5)
+        self.assertEqual(set(slow.buffer.values()), {20})
+        self.assertEqual(fast.errors + slow.errors, 0)
+        self.assertEqual(scheduler.polls, [fast, slow])
+        self.assertGreater(scheduler.load(inst), 0)
+
+    def test_errors(self):
+        inst = self.connect()
+        received = []
+
+        with Scheduler() as scheduler:
+            poll = scheduler.add(inst, 'missing', 0.05, callback=lambda timestamp, value: received.append(value))
+            time.sleep(0.2)
+
+        self.assertGreater(poll.errors, 0)
+        self.assertEqual(poll.errors, poll.count)
+        self.assertIsNotNone(poll.error)
+        self.assertEqual(received, [])
+
+    def test_shedding(self):
+        inst = self.connect()
+        board = _Board(inst, max_load=0.9)
+        board.cost = 0.03
+
+        high = Poll(inst, 'temperature', 0.05, priority=2)
+        low = Poll(inst, 'count', 0.05)
+        idle = Poll(inst, 'registers', 0.05, key=1, priority=-1)
+        for poll in (low, high, idle):
+            board.add(poll)
+
+        self.assertEqual(high.effective_period, 0.05)
+        self.assertAlmostEqual(low.effective_period, 0.03 / 0.3)
+        self.assertTrue(idle.suspended)
+
+        board.cost = 0.001
+        board.plan()
+        self.assertFalse(any(poll.suspended or poll.effective_period != 0.05 for poll in (low, high, idle)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+import json
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from lantz.core import Action, Q_
+from lantz.ino import INOClient, INODriver, BoolDictFeat, IntFeat, QuantityFeat
+from lantz.ino.server import INOServer, ServerError, _decode, _encode, default_socket_path
+
+from lantz.ino.testsuite.helpers import FakeBoardTestCase
+
+
+Point = namedtuple('Point', 'x y')
+
+
+class ServerDriver(INODriver):
+
+    count = IntFeat('CNT', limits=(0, 100))
+    temperature = QuantityFeat('TEMP', units='degC', setter=False)
+    relays = BoolDictFeat('REL', keys=[0, 1])
+
+    @Action()
+    def opaque(self):
+        return object()
+
+    @Action()
+    def fail(self):
+        raise RuntimeError('failed on purpose')
+
+    @Action()
+    def table(self):
+        return {(0, 1): np.arange(3), 'point': Point(np.float64(1.5), Q_(np.float64(2), 'V'))}
+
+
+class EncodeTest(unittest.TestCase):
+
+    def test_roundtrip(self):
+        value = _encode({(0, 1): np.arange(3), 'point': Point(np.float64(1.5), Q_(np.float64(2), 'V'))})
+        self.assertEqual(json.loads(json.dumps(value)), value)
+
+        decoded = _decode(value)
+        self.assertEqual(decoded['(0, 1)'], [0, 1, 2])
+        self.assertEqual(decoded['point'][0], 1.5)
+        self.assertEqual(decoded['point'][1], Q_(2, 'V'))
+
+    def test_socket_path(self):
+        self.assertEqual(default_socket_path('/tmp/board.pack.yaml'), '/tmp/board.sock')
+
+
+class ServerTest(FakeBoardTestCase):
+
+    driver_class = ServerDriver
+    values = {'CNT': 3, 'TEMP': '21.50', 'REL 0': 0, 'REL 1': 1}
+
+    def setUp(self):
+        super().setUp()
+
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.path = os.path.join(self.folder, 'board.sock')
+
+        self.server = INOServer(self.connect(), self.path)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.client = INOClient(self.path, timeout=5)
+        self.addCleanup(self.client.close)
+
+    def test_feats(self):
+        client = self.client
+        self.assertEqual(client.count, 3)
+        self.assertEqual(client.temperature, Q_(21.5, 'degC'))
+
+        client.count = 9
+        self.assertEqual(self.board.values['CNT'], '9')
+        self.assertEqual(client.count, 9)
+
+        client.relays[0] = True
+        self.assertEqual(self.board.values['REL 0'], '1')
+        self.assertTrue(client.relays[1])
+
+        self.assertEqual(client.query('INFO?').partition(',')[0], 'ServerDriver')
+        self.assertIn('relays', dir(client))
+
+    def test_permissions(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+        # The umask of the process is restored.
+        umask = os.umask(0o022)
+        os.umask(umask)
+        self.assertNotEqual(umask, 0o177)
+
+    def test_unknown_name(self):
+        with self.assertRaises(AttributeError):
+            self.client.nothing
+
+    def test_driver_errors(self):
+        client = self.client
+
+        with self.assertRaises(ServerError):
+            client.count = 1000
+
+        with self.assertRaisesRegex(ServerError, 'failed on purpose'):
+            client.fail()
+
+        self.assertEqual(client.count, 3)
+
+    def test_not_serializable(self):
+        with self.assertRaises(ServerError):
+            self.client.opaque()
+
+        # The worker is still serving.
+        self.assertEqual(self.client.count, 3)
+        self.assertEqual(self.client.table()['(0, 1)'], [0, 1, 2])
+
+    def test_invalid_requests(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(5)
+            sock.connect(self.path)
+            fp = sock.makefile('rwb')
+
+            fp.write(b'not json\n{"id": 7, "op": "explode"}\n[1, 2]\n')
+            fp.flush()
+
+            replies = [json.loads(fp.readline().decode('utf-8')) for _ in range(3)]
+
+        self.assertEqual([reply['id'] for reply in replies], [None, 7, None])
+        self.assertTrue(all('error' in reply for reply in replies))
+
+        self.assertEqual(self.client.count, 3)
+
+    def test_concurrent_clients(self):
+        results = []
+
+        def work():
+            with INOClient(self.path, timeout=5) as client:
+                results.extend(client.count for _ in range(10))
+
+        threads = [threading.Thread(target=work) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [3] * 50)
+        self.assertLessEqual(self.board.log.count('CNT?'), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
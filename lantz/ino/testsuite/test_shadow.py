@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+
+from lantz.core import Q_
+from lantz.core.errors import InstrumentError
+from lantz.ino import INODriver, BoolDictFeat, IntDictFeat, QuantityDictFeat, ShadowArray
+from lantz.ino.base import AsyncCommandError
+
+from lantz.ino.testsuite.helpers import EmulatorTestCase, FakeBoardTestCase
+
+
+class RangeDriver(INODriver):
+    INO_RANGE_SET = True
+
+    leds = BoolDictFeat('LEDS', keys=list(range(64)))
+    names = IntDictFeat('NAM', keys=['a', 'b', 'c', 'd'])
+    volts = QuantityDictFeat('VOLT', keys=[1, 2, 3], units='V', limits=(0, 5))
+    readonly = IntDictFeat('RO', keys=[1, 2], setter=False)
+
+
+class TaggedRangeDriver(RangeDriver):
+    INO_SEQUENCE_TAGS = True
+
+
+class PlainShadowDriver(INODriver):
+
+    relays = BoolDictFeat('REL', keys=[0, 1, 2, 3])
+
+
+class CommandsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.inst = RangeDriver('ASRL1::INSTR')
+
+    def test_errors(self):
+        with self.assertRaisesRegex(ValueError, 'no settable'):
+            ShadowArray(self.inst, 'readonly')
+        with self.assertRaisesRegex(ValueError, 'no settable'):
+            ShadowArray(self.inst, 'missing')
+
+    def test_dirty(self):
+        leds = ShadowArray(self.inst, 'leds', values=[False] * 64)
+        self.assertEqual(leds.commands(), [])
+
+        leds.values[3:5] = True
+        leds[40] = True
+        self.assertEqual(leds.dirty.tolist(), [3, 4, 40])
+
+        leds[40] = False
+        leds.mark_dirty([63])
+        self.assertEqual(leds.dirty.tolist(), [3, 4, 63])
+
+        leds.mark_dirty()
+        self.assertEqual(len(leds.dirty), 64)
+
+    def test_unknown(self):
+        # Without values, everything is sent in the first sync.
+        names = ShadowArray(self.inst, 'names')
+        self.assertEqual(names.commands(), [(0, 4, 'NAM* 0 0 0 0 0')])
+
+    def test_gap(self):
+        leds = ShadowArray(self.inst, 'leds', values=[False] * 64)
+        leds.values[3:6] = True
+        leds[8] = True
+        leds[20] = True
+
+        # The unchanged keys 6 and 7 join the runs, the single key is sent alone.
+        self.assertEqual(leds.commands(), [(3, 6, 'LEDS* 3 1 1 1 0 0 1'), (20, 1, 'LEDS 20 1')])
+
+        leds.gap = 0
+        self.assertEqual([command[:2] for command in leds.commands()], [(3, 3), (8, 1), (20, 1)])
+
+    def test_split(self):
+        leds = ShadowArray(self.inst, 'leds', values=[False] * 64)
+        leds.values[:] = True
+
+        # Split to fit the line buffer of the board.
+        commands = leds.commands()
+        self.assertGreater(len(commands), 1)
+        self.assertEqual(sum(count for _, count, _ in commands), 64)
+        self.assertEqual([first for first, _, _ in commands[1:]],
+                         np.cumsum([count for _, count, _ in commands])[:-1].tolist())
+
+    def test_units(self):
+        volts = ShadowArray(self.inst, 'volts', values=[Q_(1, 'V')] * 3)
+        volts[2] = Q_(500, 'mV')
+        self.assertEqual(volts[2], Q_(0.5, 'V'))
+        self.assertEqual(volts.commands(), [(1, 1, 'VOLT 2 0.50')])
+
+        # The limits of the dictfeat.
+        volts.values[0] = 7
+        with self.assertRaises(ValueError):
+            volts.commands()
+
+    def test_not_ranged(self):
+        relays = ShadowArray(PlainShadowDriver('ASRL1::INSTR'), 'relays', values=[False] * 4)
+        relays.values[:3] = True
+        self.assertEqual(relays.commands(), [(0, 1, 'REL 0 1'), (1, 1, 'REL 1 1'), (2, 1, 'REL 2 1')])
+
+
+class ShadowTest(EmulatorTestCase):
+
+    driver_class = RangeDriver
+    user_prelude = 'int leds[64];\nint names[4];\nfloat volts[4];'
+    user_code = {'get_LEDS': 'return leds[key];',
+                 # LED 63 cannot be turned on.
+                 'set_LEDS': 'if (key == 63 && value) {\n    return 5;\n  }\n  leds[key] = value;\n  return 0;',
+                 'get_NAM': 'return names[key];',
+                 'set_NAM': 'names[key] = value;\n  return 0;',
+                 'get_VOLT': 'return volts[key];',
+                 'set_VOLT': 'volts[key] = value;\n  return 0;'}
+
+    def clear(self, inst):
+        # The emulator is shared by the tests.
+        leds = ShadowArray(inst, 'leds')
+        leds.sync()
+        return leds
+
+    def test_sync(self):
+        inst = self.connect()
+        self.clear(inst)
+        leds = ShadowArray(inst, 'leds')
+        self.assertEqual(leds.pull().sum(), 0)
+
+        leds.values[3:40] = True
+        leds[50] = True
+        commands = leds.commands()
+        self.assertEqual(leds.sync(), len(commands))
+        self.assertEqual(len(leds.dirty), 0)
+        self.assertEqual(leds.sync(), 0)
+
+        # The values cached by the dictfeat were invalidated.
+        self.assertIs(inst.leds[4], True)
+        self.assertIs(inst.leds[41], False)
+
+        leds.pull()
+        self.assertEqual(np.flatnonzero(leds.values).tolist(), list(range(3, 40)) + [50])
+
+    def test_keys(self):
+        inst = self.connect()
+        names = ShadowArray(inst, 'names', values=[0] * 4)
+        names['b'] = 7
+        names['c'] = -3
+        names.sync()
+        self.assertEqual((inst.names['a'], inst.names['b'], inst.names['c']), (0, 7, -3))
+
+        volts = ShadowArray(inst, 'volts', values=[0] * 3)
+        volts.values[:] = [1.5, 2.25, 0.5]
+        volts.sync()
+        self.assertEqual(inst.volts[2], Q_(2.25, 'V'))
+
+    def test_rejected(self):
+        inst = self.connect()
+        leds = self.clear(inst)
+        leds.values[60:64] = True
+        leds[10] = True
+
+        with self.assertRaises(InstrumentError):
+            leds.sync()
+
+        # The rejected range is sent again, the keys before it are synced.
+        self.assertEqual(leds.dirty.tolist(), [60, 61, 62, 63])
+
+        leds[63] = False
+        self.assertEqual(leds.sync(), 1)
+        self.assertEqual(len(leds.dirty), 0)
+        self.assertEqual(np.flatnonzero(leds.pull()).tolist(), [10, 60, 61, 62])
+
+    def test_unacknowledged(self):
+        inst = self.connect()
+        leds = self.clear(inst)
+        leds.values[::2] = True
+        leds[63] = True
+
+        with self.assertRaises(AsyncCommandError):
+            with inst.ino_unacknowledged():
+                leds.sync()
+
+        # Considered synced.
+        self.assertEqual(len(leds.dirty), 0)
+        # But the board kept LED 63 off.
+        self.assertEqual(np.flatnonzero(leds.pull()).tolist(), list(range(0, 64, 2)))
+
+
+class TaggedShadowTest(ShadowTest):
+
+    driver_class = TaggedRangeDriver
+
+
+class RejectedKeyTest(FakeBoardTestCase):
+
+    driver_class = PlainShadowDriver
+    # The board has no relay 2.
+    values = {'REL 0': '0', 'REL 1': '0', 'REL 3': '0'}
+
+    def test_rejected(self):
+        inst = self.connect()
+        relays = ShadowArray(inst, 'relays', values=[False] * 4)
+        relays.values[:] = True
+
+        with self.assertRaisesRegex(InstrumentError, 'REL 2 1'):
+            relays.sync()
+        self.assertEqual(relays.dirty.tolist(), [2, 3])
+
+        # Once the board accepts it, only the keys not synced are sent.
+        self.board.values['REL 2'] = '0'
+        del self.board.log[:]
+        self.assertEqual(relays.sync(), 2)
+        self.assertEqual(self.board.log, ['REL 2 1', 'REL 3 1'])
+        self.assertEqual(len(relays.dirty), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
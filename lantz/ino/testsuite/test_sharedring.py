@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy as np
+
+from lantz.core import Q_
+from lantz.ino import sharedring
+from lantz.ino.sharedring import SharedRing, SharedRingReader, SAMPLE_DTYPE
+
+
+def samples(start, stop):
+    values = np.arange(start, stop, dtype=float)
+    return np.rec.fromarrays([values, values], dtype=SAMPLE_DTYPE)
+
+
+@unittest.skipIf(sharedring.shared_memory is None, 'Requires Python 3.8')
+class SharedRingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = SharedRing(capacity=10)
+        self.addCleanup(self.ring.close)
+
+    def attach(self, **kwargs):
+        reader = SharedRingReader(self.ring.name, **kwargs)
+        self.addCleanup(reader.close)
+        return reader
+
+    def values(self, chunks):
+        return [value for _, view in chunks for value in view['value']]
+
+    def test_append(self):
+        reader = self.attach()
+        self.ring.append((1.0, Q_(2.5, 'V')))
+        self.ring.append((2.0, 3))
+
+        chunks = reader.read()
+        self.assertEqual(len(chunks), 1)
+        seq, view = chunks[0]
+        self.assertEqual(seq, 0)
+        self.assertEqual(list(view['timestamp']), [1.0, 2.0])
+        self.assertEqual(list(view['value']), [2.5, 3.0])
+
+        self.assertEqual(reader.read(), [])
+        self.assertEqual(reader.lost, 0)
+
+    def test_start(self):
+        self.ring.extend(samples(0, 5))
+        self.assertEqual(self.attach().pending, 0)
+        self.assertEqual(self.values(self.attach(start=2).read()), [2, 3, 4])
+
+    def test_wrap(self):
+        reader = self.attach()
+        self.ring.extend(samples(0, 7))
+        reader.read()
+
+        # Records 7 to 11 wrap around the end of the buffer.
+        self.ring.extend(samples(7, 12))
+        chunks = reader.read()
+        self.assertEqual([seq for seq, _ in chunks], [7, 10])
+        self.assertEqual(self.values(chunks), list(range(7, 12)))
+
+    def test_maximum(self):
+        reader = self.attach()
+        self.ring.extend(samples(0, 6))
+        self.assertEqual(self.values(reader.read(4)), [0, 1, 2, 3])
+        self.assertEqual(reader.pending, 2)
+        self.assertEqual(self.values(reader.read(4)), [4, 5])
+
+    def test_lost(self):
+        reader = self.attach(start=0)
+        self.ring.extend(samples(0, 4))
+        self.assertEqual(self.values(reader.read(1)), [0])
+
+        # The publisher laps the reader: 1 to 5 are overwritten.
+        self.ring.extend(samples(4, 16))
+        self.assertEqual(reader.pending, 15)
+        self.assertEqual(self.values(reader.read()), list(range(6, 16)))
+        self.assertEqual(reader.lost, 5)
+
+        # Lost records add up.
+        self.ring.extend(samples(16, 30))
+        self.assertEqual(self.values(reader.read()), list(range(20, 30)))
+        self.assertEqual(reader.lost, 9)
+
+    def test_extend_more_than_capacity(self):
+        reader = self.attach()
+        self.ring.extend(samples(0, 25))
+        self.assertEqual(self.ring.head, 25)
+        self.assertEqual(self.values(reader.read()), list(range(15, 25)))
+        self.assertEqual(reader.lost, 15)
+
+    def test_valid(self):
+        reader = self.attach()
+        self.ring.extend(samples(0, 5))
+        (seq, view), = reader.read()
+        self.assertTrue(reader.valid(seq))
+
+        # The view now shows newer records.
+        self.ring.extend(samples(5, 12))
+        self.assertFalse(reader.valid(seq))
+        self.assertTrue(reader.valid(2))
+        self.assertEqual(view['value'][0], 10)
+
+    def test_read_copy(self):
+        reader = self.attach()
+        self.assertEqual(len(reader.read_copy()[1]), 0)
+
+        self.ring.extend(samples(0, 8))
+        reader.read(5)
+        self.ring.extend(samples(8, 12))
+        seq, data = reader.read_copy()
+        self.assertEqual(seq, 5)
+        self.assertEqual(list(data['value']), list(range(5, 12)))
+
+        # The copy is not overwritten.
+        self.ring.extend(samples(12, 22))
+        self.assertEqual(list(data['value']), list(range(5, 12)))
+
+    def test_read_only(self):
+        reader = self.attach()
+        self.ring.append((0.0, 1.0))
+        (_, view), = reader.read()
+        with self.assertRaises(ValueError):
+            view['value'][0] = 2
+
+    def test_dtype(self):
+        dtype = np.dtype([('channel', '<u2'), ('counts', '<i4', (3, ))])
+        ring = SharedRing(capacity=4, dtype=dtype)
+        self.addCleanup(ring.close)
+        ring.append((2, [1, 2, 3]))
+
+        reader = SharedRingReader(ring.name, start=0)
+        self.addCleanup(reader.close)
+        self.assertEqual(reader.dtype, dtype)
+        (_, view), = reader.read()
+        self.assertEqual(view['channel'][0], 2)
+        self.assertEqual(list(view['counts'][0]), [1, 2, 3])
+
+    def test_not_a_ring(self):
+        block = sharedring.shared_memory.SharedMemory(create=True, size=256)
+        self.addCleanup(block.unlink)
+        self.addCleanup(block.close)
+        with self.assertRaisesRegex(ValueError, 'not a lantz shared ring'):
+            SharedRingReader(block.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
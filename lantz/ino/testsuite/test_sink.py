@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from lantz.core import Q_
+from lantz.ino import INODriver, BoolFeat, IntFeat, QuantityFeat, QuantityDictFeat, RecordingSink
+
+from lantz.ino.testsuite.helpers import FakeBoardTestCase
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+
+class SinkDriver(INODriver):
+
+    temperature = QuantityFeat('TEMP', units='degC', setter=False)
+    volts = QuantityDictFeat('VOLT', keys=[1, 2], units='V')
+    count = IntFeat('CNT')
+    led = BoolFeat('LED')
+
+
+class SinkTestMixin:
+
+    def setUp(self):
+        super().setUp()
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+
+class ColumnsTest(SinkTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.inst = SinkDriver('ASRL1::INSTR')
+
+    def test_columns(self):
+        sink = RecordingSink(self.inst, ['temperature', 'volts', 'count', 'led'], self.path('run.npy'), rows=10)
+        self.addCleanup(sink.close)
+
+        self.assertEqual(sink.columns, ('temperature', 'volts[1]', 'volts[2]', 'count', 'led'))
+        self.assertEqual(sink.dtype['count'], np.dtype('<i8'))
+        self.assertEqual(sink.dtype['led'], np.dtype('?'))
+        self.assertEqual(Q_(1, sink.units['volts[2]']), Q_(1, 'V'))
+        self.assertIsNone(sink.units['count'])
+
+    def test_key(self):
+        sink = RecordingSink(self.inst, ('volts', 2), self.path('run.npy'), rows=10)
+        self.addCleanup(sink.close)
+        self.assertEqual(sink.columns, ('volts[2]', ))
+
+    def test_errors(self):
+        with self.assertRaisesRegex(ValueError, 'no feat or dictfeat'):
+            RecordingSink(self.inst, 'missing', self.path('run.npy'), rows=10)
+        with self.assertRaisesRegex(ValueError, 'Unknown file type'):
+            RecordingSink(self.inst, 'count', self.path('run.csv'))
+        with self.assertRaisesRegex(ValueError, 'number of rows'):
+            RecordingSink(self.inst, 'count', self.path('run.npy'))
+
+
+class NpyTest(SinkTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.inst = SinkDriver('ASRL1::INSTR')
+
+    def test_chunks(self):
+        path = self.path('run.npy')
+        metadata = self.path('run.json')
+
+        with RecordingSink(self.inst, ['volts', 'count'], path, chunk=4, rows=100) as sink:
+            for ndx in range(3):
+                sink.append((float(ndx), [Q_(ndx, 'V'), Q_(500, 'mV'), ndx]))
+            # Not written until the chunk is full.
+            with open(metadata, encoding='utf-8') as fi:
+                self.assertEqual(json.load(fi)['rows'], 0)
+
+            sink.append((3.0, {'volts[1]': 3, 'volts[2]': 4, 'count': 5}))
+            with open(metadata, encoding='utf-8') as fi:
+                self.assertEqual(json.load(fi)['rows'], 4)
+
+            sink.append((4.0, [0, 0, 6]))
+            self.assertEqual(sink.rows, 5)
+
+        data = np.load(path)
+        self.assertEqual(data.shape, (5, ))
+        self.assertEqual(list(data['timestamp']), [0, 1, 2, 3, 4])
+        self.assertEqual(list(data['volts[2]'][:3]), [0.5] * 3)
+        self.assertEqual(list(data['count']), [0, 1, 2, 5, 6])
+
+        with open(metadata, encoding='utf-8') as fi:
+            info = json.load(fi)
+        self.assertEqual(info['rows'], 5)
+        self.assertEqual(info['columns'], ['timestamp', 'volts[1]', 'volts[2]', 'count'])
+        self.assertTrue(info['driver'].endswith('SinkDriver'))
+
+    def test_single_column(self):
+        # As the buffer of a Scheduler poll.
+        path = self.path('run.npy')
+        with RecordingSink(self.inst, 'temperature', path, chunk=2, rows=10) as sink:
+            sink.append((1.0, Q_(300, 'K')))
+        self.assertAlmostEqual(np.load(path)['temperature'][0], 26.85)
+
+    def test_full(self):
+        sink = RecordingSink(self.inst, 'count', self.path('run.npy'), chunk=2, rows=3)
+        sink.append((0.0, 1))
+        sink.append((1.0, 2))
+        sink.append((2.0, 3))
+        with self.assertRaisesRegex(ValueError, 'full'):
+            sink.append((3.0, 4))
+
+
+@unittest.skipIf(h5py is None, 'Requires h5py')
+class HDF5Test(SinkTestMixin, unittest.TestCase):
+
+    def test_chunks(self):
+        path = self.path('run.h5')
+        inst = SinkDriver('ASRL1::INSTR')
+        with RecordingSink(inst, ['temperature', 'led'], path, chunk=8) as sink:
+            for ndx in range(20):
+                sink.append((float(ndx), [Q_(ndx, 'degC'), ndx % 2 == 0]))
+
+        with h5py.File(path, 'r') as fi:
+            dataset = fi['data']
+            self.assertEqual(dataset.shape, (20, ))
+            self.assertEqual(dataset.chunks, (8, ))
+            self.assertEqual(dataset.attrs['columns'], json.dumps(['timestamp', 'temperature', 'led']))
+            self.assertEqual(list(dataset['temperature']), list(range(20)))
+            self.assertEqual(list(dataset['led'][:2]), [True, False])
+
+        # Recording again replaces the dataset.
+        with RecordingSink(inst, 'count', path) as sink:
+            sink.append((0.0, 1))
+        with h5py.File(path, 'r') as fi:
+            self.assertEqual(fi['data'].dtype.names, ('timestamp', 'count'))
+
+
+class SampleTest(SinkTestMixin, FakeBoardTestCase):
+
+    driver_class = SinkDriver
+    values = {'TEMP': '21.50', 'VOLT 1': '1.25', 'VOLT 2': '2.50', 'CNT': '7', 'LED': '1'}
+
+    def test_sample(self):
+        inst = self.connect()
+        path = self.path('run.npy')
+
+        with RecordingSink(inst, ['temperature', 'volts', 'count', 'led'], path, rows=10) as sink:
+            del self.board.log[:]
+            timestamp, values = sink.sample()
+            sink.sample()
+
+        self.assertEqual(self.board.log[:5], ['TEMP?', 'VOLT? 1', 'VOLT? 2', 'CNT?', 'LED?'])
+        self.assertEqual(values[0], Q_(21.5, 'degC'))
+
+        data = np.load(path)
+        self.assertEqual(data.shape, (2, ))
+        self.assertEqual(data['timestamp'][0], timestamp)
+        self.assertEqual(data['volts[2]'][1], 2.5)
+        self.assertEqual(data['count'][1], 7)
+        self.assertTrue(data['led'][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
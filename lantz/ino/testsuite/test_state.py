@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from lantz.ino import INODriver, BoolFeat, BoolDictFeat, IntFeat, QuantityFeat, QuantityDictFeat
+
+from lantz.ino.testsuite.helpers import EmulatorTestCase, FakeBoardTestCase
+
+
+class StateDriver(INODriver):
+    INO_STATE = True
+    INO_STATS = True
+
+    led = BoolFeat('LED')
+    temperature = QuantityFeat('TEMP', units='degC', setter=False)
+    count = IntFeat('CNT', getter=False)
+    mode = BoolDictFeat('MODE', keys=['slow', 'fast'])
+    fixed = QuantityFeat('FIX', units='V', fixed_point=(0.01, 16))
+    volts = QuantityDictFeat('VOLT', keys=[1, 2], units='V')
+
+
+class PlainDriver(INODriver):
+
+    temperature = QuantityFeat('TEMP', units='degC', setter=False)
+    volts = QuantityDictFeat('VOLT', keys=[1, 2], units='V')
+
+
+class BrokenStateDriver(PlainDriver):
+    INO_STATE = True
+
+
+class LayoutTest(unittest.TestCase):
+
+    def test_layout(self):
+        layout = [(feat.name, key) for feat, key in StateDriver.ino_state_layout()]
+        self.assertEqual(sorted(layout, key=str),
+                         sorted([('led', None), ('temperature', None), ('mode', 'slow'), ('mode', 'fast'),
+                                 ('fixed', None), ('volts', 1), ('volts', 2)], key=str))
+
+    def test_command(self):
+        self.assertIn(('STATE?', None), StateDriver.ino_commands())
+        self.assertNotIn(('STATE?', None), PlainDriver.ino_commands())
+
+
+class StateTest(EmulatorTestCase):
+
+    driver_class = StateDriver
+    user_code = {'get_LED': 'return 1;',
+                 'get_TEMP': 'return 21.5;',
+                 'get_MODE': 'return key == MODE_fast;',
+                 'get_FIX': 'return -150;',
+                 'get_VOLT': 'return key * 1.25;'}
+
+    def test_snapshot(self):
+        inst = self.connect()
+        inst.ino_stats(reset=True)
+
+        snapshot = inst.snapshot()
+
+        handlers = inst.ino_stats().handlers
+        self.assertEqual(handlers['STATE?'].count, 1)
+        self.assertEqual(set(handlers), {'STATE?', 'STATS?'})
+
+        self.assertEqual(set(snapshot), {'led', 'temperature', 'mode', 'fixed', 'volts'})
+        self.assertIs(snapshot['led'], True)
+        self.assertEqual(snapshot['temperature'].magnitude, 21.5)
+        self.assertEqual(snapshot['mode'], {'slow': False, 'fast': True})
+        self.assertEqual(snapshot['fixed'].magnitude, -1.5)
+        self.assertEqual({key: value.magnitude for key, value in snapshot['volts'].items()}, {1: 1.25, 2: 2.5})
+
+        # The same values as getting each feat.
+        self.assertEqual(inst.temperature, snapshot['temperature'])
+        self.assertEqual(inst.volts[2], snapshot['volts'][2])
+
+    def test_structured(self):
+        inst = self.connect()
+        record = inst.snapshot(structured=True)
+
+        self.assertIn('volts[1]', record.dtype.names)
+        self.assertEqual(record['volts[2]'], 2.5)
+        self.assertEqual(record['mode[fast]'], True)
+        self.assertEqual(record['fixed'], -1.5)
+
+
+class PlainStateTest(FakeBoardTestCase):
+
+    driver_class = PlainDriver
+    values = {'TEMP': '21.50', 'VOLT 1': '1.25', 'VOLT 2': '2.50'}
+
+    def test_one_by_one(self):
+        inst = self.connect()
+        del self.board.log[:]
+
+        snapshot = inst.snapshot()
+        self.assertEqual(snapshot['temperature'].magnitude, 21.5)
+        self.assertEqual(snapshot['volts'][2].magnitude, 2.5)
+        self.assertEqual(sorted(self.board.log), ['TEMP?', 'VOLT? 1', 'VOLT? 2'])
+
+
+class OutdatedStateTest(FakeBoardTestCase):
+
+    driver_class = BrokenStateDriver
+    values = {'STATE': '1.0'}
+
+    def test_outdated_sketch(self):
+        inst = self.connect()
+        with self.assertRaisesRegex(ValueError, 'up to date'):
+            inst.snapshot()
+
+
+if __name__ == '__main__':
+    unittest.main()
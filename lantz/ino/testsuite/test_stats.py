@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from lantz.ino import INODriver, IntFeat, QuantityFeat
+
+from lantz.ino.testsuite.helpers import EmulatorTestCase
+
+
+class StatsDriver(INODriver):
+    INO_STATS = True
+
+    count = IntFeat('CNT')
+    temperature = QuantityFeat('TEMP', units='degC', setter=False)
+
+    # Name of the maximum length accepted by SerialCommand.
+    interval = IntFeat('INTERVAL', getter=False)
+
+
+class PlainDriver(INODriver):
+
+    count = IntFeat('CNT')
+
+
+class GenerateTest(unittest.TestCase):
+
+    def test_commands(self):
+        self.assertIn(('STATS?', None), StatsDriver.ino_commands())
+        self.assertNotIn(('STATS?', None), PlainDriver.ino_commands())
+
+    def test_not_generated(self):
+        inst = PlainDriver('ASRL1::INSTR')
+        with self.assertRaises(ValueError):
+            inst.ino_stats()
+
+
+class StatsTest(EmulatorTestCase):
+
+    driver_class = StatsDriver
+    user_code = {'get_TEMP': 'return 21.5;'}
+
+    def test_handler_counts(self):
+        inst = self.connect()
+        inst.ino_stats(reset=True)
+
+        for value in range(5):
+            inst.count = value
+        for _ in range(3):
+            self.assertEqual(inst.temperature.magnitude, 21.5)
+
+        stats = inst.ino_stats()
+        self.assertEqual(stats.handlers['CNT'].count, 5)
+        self.assertEqual(stats.handlers['TEMP?'].count, 3)
+        self.assertGreater(stats.loops, 0)
+        for handler in stats.handlers.values():
+            self.assertLessEqual(handler.max_us, handler.total_us)
+
+    def test_reset(self):
+        inst = self.connect()
+        inst.count = 1
+        inst.ino_stats(reset=True)
+
+        stats = inst.ino_stats()
+        self.assertNotIn('CNT', [name for name, handler in stats.handlers.items() if handler.count])
+
+    def test_long_name(self):
+        inst = self.connect()
+        inst.ino_stats(reset=True)
+        inst.interval = 10
+
+        self.assertEqual(inst.ino_stats().handlers['INTERVAL'].count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
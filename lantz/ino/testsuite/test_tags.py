@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+import unittest
+
+from lantz.ino import INODriver, IntFeat, IntDictFeat
+
+from lantz.ino.testsuite.helpers import EmulatorTestCase
+
+
+class TagDriver(INODriver):
+    INO_SEQUENCE_TAGS = True
+
+    count = IntFeat('CNT')
+    registers = IntDictFeat('REG', keys=list(range(8)))
+
+
+class UntaggedDriver(INODriver):
+
+    count = IntFeat('CNT')
+
+
+USER_CODE = {'get_REG': 'return registers[key];',
+             'set_REG': 'registers[key] = value;\n  return 0;',
+             'get_CNT': 'return count;',
+             'set_CNT': 'count = value;\n  return 0;'}
+
+USER_PRELUDE = 'int registers[8];\nint count = 0;'
+
+
+class TagTest(EmulatorTestCase):
+
+    driver_class = TagDriver
+    user_code = USER_CODE
+    user_prelude = USER_PRELUDE
+
+    def test_submit(self):
+        inst = self.connect()
+        inst.count = 7
+
+        futures = [inst.ino_submit('CNT?') for _ in range(inst.INO_MAX_IN_FLIGHT)]
+        self.assertEqual([future.result(1) for future in futures], ['7'] * len(futures))
+        self.assertEqual(inst._ino_pending, {})
+
+    def test_threads(self):
+        inst = self.connect()
+
+        def work(key):
+            read = []
+            for value in range(20):
+                inst.registers[key] = 100 * key + value
+                read.append(inst.registers[key])
+            return read
+
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(work, range(8)))
+
+        for key, read in enumerate(results):
+            self.assertEqual(read, [100 * key + value for value in range(20)])
+
+    def test_pipeline(self):
+        inst = self.connect()
+        for key in range(8):
+            inst.registers[key] = key * key
+
+        with inst.ino_pipeline(['REG? %d' % key for key in range(8)]):
+            self.assertEqual([inst.registers[key] for key in range(8)], [key * key for key in range(8)])
+
+    def test_error_reply(self):
+        inst = self.connect()
+        self.assertTrue(inst.ino_submit('NOTACMD').result(1).startswith('ERROR'))
+        self.assertEqual(inst.ino_submit('CNT?').result(1), str(inst.count))
+
+
+class UntaggedTest(unittest.TestCase):
+
+    def test_submit(self):
+        inst = UntaggedDriver('ASRL1::INSTR')
+        with self.assertRaises(ValueError):
+            inst.ino_submit('CNT?')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from lantz.ino import INODriver, IntFeat, arduinocli, trace
+
+from lantz.ino.testsuite.helpers import FakeBoardTestCase
+
+
+class TraceDriver(INODriver):
+
+    count = IntFeat('CNT')
+
+
+class SpanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(trace.stop)
+
+    def test_disabled(self):
+        self.assertFalse(trace.enabled())
+        with trace.span('nothing', x=1) as args:
+            self.assertEqual(args, {})
+        self.assertEqual(trace.stop(), [])
+
+    def test_nested(self):
+        trace.start()
+        with trace.span('outer'):
+            with trace.span('inner', size=1) as args:
+                args['result'] = 2
+        spans = trace.stop()
+
+        self.assertEqual([s.name for s in spans], ['inner', 'outer'])
+        self.assertEqual(spans[0].args, {'size': 1, 'result': 2})
+        self.assertLessEqual(spans[1].start, spans[0].start)
+        self.assertGreaterEqual(spans[1].duration, spans[0].duration)
+        self.assertIn('outer', trace.summary(spans))
+
+    def test_write(self):
+        trace.start()
+        with trace.span('step'):
+            pass
+        spans = trace.stop()
+
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        path = os.path.join(folder, 'trace.json')
+
+        trace.write(path, spans)
+        with open(path, encoding='utf-8') as fi:
+            events = json.load(fi)['traceEvents']
+        self.assertEqual([event['ph'] for event in events], ['M', 'X'])
+
+        trace.write(path, spans, 'json')
+        with open(path, encoding='utf-8') as fi:
+            self.assertEqual(json.load(fi)['spans'][0]['name'], 'step')
+
+        with self.assertRaises(ValueError):
+            trace.write(path, spans, 'xml')
+
+
+class CompileStatsTest(unittest.TestCase):
+
+    def test_json(self):
+        result = {'builder_result': {'executable_sections_size': [
+            {'name': 'text', 'size': 10, 'max_size': 100},
+            {'name': 'data', 'size': 5, 'max_size': 7}]}}
+
+        self.assertEqual(arduinocli.compile_stats(result),
+                         {'text': 10, 'text_max': 100, 'data': 5, 'data_max': 7})
+
+    def test_text(self):
+        output = ('Sketch uses 10 bytes (1%) of program storage space. Maximum is 100 bytes.\n'
+                  'Global variables use 5 bytes (0%) of dynamic memory, leaving 2 bytes for '
+                  'local variables. Maximum is 7 bytes.')
+
+        self.assertEqual(arduinocli.compile_stats(output),
+                         {'text': 10, 'text_max': 100, 'data': 5, 'data_max': 7})
+        self.assertEqual(arduinocli.compile_stats({'compiler_out': output})['text'], 10)
+
+
+class ConnectTraceTest(FakeBoardTestCase):
+
+    driver_class = TraceDriver
+
+    def test_initialize(self):
+        trace.start()
+        try:
+            self.connect()
+        finally:
+            spans = trace.stop()
+
+        names = [s.name for s in spans]
+        for name in ('open', 'probe', 'INITIALIZE'):
+            self.assertIn(name, names)
+
+        # The board answered the probe.
+        self.assertNotIn('settle', names)
+
+
+if __name__ == '__main__':
+    unittest.main()
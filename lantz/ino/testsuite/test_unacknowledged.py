@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from lantz.ino import INODriver, IntFeat
+from lantz.ino.base import AsyncCommandError
+
+from lantz.ino.testsuite.helpers import EmulatorTestCase
+
+
+class SweepDriver(INODriver):
+
+    count = IntFeat('CNT')
+
+
+class TaggedSweepDriver(SweepDriver):
+    INO_SEQUENCE_TAGS = True
+
+
+class UnacknowledgedTest(EmulatorTestCase):
+
+    driver_class = SweepDriver
+    user_prelude = 'int count = 0;'
+    user_code = {'get_CNT': 'return count;',
+                 'set_CNT': 'if (value < 0) {\n    return 7;\n  }\n  count = value;\n  return 0;'}
+
+    def test_sweep(self):
+        inst = self.connect()
+        with inst.ino_unacknowledged():
+            for value in range(200):
+                inst.count = value
+            # Getters are still synchronous.
+            self.assertEqual(inst.count, 199)
+
+        self.assertEqual(inst.query('CNT?'), '199')
+
+    def test_error(self):
+        inst = self.connect()
+        with inst.ino_unacknowledged(flush=False):
+            inst.count = 5
+            inst.count = -3
+            inst.count = 6
+
+        # Raised by the next synchronous query.
+        with self.assertRaises(AsyncCommandError) as cm:
+            inst.ino_flush()
+        self.assertEqual(len(cm.exception.errors), 1)
+        command, error = cm.exception.errors[0]
+        self.assertEqual(command, 'CNT')
+        self.assertIn('7', error)
+
+        # Raised once, the next commands were processed.
+        self.assertEqual(inst.query('CNT?'), '6')
+
+    def test_flush(self):
+        inst = self.connect()
+        with self.assertRaises(AsyncCommandError):
+            with inst.ino_unacknowledged():
+                inst.count = -1
+                inst.count = -2
+
+        inst.ino_flush()
+
+    def test_cached(self):
+        inst = self.connect()
+        inst.count = 1
+        with self.assertRaises(AsyncCommandError):
+            with inst.ino_unacknowledged():
+                inst.count = -1
+
+        # The rejected value stays in the cache.
+        self.assertEqual(inst.recall('count'), -1)
+        self.assertEqual(inst.count, 1)
+
+
+class TaggedUnacknowledgedTest(UnacknowledgedTest):
+
+    driver_class = TaggedSweepDriver
+
+
+if __name__ == '__main__':
+    unittest.main()
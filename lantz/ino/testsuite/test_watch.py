@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+from contextlib import redirect_stdout
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from lantz.ino import common, watch
+
+
+MODULE = '''
+from lantz.ino import INODriver, IntFeat
+
+
+class WatchedDriver(INODriver):
+
+    count = IntFeat('CNT')
+'''
+
+
+class RecordingSession(watch.Session):
+    """Session that records the builds instead of compiling."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.builds = []
+
+    def build(self, class_changed):
+        self.builds.append(class_changed)
+
+
+class TemporaryFolder(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def touch(self, filename, content=''):
+        path = os.path.join(self.folder, filename)
+        with open(path, 'a', encoding='utf-8') as fo:
+            fo.write(content)
+        return path
+
+
+class WatcherTest(TemporaryFolder):
+
+    def check(self, watcher):
+        self.addCleanup(watcher.close)
+        path, other = os.path.join(self.folder, 'a.cpp'), os.path.join(self.folder, 'b.cpp')
+
+        self.assertEqual(watcher.poll(0.05), set())
+
+        # Make sure that the modification time changes.
+        time.sleep(0.01)
+        self.touch('a.cpp', 'x')
+        self.touch('c.cpp', 'x')
+        self.assertEqual(watcher.poll(1), {path})
+
+        # Save by renaming (as many editors do).
+        time.sleep(0.01)
+        temporary = self.touch('b.cpp.tmp', 'x')
+        os.replace(temporary, other)
+        self.assertEqual(watcher.poll(1), {other})
+
+    def test_polling(self):
+        self.touch('a.cpp')
+        self.check(watch.PollingWatcher([os.path.join(self.folder, name) for name in ('a.cpp', 'b.cpp')],
+                                        interval=0.01))
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is only available in Linux')
+    def test_inotify(self):
+        self.check(watch.InotifyWatcher([os.path.join(self.folder, name) for name in ('a.cpp', 'b.cpp')]))
+
+    def test_debounce(self):
+        path = self.touch('a.cpp')
+        watcher = watch.PollingWatcher([path], interval=0.01)
+
+        def edit():
+            for _ in range(3):
+                time.sleep(0.05)
+                self.touch('a.cpp', 'x')
+
+        thread = threading.Thread(target=edit)
+        thread.start()
+        start = time.monotonic()
+        self.assertEqual(watch.wait_for_changes(watcher, debounce=0.1), {path})
+        thread.join()
+
+        # All the edits were collected.
+        self.assertGreater(time.monotonic() - start, 0.15)
+        self.assertEqual(watcher.poll(0), set())
+
+
+class SessionTest(TemporaryFolder):
+
+    def setUp(self):
+        super().setUp()
+
+        sys.path.insert(0, self.folder)
+        self.addCleanup(sys.path.remove, self.folder)
+        self.addCleanup(sys.modules.pop, 'watched', None)
+
+        self.module = self.touch('watched.py', MODULE)
+
+        sketch = os.path.join(self.folder, 'sketch')
+        os.makedirs(sketch)
+        self.user = os.path.join(sketch, 'inodriver_user.cpp')
+
+        packfile = common.Packfile.from_defaults(sketch, 'watched:WatchedDriver')
+        self.session = RecordingSession(packfile)
+        self.session.cls.ino_user_write(sketch, True)
+        self.session.cls.ino_bridge_write(sketch)
+
+    def test_paths(self):
+        self.assertIn(self.module, self.session.paths)
+        self.assertIn(self.user, self.session.paths)
+
+    def test_module_unchanged(self):
+        self.touch('watched.py', '\n')
+        self.assertFalse(self.session.update({self.module}))
+        self.assertEqual(self.session.builds, [])
+
+    def test_class_changed(self):
+        self.touch('watched.py', "    led = IntFeat('LED')\n")
+        with redirect_stdout(io.StringIO()) as out:
+            self.assertTrue(self.session.update({self.module}))
+
+        self.assertIn('inodriver_bridge.cpp', out.getvalue())
+
+        self.assertEqual(self.session.builds, [True])
+        self.assertIn('led', self.session.cls._lantz_feats)
+
+        # The bridge is up to date.
+        self.assertEqual(self.session.cls.ino_bridge_write(self.session.packfile.sketch_folder), [])
+
+    def test_user_changed(self):
+        self.assertTrue(self.session.update({self.user}))
+        self.assertEqual(self.session.builds, [False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.ino.trace
+    ~~~~~~~~~~~~~~~
+
+    Timing spans for the build and connection pipeline
+    (generate, board discovery, compile, upload, port open, settle, idn).
+
+    Spans are only collected between start() and stop(), otherwise span()
+    costs a global lookup::
+
+        trace.start()
+        with MyDriver.via_packfile('board.pack.yaml', check_update=True) as inst:
+            pass
+        trace.write('connect.trace.json', trace.stop())
+
+    The chrome format can be opened in chrome://tracing or https://ui.perfetto.dev
+
+    The lantz.ino package provides helper classes and methods to work with Arduino.
+
+    :copyright: 2018 by The Lantz Authors
+    :license: BSD, see LICENSE for more details.
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+#: A finished span. start and duration are in seconds (time.perf_counter).
+Span = namedtuple('Span', 'name start duration thread thread_name args')
+
+FORMATS = ('chrome', 'json')
+
+_lock = threading.Lock()
+
+#: List of finished spans while tracing, None otherwise.
+_spans = None
+
+#: perf_counter at start()
+_origin = 0.0
+
+
+def start():
+    """Start collecting spans (discarding the previous ones).
+    """
+    global _spans, _origin
+    with _lock:
+        _spans = []
+        _origin = time.perf_counter()
+
+
+def stop():
+    """Stop collecting spans.
+
+    :return: list of Span, in order of completion.
+    """
+    global _spans
+    with _lock:
+        spans, _spans = _spans or [], None
+    return spans
+
+
+def enabled():
+    return _spans is not None
+
+
+@contextmanager
+def span(name, **args):
+    """Time the enclosed block.
+
+    Yields a dict of arguments stored with the span, which the block can
+    update with its results (e.g. the size of the compiled sketch).
+    """
+    if _spans is None:
+        yield {}
+        return
+
+    t0 = time.perf_counter()
+    try:
+        yield args
+    finally:
+        duration = time.perf_counter() - t0
+        current = threading.current_thread()
+        with _lock:
+            if _spans is not None:
+                _spans.append(Span(name, t0 - _origin, duration, current.ident, current.name, args))
+
+
+def to_chrome(spans):
+    """Convert spans to the Chrome trace event format.
+    """
+    pid = os.getpid()
+
+    events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}}
+              for tid, thread_name in sorted({(s.thread, s.thread_name) for s in spans})]
+
+    events.extend({'name': s.name, 'cat': 'lantz.ino', 'ph': 'X',
+                   'ts': s.start * 1e6, 'dur': s.duration * 1e6,
+                   'pid': pid, 'tid': s.thread, 'args': s.args}
+                  for s in spans)
+
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def to_json(spans):
+    """Convert spans to a plain list of dicts (times in seconds).
+    """
+    return {'spans': [s._asdict() for s in sorted(spans, key=lambda s: s.start)]}
+
+
+def write(path, spans, fmt='chrome'):
+    """Write spans to a file.
+
+    :param fmt: 'chrome' (trace event format) or 'json'.
+    """
+    if fmt == 'chrome':
+        content = to_chrome(spans)
+    elif fmt == 'json':
+        content = to_json(spans)
+    else:
+        raise ValueError('Unknown trace format %r, valid formats are %s' % (fmt, ', '.join(FORMATS)))
+
+    with open(path, mode='w', encoding='utf-8') as fo:
+        json.dump(content, fo, indent=1, default=str)
+
+
+def summary(spans):
+    """Return a text table with the duration of each span.
+    """
+    lines = []
+    for s in sorted(spans, key=lambda s: s.start):
+        lines.append('%8.3f s  %8.3f s  %s' % (s.start, s.duration, s.name))
+    return '\n'.join(lines)
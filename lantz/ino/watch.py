@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+    lantz.ino.watch
+    ~~~~~~~~~~~~~~~
+
+    Regenerate, rebuild and reconnect when the driver class or the user
+    files change.
+
+    Files are watched with inotify (Linux, through ctypes) and by polling
+    their modification time elsewhere. Only the bridge files whose content
+    changed are rewritten, and the sketch is compiled only if a source
+    file of the sketch changed.
+
+    The lantz.ino package provides helper classes and methods to work with Arduino.
+
+    :copyright: 2018 by The Lantz Authors
+    :license: BSD, see LICENSE for more details.
+"""
+
+import ctypes
+import ctypes.util
+import importlib
+import inspect
+import os
+import select
+import struct
+import time
+import traceback
+
+from . import arduinocli
+
+# inotify event masks (see inotify(7))
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+_EVENT = struct.Struct('iIII')
+
+
+class PollingWatcher:
+    """Watch files by polling their modification time.
+
+    :param paths: files to watch.
+    :param interval: polling interval in seconds.
+    """
+
+    def __init__(self, paths, interval=0.5):
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.interval = interval
+        self._mtimes = {path: self._mtime(path) for path in self.paths}
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def poll(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            changed = set()
+            for path in self.paths:
+                mtime = self._mtime(path)
+                if mtime != self._mtimes[path]:
+                    self._mtimes[path] = mtime
+                    changed.add(path)
+
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Watch files with inotify.
+
+    The parent folders are watched (instead of the files) to follow editors
+    that save by writing a new file and renaming it.
+
+    :param paths: files to watch.
+    """
+
+    def __init__(self, paths):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+        self.paths = [os.path.abspath(path) for path in paths]
+
+        self._fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        #: watch descriptor -> folder
+        self._folders = {}
+
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        for folder in sorted({os.path.dirname(path) for path in self.paths}):
+            wd = libc.inotify_add_watch(self._fd, os.fsencode(folder), mask)
+            if wd < 0:
+                os.close(self._fd)
+                raise OSError(ctypes.get_errno(), 'inotify_add_watch failed for %s' % folder)
+            self._folders[wd] = folder
+
+    def poll(self, timeout):
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        data = os.read(self._fd, 64 * 1024)
+
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            path = os.path.join(self._folders.get(wd, ''), os.fsdecode(name))
+            if path in self.paths:
+                changed.add(path)
+
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+def watcher(paths, polling=False):
+    """Return an InotifyWatcher if available, otherwise a PollingWatcher.
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            # No inotify in this platform.
+            pass
+
+    return PollingWatcher(paths)
+
+
+def wait_for_changes(watch, debounce=0.2):
+    """Block until a watched file changes.
+
+    Changes are collected until no new change arrives for `debounce` seconds,
+    as editors and tools usually touch many files (or the same one many times).
+
+    :return: set of changed paths.
+    """
+    changed = set()
+    while not changed:
+        changed = watch.poll(3600)
+
+    while True:
+        more = watch.poll(debounce)
+        if not more:
+            return changed
+        changed |= more
+
+
+class Session:
+    """Keep a sketch in sync with its driver class.
+
+    :param packfile: Packfile of the project.
+    :param upload: upload the sketch after each build.
+    :param connect: keep a connection to the board, reopened after each upload
+                    or when the class changes.
+    """
+
+    def __init__(self, packfile, upload=False, connect=False):
+        self.packfile = packfile
+        self.upload = upload
+        self.connect = connect
+
+        self.module_name, self.class_name = packfile.class_spec.split(':')
+
+        #: Connected driver instance (if connect is True).
+        self.inst = None
+
+        self.cls = self._load(reload=False)
+
+    def _load(self, reload=True):
+        module = importlib.import_module(self.module_name)
+        if reload:
+            module = importlib.reload(module)
+        return getattr(module, self.class_name)
+
+    @property
+    def paths(self):
+        folder = self.packfile.sketch_folder
+        return [self.module_file,
+                os.path.abspath(os.path.join(folder, 'inodriver_user.h')),
+                os.path.abspath(os.path.join(folder, 'inodriver_user.cpp'))]
+
+    @property
+    def module_file(self):
+        return os.path.abspath(inspect.getfile(self.cls))
+
+    def disconnect(self):
+        if self.inst is not None:
+            try:
+                self.inst.finalize()
+            except Exception:
+                traceback.print_exc()
+            self.inst = None
+
+    def reconnect(self):
+        self.disconnect()
+        inst = self.cls.via_packfile(self.packfile)
+        inst.initialize()
+        self.inst = inst
+        print('Connected to %s' % self.cls.__qualname__)
+
+    def build(self, class_changed):
+        """Compile (and upload) the sketch and reconnect if needed.
+        """
+        if self.upload:
+            # The port cannot be shared with the uploader.
+            self.disconnect()
+
+        arduinocli.compile_and_upload(self.packfile, self.upload, force=True)
+
+        if self.connect and (self.inst is None or self.upload or class_changed):
+            self.reconnect()
+
+    def update(self, changed):
+        """Process a set of changed files.
+
+        :return: True if the sketch was rebuilt.
+        """
+        module_file = self.module_file
+
+        written = []
+        class_changed = module_file in changed
+
+        if class_changed:
+            self.cls = self._load()
+            written = self.cls.ino_bridge_write(self.packfile.sketch_folder)
+            for filename in written:
+                print('Regenerated %s' % filename)
+
+        if not written and not (changed - {module_file}):
+            if class_changed and self.connect:
+                # Only the python side changed (e.g. a docstring or limits).
+                self.reconnect()
+            return False
+
+        self.build(class_changed)
+        return True
+
+    def run(self, polling=False, debounce=0.2):
+
+        for filename in self.cls.ino_bridge_write(self.packfile.sketch_folder):
+            print('Regenerated %s' % filename)
+
+        self.build(True)
+
+        watch = watcher(self.paths, polling)
+        print('Watching %s' % ', '.join(self.paths))
+
+        try:
+            while True:
+                changed = wait_for_changes(watch, debounce)
+                print('Changed: %s' % ', '.join(sorted(changed)))
+                try:
+                    self.update(changed)
+                except Exception:
+                    # Keep watching after a syntax error or a failed build.
+                    traceback.print_exc()
+        finally:
+            watch.close()
+            self.disconnect()
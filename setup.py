@@ -30,7 +30,7 @@ setup(
         'Operating System :: MacOS :: MacOS X',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3 :: Only',
         'Topic :: Scientific/Engineering',
         'Topic :: Scientific/Engineering :: Interface Engine/Protocol Translator',
@@ -46,9 +46,10 @@ setup(
         'Topic :: Utilities',
     ],
     keywords='lantz, lantz-ino, arduino, hardware interface, instrumentation framework, science, research',
-    packages=['lantz.ino', 'lantz.ino.templates'],
+    packages=['lantz.ino', 'lantz.ino.templates', 'lantz.ino.testsuite'],
+    test_suite='lantz.ino.testsuite.testsuite',
     zip_safe=False,
-    python_requires='>=3.6, <4',
+    python_requires='>=3.7, <4',
     install_requires=[
         'pyyaml',
         'lantzdev>=0.6',